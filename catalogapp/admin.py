@@ -1,7 +1,15 @@
 """ Registering application models here"""
 
-from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance, Language
+import datetime
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from django.forms.models import BaseInlineFormSet
+from . import loans, reservations
+from .forms import RenewBookForm
+from .models import Author, Genre, Book, BookInstance, Hold, Language, LoanEvent
+from .pagination import ApproximateCountPaginator
 
 # admin.site.register(Book)
 # admin.site.register(Author)
@@ -10,9 +18,36 @@ admin.site.register(Genre)
 admin.site.register(Language)
 
 
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset editing one page of the related objects, chosen by the `page_kwarg` query parameter."""
+    per_page = 20
+    page_kwarg = 'page'
+    page_number = 1
+
+    def get_queryset(self):
+        if not hasattr(self, 'page'):
+            self.page = Paginator(super().get_queryset(), self.per_page).get_page(self.page_number)
+            self._queryset = self.page.object_list
+        return self._queryset
+
+
 class BooksInstanceInline(admin.TabularInline):
-    """Defines format of inline book instance insertion (used in BookAdmin)"""
+    """Defines format of inline book instance insertion (used in BookAdmin)
+    A book can have thousands of copies, so they are edited a page at a time."""
     model = BookInstance
+    formset = PaginatedInlineFormSet
+    template = 'admin/catalogapp/edit_inline/paginated_tabular.html'
+    autocomplete_fields = ('borrower',)
+    extra = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).order_by('due_back', 'id')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.page_kwarg = f'{formset.get_default_prefix()}-page'
+        formset.page_number = request.GET.get(formset.page_kwarg, 1)
+        return formset
 
 
 class AuthorAdmin(admin.ModelAdmin):
@@ -38,7 +73,17 @@ class BookAdmin(admin.ModelAdmin):
          - adds inline addition of book instances in book view (inlines)
         """
     list_display = ('title', 'author', 'display_genre')
+    list_select_related = ('author',)
+    # Also what the autocomplete widget of a copy's book searches
+    search_fields = ('title', 'isbn')
     inlines = [BooksInstanceInline]
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # display_genre() reads the prefetched genres: one query for the whole page
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('genre', queryset=Genre.objects.only('id', 'book_kind')))
 
 
 @admin.register(BookInstance)
@@ -48,8 +93,14 @@ class BookInstanceAdmin(admin.ModelAdmin):
          - fields to be displayed in list view (list_display)
          - filters that will be displayed in sidebar (list_filter)
          - grouping of fields into sections (fieldsets)
+         - bulk renewal and return of the selected copies (actions)
         """
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
+    list_select_related = ('book', 'borrower')
+    autocomplete_fields = ('book', 'borrower')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['renew_for_three_weeks', 'mark_returned']
     list_filter = ('status', 'due_back')
     fieldsets = (
         (None, {
@@ -59,3 +110,68 @@ class BookInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+
+    def renew_for_three_weeks(self, request, queryset):
+        form = RenewBookForm(data={'renewal_date': datetime.date.today() + datetime.timedelta(weeks=3)})
+        if not form.is_valid():
+            self.message_user(request, form.errors['renewal_date'][0], messages.ERROR)
+            return
+        copies = queryset.values_list('id', flat=True)
+        count = loans.renew(copies, form.cleaned_data['renewal_date'], librarian=request.user)
+        self.message_user(request, f'Renewed {count} copies on loan.')
+
+    renew_for_three_weeks.short_description = 'Renew selected copies on loan for three weeks'
+    renew_for_three_weeks.allowed_permissions = ('mark_returned',)
+
+    def mark_returned(self, request, queryset):
+        count = loans.mark_returned(queryset.values_list('id', flat=True), librarian=request.user)
+        self.message_user(request, f'Marked {count} copies returned.')
+
+    mark_returned.short_description = 'Mark selected copies on loan returned'
+    mark_returned.allowed_permissions = ('mark_returned',)
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('catalogapp.can_mark_returned')
+
+
+@admin.register(LoanEvent)
+class LoanEventAdmin(admin.ModelAdmin):
+    """Administration object for the loan ledger, which is only ever read here.
+    Filtering on the date reads only the partitions of the months chosen."""
+    list_display = ('created', 'action', 'bookinstance_id', 'book_id', 'borrower_id', 'due_back', 'librarian_id')
+    list_filter = ('action', 'created')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    """Administration object for Hold models. Holds are placed by patrons; removing one here
+    passes a copy set aside for it on to the next in the queue."""
+    list_display = ('created', 'book', 'patron', 'copy')
+    list_select_related = ('book', 'patron')
+    search_fields = ('book__title', 'patron__username')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_model(self, request, obj):
+        reservations.cancel(obj.pk)
+
+    def delete_queryset(self, request, queryset):
+        for pk in queryset.values_list('pk', flat=True):
+            reservations.cancel(pk)
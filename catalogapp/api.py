@@ -0,0 +1,176 @@
+""" read-only JSON API over the catalog, serialized straight from values() rows
+
+Every resource is listed in keyset order (?cursor=, ?limit=) or looked up in one query by
+?ids=1,2,3. ?fields=title,isbn picks the fields returned and ?embed=author,genres nests
+related objects: to-one relations are joined into the same query, to-many relations cost
+one more query for the whole page. Embedded fields can be picked too (fields=author.last_name).
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+
+from .models import Author, Book, BookInstance, Genre, Language
+from .pagination import KeysetPaginator
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_IDS = 100
+
+
+class BadRequest(Exception):
+    """A query parameter the API cannot answer; the message says which."""
+
+
+class One:
+    """To-one relation through the foreign key `field` of the resource's model."""
+
+    def __init__(self, resource, field):
+        self.resource = resource
+        self.field = field
+
+
+class Many:
+    """To-many relation: the objects of `resource` whose `field` lookup points back at the resource's model."""
+
+    def __init__(self, resource, field):
+        self.resource = resource
+        self.field = field
+
+
+class Resource:
+    """A model exposed by the API: its public `fields` (the first are the defaults), keyset `ordering`
+    (ending with a unique field) and `relations` that can be embedded."""
+
+    def __init__(self, model, fields, ordering, relations=None, default_fields=None):
+        self.model = model
+        self.fields = fields
+        self.default_fields = default_fields or fields
+        self.ordering = ordering
+        self.relations = relations or {}
+
+    def parse_ids(self, value):
+        """The primary keys in the comma-separated `value`."""
+        ids = [item.strip() for item in value.split(',') if item.strip()]
+        if len(ids) > MAX_IDS:
+            raise BadRequest(f'At most {MAX_IDS} ids at a time')
+        try:
+            return [self.model._meta.pk.to_python(pk) for pk in ids]
+        except ValidationError as error:
+            raise BadRequest(f'Invalid id in {value!r}') from error
+
+    def parse_fields(self, value, embed):
+        """The fields of this resource, and of each embedded relation, picked by a ?fields= `value`."""
+        picked = {None: [], **{name: [] for name in embed}}
+        for item in filter(None, (item.strip() for item in (value or '').split(','))):
+            relation, _, field = item.rpartition('.')
+            if relation and relation not in embed:
+                raise BadRequest(f'Field {item!r} is not of an embedded relation')
+            resource = RESOURCES[self.relations[relation].resource] if relation else self
+            if field not in resource.fields:
+                raise BadRequest(f'Unknown field {item!r}')
+            picked[relation or None].append(field)
+        return {name: fields or list((RESOURCES[self.relations[name].resource] if name else self).default_fields)
+                for name, fields in picked.items()}
+
+    def parse_embed(self, value):
+        embed = [name.strip() for name in (value or '').split(',') if name.strip()]
+        for name in embed:
+            if name not in self.relations:
+                raise BadRequest(f'Cannot embed {name!r}; choose from {", ".join(self.relations)}')
+        return embed
+
+    def _columns(self, fields, embed):
+        """The values() columns for `fields` plus the ordering and the joined to-one `embed`s."""
+        columns = list(dict.fromkeys(['id', *fields, *self.ordering]))
+        for name, relation_fields in embed.items():
+            relation = self.relations[name]
+            if isinstance(relation, One):
+                columns.extend(f'{relation.field}__{field}' for field in ['id', *relation_fields])
+        return list(dict.fromkeys(columns))
+
+    def rows(self, fields, embed, ids=None, cursor=None, limit=DEFAULT_LIMIT):
+        """The serialized objects, and the (next, previous) cursors of their page.
+
+        `fields` and `embed` come from parse_fields() and parse_embed(). With `ids` all the
+        objects found are returned in one page.
+        """
+        embed_fields = {name: fields[name] for name in embed}
+        queryset = self.model.objects.values(*self._columns(fields[None], embed_fields))
+        if ids is not None:
+            rows = list(queryset.filter(pk__in=ids).order_by(*self.ordering))
+            cursors = (None, None)
+        else:
+            paginator = KeysetPaginator(queryset, limit, self.ordering)
+            try:
+                page = paginator.page(cursor)
+            except InvalidPage as error:
+                raise BadRequest(str(error)) from error
+            rows, cursors = page.object_list, (page.next_cursor, page.previous_cursor)
+
+        objects = [self._serialize(row, fields[None], embed_fields) for row in rows]
+        for name in embed:
+            relation = self.relations[name]
+            if isinstance(relation, Many):
+                self._embed_many(objects, name, relation, embed_fields[name])
+        return objects, cursors
+
+    def _serialize(self, row, fields, embed):
+        obj = {'id': row['id']}
+        obj.update((field, row[field]) for field in fields)
+        for name, relation_fields in embed.items():
+            relation = self.relations[name]
+            if isinstance(relation, One):
+                prefix = relation.field + '__'
+                if row[prefix + 'id'] is None:
+                    obj[name] = None
+                else:
+                    obj[name] = {field: row[prefix + field] for field in ['id', *relation_fields]}
+        return obj
+
+    def _embed_many(self, objects, name, relation, fields):
+        # One query for the whole page, like prefetch_related()
+        target = RESOURCES[relation.resource]
+        related = defaultdict(list)
+        if objects:
+            columns = list(dict.fromkeys(['id', *fields]))
+            found = target.model.objects.filter(**{f'{relation.field}__in': [obj['id'] for obj in objects]})
+            for row in found.order_by(*target.ordering).values(relation.field, *columns):
+                related[row[relation.field]].append({field: row[field] for field in columns})
+        for obj in objects:
+            obj[name] = related[obj['id']]
+
+
+BOOK_FIELDS = ('title', 'author', 'summary', 'isbn', 'language', 'copies_total', 'copies_available',
+               'copies_on_loan', 'copies_maintenance', 'copies_reserved', 'next_due_back')
+
+RESOURCES = {
+    'books': Resource(
+        Book, BOOK_FIELDS, ('title', 'id'),
+        relations={
+            'author': One('authors', 'author'),
+            'language': One('languages', 'language'),
+            'genres': Many('genres', 'book'),
+            'copies': Many('copies', 'book'),
+        },
+        default_fields=('title', 'author', 'isbn', 'language', 'copies_total', 'copies_available'),
+    ),
+    'authors': Resource(
+        Author, ('first_name', 'last_name', 'date_of_birth', 'date_of_death'), ('last_name', 'first_name', 'id'),
+        relations={'books': Many('books', 'author')},
+    ),
+    # The borrower is left out: loans are not public
+    'copies': Resource(
+        BookInstance, ('book', 'imprint', 'status', 'due_back'), ('book', 'id'),
+        relations={'book': One('books', 'book')},
+    ),
+    'genres': Resource(
+        Genre, ('book_kind',), ('book_kind', 'id'),
+        relations={'books': Many('books', 'genre')},
+    ),
+    'languages': Resource(
+        Language, ('lang_name',), ('lang_name', 'id'),
+        relations={'books': Many('books', 'language')},
+    ),
+}
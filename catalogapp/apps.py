@@ -1,8 +1,25 @@
 """ configuring application"""
 
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CatalogappConfig(AppConfig):
     """application is catalogapp"""
     name = 'catalogapp'
+
+    def ready(self):
+        # Connect the signal receivers keeping cached data and indexes up to date
+        from . import signals  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
+        # and the health checks of persistent database connections
+        from . import dbpool  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
+        from . import typeahead  # pylint: disable=import-outside-toplevel
+
+        # With the cached template loader, compile the templates now rather than on first use
+        if getattr(settings, 'CATALOGAPP_TEMPLATE_MODE', 'reload') == 'cached':
+            from . import templating  # pylint: disable=import-outside-toplevel
+            templating.warm()
+
+        # Serving processes warm the typeahead index right away; otherwise it loads on first use.
+        if getattr(settings, 'CATALOGAPP_TYPEAHEAD_PRELOAD', False):
+            typeahead.index.load_in_background()
@@ -0,0 +1,189 @@
+""" async variants of the catalog read views, for ASGI servers
+
+Queries that do not depend on each other run at the same time, each in a worker thread
+with a database connection of its own for the length of the call, and templates are
+rendered in a worker thread too, so the event loop never waits on them.
+"""
+
+import asyncio
+import functools
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from . import availability, counters, routers, versions, visits
+from .middleware import ReplicaPinningMiddleware
+from .models import Author, Book, BookInstance, Genre
+from .views import FRAGMENT_CACHE_TIMEOUT, page_etag, page_versions, patch_page_cache_control
+
+PAGE_SIZE = 10
+
+
+def _in_worker(pinned, func, *args):
+    # Worker threads are shared by all requests and never see request_finished, so the
+    # connections a call opens are closed when it returns rather than kept for CONN_MAX_AGE
+    routers.pin(pinned)
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+        routers.pin(False)
+        routers.prefer_primary(False)
+
+
+async def _run(request, func, *args):
+    """Call `func(*args)` in a worker thread, without blocking the event loop."""
+    pinned = ReplicaPinningMiddleware.cookie_name in request.COOKIES or getattr(request, '_catalog_recent', False)
+    return await sync_to_async(_in_worker, thread_sensitive=False)(pinned, func, *args)
+
+
+async def _gather(request, *calls):
+    """Run the `(func, *args)` calls concurrently; returns their results in order."""
+    return await asyncio.gather(*(_run(request, *call) for call in calls))
+
+
+async def _render(request, template_name, context):
+    return await _run(request, render, request, template_name, context)
+
+
+async def _not_modified(request, models, book_pk=None):
+    """The 304 response if the client's copy of the page is current; also returns the page's validators."""
+    found = await _run(request, page_versions, request, models, book_pk)
+    etag = quote_etag(page_etag(request, found))
+    last_modified = timegm(versions.last_modified(*found).utctimetuple())
+    return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+
+def _conditional(*models, book=False):
+    """Async counterpart of views.conditional()."""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            response, etag, last_modified = await _not_modified(request, models, kwargs['pk'] if book else None)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if request.method in ('GET', 'HEAD'):
+                    response.setdefault('ETag', etag)
+                    response.setdefault('Last-Modified', http_date(last_modified))
+            patch_page_cache_control(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def _visit(request):
+    num_visits = visits.visitor_count(request)
+    visits.counter.hit()
+    return num_visits
+
+
+async def index(request):
+    """Async home page: a cold counters cache is refilled by all its count queries at once."""
+    counts, num_visits = await _gather(request, (counters.cached_counts, [visits.total_key()]), (_visit, request))
+    if counts is None:
+        counts = {}
+        for part in await _gather(request, *((query,) for query in counters.COUNT_QUERIES)):
+            counts.update(part)
+        await _run(request, counters.store, counts)
+    stored = counts.pop(visits.total_key(), None)
+    total_visits = (visits.counter.total(stored=stored) if stored is not None
+                    else await _run(request, visits.counter.total))
+
+    context = dict(counts, num_visits=num_visits, total_visits=total_visits)
+    response = await _render(request, 'index.html', context)
+    await _run(request, visits.remember_visit, request, response, num_visits + 1)
+    return response
+
+
+def _fetch(queryset):
+    queryset._fetch_all()  # pylint: disable=protected-access
+    return queryset
+
+
+async def _page(request, queryset):
+    """The requested page of `queryset`, counted and fetched at the same time."""
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError as error:
+        raise Http404('Invalid page') from error
+    if number < 1:
+        raise Http404('Invalid page')
+    offset = (number - 1) * PAGE_SIZE
+    count, rows = await _gather(request, (queryset.count,), (list, queryset[offset:offset + PAGE_SIZE]))
+
+    paginator = Paginator(queryset, PAGE_SIZE)
+    paginator.count = count
+    if number > paginator.num_pages:
+        raise Http404('Invalid page')
+    return Page(rows, number, paginator)
+
+
+def _list_context(name, page):
+    return {
+        'paginator': page.paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list,
+        name: page.object_list,
+    }
+
+
+@_conditional('book', 'author')
+async def book_list(request):
+    """Async list of books, with their authors."""
+    page = await _page(request, Book.objects.select_related('author').order_by('title', 'id'))
+    return await _render(request, 'catalogapp/book_list.html', _list_context('book_list', page))
+
+
+@_conditional('author')
+async def author_list(request):
+    """Async list of authors."""
+    page = await _page(request, Author.objects.order_by('last_name', 'first_name', 'id'))
+    return await _render(request, 'catalogapp/author_list.html', _list_context('author_list', page))
+
+
+def _get(queryset, pk):
+    try:
+        return queryset.get(pk=pk)
+    except queryset.model.DoesNotExist as error:
+        raise Http404(f'No {queryset.model._meta.verbose_name} found') from error
+
+
+@_conditional(book=True)
+async def book_detail(request, pk):
+    """Async book details: the book, its genres and its copies are loaded at the same time."""
+    book, genres, copies, version = await _gather(
+        request,
+        (_get, Book.objects.select_related('author', 'language'), pk),
+        (_fetch, Genre.objects.filter(book=pk).only('id', 'book_kind')),
+        (_fetch, BookInstance.objects.filter(book=pk).only('id', 'book', 'imprint', 'due_back', 'status')),
+        (versions.get, 'book', pk),
+    )
+    # Served by book.genre.all and book.bookinstance_set.all, as if prefetched
+    book._prefetched_objects_cache = {'genre': genres, 'bookinstance_set': copies}
+    context = {
+        'book': book,
+        'object': book,
+        'book_version': version,
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT,
+    }
+    return await _render(request, 'catalogapp/book_detail.html', context)
+
+
+@_conditional('author', 'book')
+async def author_detail(request, pk):
+    """Async author details: the author and their books are loaded at the same time."""
+    books = Book.objects.filter(author=pk).only('id', 'title', 'summary', 'author', *availability.FIELDS)
+    author, author_books = await _gather(
+        request,
+        (_get, Author.objects.all(), pk),
+        (list, books.order_by('title', 'id')),
+    )
+    author.books = author_books
+    return await _render(request, 'catalogapp/author_detail.html', {'author': author, 'object': author})
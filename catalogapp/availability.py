@@ -0,0 +1,95 @@
+""" per-book summary of copies (total, by status, next due date), denormalized on Book"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery
+
+from . import versions
+from .models import Book, BookInstance
+
+# Book field counting the copies in each status
+STATUS_FIELDS = {
+    'a': 'copies_available',
+    'o': 'copies_on_loan',
+    'm': 'copies_maintenance',
+    'r': 'copies_reserved',
+}
+
+FIELDS = Book.COPIES_FIELDS
+
+
+def _next_due_back():
+    return Subquery(BookInstance.objects.filter(book_id=OuterRef('pk'), status='o', due_back__isnull=False)
+                    .order_by('due_back').values('due_back')[:1])
+
+
+def lock(*book_ids):
+    """Lock the rows of the given books until the end of the current transaction."""
+    list(Book.objects.select_for_update().filter(pk__in=book_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def record(deltas, due_books=()):
+    """Add `deltas` ({book id: {field: delta}}) with F() updates and refresh next_due_back of `due_books`."""
+    due_books = set(due_books)
+    with transaction.atomic():
+        # In id order, so concurrent callers lock the rows in the same order
+        for book_id in sorted((set(deltas) | due_books) - {None}):
+            changes = {field: F(field) + delta for field, delta in deltas.get(book_id, {}).items() if delta}
+            if book_id in due_books:
+                # Locked first, the UPDATE starts after every other writer of the row committed, so
+                # its subquery sees their copies
+                lock(book_id)
+                changes['next_due_back'] = _next_due_back()
+            if changes:
+                Book.objects.filter(pk=book_id).update(**changes)
+
+
+def copy_moved(old_book_id, old_status, new_book_id, new_status):
+    """Account for a copy leaving (book, status) `old_*` for `new_*`; None ids for creation or deletion."""
+    deltas = defaultdict(Counter)
+    for book_id, status, delta in ((old_book_id, old_status, -1), (new_book_id, new_status, 1)):
+        if book_id is not None:
+            deltas[book_id]['copies_total'] += delta
+            if status in STATUS_FIELDS:
+                deltas[book_id][STATUS_FIELDS[status]] += delta
+    record(deltas, {book_id for book_id, status in ((old_book_id, old_status), (new_book_id, new_status))
+                    if status == 'o'})
+
+
+def summarize(copies):
+    """The summary fields of a book with `copies`, an iterable of (status, due_back) pairs."""
+    values = dict.fromkeys(FIELDS, 0)
+    values['next_due_back'] = None
+    for status, due_back in copies:
+        values['copies_total'] += 1
+        if status in STATUS_FIELDS:
+            values[STATUS_FIELDS[status]] += 1
+        if status == 'o' and due_back and (values['next_due_back'] is None or due_back < values['next_due_back']):
+            values['next_due_back'] = due_back
+    return values
+
+
+def reconcile(book_ids=None, batch_size=500):
+    """Recompute the summaries from the copies in one grouped query; returns how many books changed."""
+    copies = BookInstance.objects.filter(book__isnull=False)
+    books = Book.objects.all()
+    if book_ids is not None:
+        copies = copies.filter(book_id__in=book_ids)
+        books = books.filter(pk__in=book_ids)
+    aggregates = {'copies_total': Count('id'), 'next_due_back': Min('due_back', filter=Q(status='o'))}
+    aggregates.update({field: Count('id', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()})
+    counts = {row.pop('book_id'): row for row in copies.values('book_id').annotate(**aggregates).order_by()}
+
+    empty = summarize(())
+    changed = []
+    for row in books.values('pk', *FIELDS).iterator():
+        book_id = row.pop('pk')
+        expected = counts.get(book_id, empty)
+        if row != expected:
+            changed.append(Book(pk=book_id, **expected))
+    Book.objects.bulk_update(changed, FIELDS, batch_size=batch_size)
+    if changed:
+        versions.bump('book', *(book.pk for book in changed))
+        versions.touch('book')
+    return len(changed)
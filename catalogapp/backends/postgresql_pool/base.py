@@ -0,0 +1,75 @@
+""" PostgreSQL backend taking its connections from an in-process pool (catalogapp.dbpool)
+
+Use it as the ENGINE with CONN_MAX_AGE = 0: closing a connection at the end of a request
+gives it back to the pool. The optional POOL entry of the database settings holds the
+ConnectionPool arguments in upper case (MAX_SIZE, TIMEOUT, CHECK_AFTER, MAX_IDLE).
+"""
+
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from catalogapp.dbpool import ConnectionPool, PoolTimeout, pools
+
+_lock = threading.Lock()
+# alias -> isolation level of the pool's connections, found when the first one was opened
+_isolation_levels = {}
+
+
+def _is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _pool(self):
+        with _lock:
+            pool = pools.get(self.alias)
+            if pool is None:
+                options = {key.lower(): value for key, value in self.settings_dict.get('POOL', {}).items()}
+                pool = pools[self.alias] = ConnectionPool(check=_is_usable, **options)
+            return pool
+
+    def get_new_connection(self, conn_params):
+        opened = []
+
+        def connect():
+            opened.append(True)
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+
+        try:
+            connection = self._pool().acquire(connect)
+        except PoolTimeout as error:
+            raise base.Database.OperationalError(str(error)) from error
+        # get_new_connection() sets the isolation level only on the connections it opens
+        if opened:
+            _isolation_levels[self.alias] = self.isolation_level
+        else:
+            self.isolation_level = _isolation_levels[self.alias]
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            self._pool().release(self.connection, reusable=self._reset())
+
+    def _reset(self):
+        """Whether the connection can be handed out again, after ending any transaction left open."""
+        connection = self.connection
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                return False
+            status = connection.get_transaction_status()
+        return status == extensions.TRANSACTION_STATUS_IDLE
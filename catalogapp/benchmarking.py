@@ -0,0 +1,414 @@
+""" helpers shared by the benchmark management commands: data generation, timing, WSGI and ASGI harnesses"""
+
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import math
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.db import connection, connections
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from . import counters, search, typeahead, urls, versions
+from .availability import summarize as summarize_copies
+from .models import Author, Book, BookInstance, Genre, Language
+
+SYLLABLES = ('an', 'bel', 'cor', 'da', 'el', 'fen', 'gar', 'hol', 'is', 'jor', 'ka', 'lin', 'mor', 'nes',
+             'o', 'per', 'qua', 'ros', 'sil', 'tor', 'u', 'ven', 'wil', 'xa', 'yor', 'zen')
+
+
+def percentile(samples, fraction):
+    """The `fraction` (0-1) percentile of `samples`, by the nearest-rank method."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Mean, p50, p99 and max of timing `samples` (seconds), in milliseconds."""
+    if not samples:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+
+def time_calls(function, arguments):
+    """Call `function` once per item of `arguments` and return the duration of each call."""
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def vocabulary(rng, size):
+    """Pseudo-words of 2 to 4 syllables, standing in for the words of real titles and names."""
+    return sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)})
+
+
+# Catalog sizes for generate_catalog()
+SCALES = {
+    'small': {'authors': 50, 'books': 500, 'genres': 20, 'copies': 3, 'borrowers': 25},
+    'medium': {'authors': 500, 'books': 10000, 'genres': 50, 'copies': 3, 'borrowers': 200},
+    'large': {'authors': 5000, 'books': 100000, 'genres': 100, 'copies': 3, 'borrowers': 2000},
+}
+
+LANGUAGES = ('English', 'French', 'German', 'Russian', 'Spanish')
+
+# Share of copies in each status
+STATUS_WEIGHTS = {'a': 5, 'o': 3, 'm': 1, 'r': 1}
+
+LIBRARIAN = 'bench-librarian'
+
+
+def generate_catalog(authors, books, genres, copies, borrowers, seed=1, batch_size=2000):
+    """Fill an empty database with a catalog made only from `seed`.
+
+    Books get 0 to 2 * `copies` copies each; copies on loan go to the `borrowers`
+    readers, due within three weeks either side of today. A librarian who may mark
+    copies returned is added for the pages needing one.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(rng, max(books // 2, 1000))
+    today = datetime.date.today()
+    statuses = [status for status, weight in STATUS_WEIGHTS.items() for _ in range(weight)]
+
+    librarian = User.objects.create_user(LIBRARIAN, is_staff=True)
+    librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+    readers = User.objects.bulk_create([User(username=f'reader{number}', email=f'reader{number}@example.com')
+                                        for number in range(borrowers)])
+    languages = Language.objects.bulk_create([Language(lang_name=name) for name in LANGUAGES])
+    kinds = Genre.objects.bulk_create([Genre(book_kind='Love')] + [
+        Genre(book_kind=f'{rng.choice(words).capitalize()} {number}') for number in range(1, genres)])
+    people = Author.objects.bulk_create([Author(
+        first_name=rng.choice(words).capitalize(), last_name=rng.choice(words).capitalize(),
+        date_of_birth=datetime.date(1800, 1, 1) + datetime.timedelta(days=rng.randrange(70000)),
+    ) for _ in range(authors)])
+
+    for start in range(0, books, batch_size):
+        batch, batch_copies = [], []
+        for _ in range(start, min(start + batch_size, books)):
+            book_copies = []
+            for _ in range(rng.randint(0, 2 * copies)):
+                status = rng.choice(statuses)
+                on_loan = status == 'o'
+                book_copies.append(BookInstance(
+                    id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                    imprint=f'{rng.choice(words).capitalize()} Press, {rng.randint(1950, 2020)}',
+                    status=status,
+                    due_back=today + datetime.timedelta(days=rng.randint(-21, 21)) if on_loan else None,
+                    borrower=rng.choice(readers) if on_loan and readers else None,
+                ))
+            batch.append(Book(
+                title=' '.join(rng.choice(words) for _ in range(rng.randint(1, 5))).capitalize(),
+                summary=' '.join(rng.choice(words) for _ in range(rng.randint(10, 60))).capitalize() + '.',
+                isbn=''.join(rng.choice('0123456789') for _ in range(13)),
+                author=rng.choice(people) if people else None,
+                language=rng.choice(languages),
+                **summarize_copies((copy.status, copy.due_back) for copy in book_copies),
+            ))
+            batch_copies.append(book_copies)
+        Book.objects.bulk_create(batch)
+        Book.genre.through.objects.bulk_create([
+            Book.genre.through(book_id=book.pk, genre_id=genre.pk)
+            for book in batch for genre in rng.sample(kinds, min(rng.randint(1, 3), len(kinds)))
+        ])
+        for book, book_copies in zip(batch, batch_copies):
+            for copy in book_copies:
+                copy.book = book
+        BookInstance.objects.bulk_create([copy for book_copies in batch_copies for copy in book_copies])
+
+    # bulk_create sends no signals
+    counters.reconcile()
+    search.rebuild()
+    typeahead.changed()
+    versions.touch(*versions.MODELS)
+
+
+# URL names left out of the view benchmark, with the reason
+SKIPPED_URLS = {
+    'bulk-loans': 'POST only; changes the catalog',
+}
+
+
+def _sample_arguments():
+    """Positional arguments and query strings for the catalog URL names, taken from the generated data."""
+    book = Book.objects.filter(copies_total__gt=0).order_by('id').first() or Book.objects.order_by('id').first()
+    author = Author.objects.order_by('id').first()
+    loan = BookInstance.objects.filter(status='o').order_by('id').first()
+    word = (book.title.split() or ['a'])[0] if book else 'a'
+    return {
+        'book-detail': ([book.pk], ''), 'book_update': ([book.pk], ''), 'book_delete': ([book.pk], ''),
+        'author-detail': ([author.pk], ''), 'author_update': ([author.pk], ''), 'author_delete': ([author.pk], ''),
+        'renew-book-librarian': ([loan.pk], ''),
+        'export': (['books', 'csv'], ''),
+        'search': ([], f'q={word}'),
+        'suggest': ([], f'q={word[:3]}'),
+        'books': ([], 'page=2'),
+        'async-book-detail': ([book.pk], ''), 'async-author-detail': ([author.pk], ''),
+        'async-books': ([], 'page=2'),
+        'api-list': (['books'], 'embed=author,genres&limit=20'),
+        'api-detail': (['books', book.pk], 'embed=author,genres,copies'),
+    }
+
+
+def catalog_urls():
+    """(name, path) of every view in catalogapp/urls.py the benchmark drives."""
+    arguments = _sample_arguments()
+    paths = []
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or pattern.name in SKIPPED_URLS:
+            continue
+        args, query = arguments.get(pattern.name, ([], ''))
+        path = reverse(pattern.name, args=args)
+        paths.append((pattern.name, f'{path}?{query}' if query else path))
+    return paths
+
+
+class WSGIHarness:
+    """Send GET requests straight to a WSGI application, in-process, as a logged in librarian."""
+
+    def __init__(self, application, username=LIBRARIAN):
+        self.application = application
+        client = Client()
+        client.force_login(User.objects.get(username=username))
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def _environ(self, url):
+        parts = urlsplit(url)
+        return {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query,
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'localhost', 'HTTP_COOKIE': self.cookie,
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': False, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    def get(self, url):
+        """Request `url`; returns (status code, number of SQL queries)."""
+        status = []
+        queries = [0]
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            body = self.application(self._environ(url), start_response)
+            try:
+                for _ in body:
+                    pass
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        return status[0], queries[0]
+
+    def measure(self, url, requests):
+        """Request `url` once to warm up, then `requests` times; returns its statistics."""
+        status, _ = self.get(url)
+        samples, query_counts = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            start = time.perf_counter()
+            _, queries = self.get(url)
+            samples.append(time.perf_counter() - start)
+            query_counts.append(queries)
+        elapsed = time.perf_counter() - started
+        stats = summarize(samples)
+        return {
+            'url': url,
+            'status': status,
+            'rps': round(requests / elapsed if elapsed else 0.0, 1),
+            'p50_ms': round(stats['p50_ms'], 2),
+            'p99_ms': round(stats['p99_ms'], 2),
+            'queries': max(query_counts, default=0),
+        }
+
+
+class ASGIHarness:
+    """Send GET requests straight to an ASGI application, in-process, as a logged in librarian."""
+
+    def __init__(self, application, username=LIBRARIAN):
+        self.application = application
+        self.cookie = WSGIHarness(None, username).cookie
+
+    def _scope(self, url):
+        parts = urlsplit(url)
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(),
+            'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            'headers': [(b'host', b'localhost'), (b'cookie', self.cookie.encode())],
+        }
+
+    async def get(self, url):
+        """Request `url`; returns the status code."""
+        status = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if requested:
+                # Nothing more will come: wait like a client keeping the connection open
+                await asyncio.Event().wait()
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await self.application(self._scope(url), receive, send)
+        return status[0]
+
+
+def load_test_wsgi(harness, urls, requests, concurrency):
+    """Spread `requests` GETs of `urls` (in turn) over `concurrency` threads, each handling one request
+    at a time like a sync worker. Returns the throughput and latency statistics."""
+    def one(index):
+        start = time.perf_counter()
+        harness.get(urls[index % len(urls)])
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        samples = list(executor.map(one, range(requests)))
+    return _load_stats(samples, time.perf_counter() - started)
+
+
+async def load_test_asgi(harness, urls, requests, concurrency):
+    """Send `requests` GETs of `urls` (in turn) to an ASGI application, `concurrency` at a time, on
+    one event loop. Returns the throughput and latency statistics."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            await harness.get(urls[index % len(urls)])
+            return time.perf_counter() - start
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(one(index) for index in range(requests)))
+    return _load_stats(samples, time.perf_counter() - started)
+
+
+def hammer(function, arguments, concurrency):
+    """Call `function(argument)` for each of `arguments` from `concurrency` threads started together,
+    each with its own database connection, closed when it is done.
+
+    Returns the results, the exceptions raised (in no particular order) and the elapsed seconds.
+    """
+    work = queue.SimpleQueue()
+    for argument in arguments:
+        work.put(argument)
+    results, errors = [], []
+    start = threading.Barrier(concurrency + 1)
+
+    def worker():
+        start.wait()
+        try:
+            while True:
+                try:
+                    argument = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results.append(function(argument))
+                except Exception as error:  # pylint: disable=broad-except
+                    errors.append(error)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return results, errors, time.perf_counter() - started
+
+
+def close_other_connections():
+    """Disconnect the worker threads' persistent connections to the database, so it can be dropped."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                       'WHERE datname = current_database() AND pid <> pg_backend_pid()')
+
+
+@contextlib.contextmanager
+def benchmark_database(keepdb=False):
+    """Run the block against a test database, which is dropped afterwards unless `keepdb`.
+
+    With `keepdb` the database of the previous run, and the catalog generated in it, is reused.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+    try:
+        yield
+    finally:
+        # Worker threads, and the async views, leave connections open
+        close_other_connections()
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def _load_stats(samples, elapsed):
+    stats = summarize(samples)
+    return {
+        'rps': round(len(samples) / elapsed if elapsed else 0.0, 1),
+        'p50_ms': round(stats['p50_ms'], 2),
+        'p99_ms': round(stats['p99_ms'], 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Regressions of `results` against `baseline` ({name: stats}): slower p50 or more queries.
+
+    Returns a list of (name, reason); latency only counts beyond the `threshold` fraction.
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if stats['queries'] > base['queries']:
+            regressions.append((name, f"queries {base['queries']} -> {stats['queries']}"))
+        if stats['p50_ms'] > base['p50_ms'] * (1 + threshold):
+            regressions.append((name, f"p50 {base['p50_ms']:.2f} -> {stats['p50_ms']:.2f} ms"))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as stream:
+        return json.load(stream)
+
+
+def save_baseline(path, results, meta):
+    with open(path, 'w') as stream:
+        json.dump({'meta': meta, 'results': results}, stream, indent=2, sort_keys=True)
+        stream.write('\n')
@@ -0,0 +1,121 @@
+""" dashboard counters shown on the index page, kept in a cache
+
+The counters are changed with atomic UPDATEs of their CounterTotal rows, so concurrent
+writers never lose a change, and each new value is published to the cache the index
+page reads.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Book, BookInstance, Author, Genre, CounterTotal
+
+# Cache alias holding the counters (see CACHES in library/settings.py)
+CACHE_ALIAS = getattr(settings, 'CATALOGAPP_COUNTERS_CACHE', 'counters')
+KEY_PREFIX = 'catalogapp:counter:'
+
+COUNTERS = (
+    'num_books',
+    'num_instances',
+    'num_instances_available',
+    'num_authors',
+    'num_genre',
+    'num_books_available',
+)
+
+# Genre counted as 'Books available' on the home page
+LOVE_GENRE = 'Love'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(name):
+    return KEY_PREFIX + name
+
+
+# pylint: disable=maybe-no-member
+def _count_instances():
+    return BookInstance.objects.aggregate(
+        num_instances=Count('id'),
+        num_instances_available=Count('id', filter=Q(status__exact='a')),
+    )
+
+
+def _count_genres():
+    return Genre.objects.aggregate(
+        num_genre=Count('id'),
+        num_books_available=Count('id', filter=Q(book_kind=LOVE_GENRE)),
+    )
+
+
+def _count_books():
+    return {'num_books': Book.objects.count()}
+
+
+def _count_authors():
+    return {'num_authors': Author.objects.count()}
+
+
+# Independent queries that together count every counter; each returns {name: count}
+COUNT_QUERIES = (_count_instances, _count_genres, _count_books, _count_authors)
+
+
+def compute_counts():
+    """Count every dashboard counter straight from the database."""
+    counts = {}
+    for query in COUNT_QUERIES:
+        counts.update(query())
+    return counts
+
+
+def store(counts):
+    """Overwrite the stored and cached counters with `counts`."""
+    with transaction.atomic():
+        for name, value in counts.items():
+            CounterTotal.objects.update_or_create(name=name, defaults={'count': value})
+        _cache().set_many({_key(name): value for name, value in counts.items()}, timeout=None)
+    return counts
+
+
+def reconcile():
+    """Recompute all counters from the database and overwrite the cached values."""
+    return store(compute_counts())
+
+
+def cached_counts(extra_keys=()):
+    """All counters from the cache, or None if any is missing.
+
+    The values of `extra_keys`, other keys of the counters cache, are read in the same
+    round trip and added under their key when present.
+    """
+    cached = _cache().get_many([_key(name) for name in COUNTERS] + list(extra_keys))
+    if not all(_key(name) in cached for name in COUNTERS):
+        return None
+    counts = {name: cached[_key(name)] for name in COUNTERS}
+    counts.update((key, cached[key]) for key in extra_keys if key in cached)
+    return counts
+
+
+def get_counts(extra_keys=()):
+    """Return all counters, hitting the database only if the cache is cold (see cached_counts())."""
+    counts = cached_counts(extra_keys)
+    if counts is None:
+        return reconcile()
+    return counts
+
+
+def incr(name, delta=1):
+    """Adjust a single counter. One never stored is dropped from the cache: the next read recounts it."""
+    if not delta:
+        return
+    with transaction.atomic():
+        totals = CounterTotal.objects.filter(name=name)
+        if totals.update(count=F('count') + delta):
+            # Read and published while the row is locked, so the cache gets the values in order
+            _cache().set(_key(name), totals.values_list('count', flat=True).get(), timeout=None)
+        else:
+            _cache().delete(_key(name))
@@ -0,0 +1,143 @@
+""" database connection lifecycle: health checks of persistent connections and an in-process pool"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.dispatch import receiver
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's timeout."""
+
+
+class ConnectionPool:
+    """Up to `max_size` open connections shared by the threads of a process.
+
+    A thread waits up to `timeout` seconds for a connection when all are in use. Idle
+    connections are checked with `check(connection)` before reuse once they have been idle
+    `check_after` seconds, and closed after `max_idle` seconds.
+    """
+
+    def __init__(self, max_size=10, timeout=5.0, check_after=10.0, max_idle=300.0, check=None, close=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_idle = max_idle
+        self._check = check or (lambda connection: True)
+        self._close = close or (lambda connection: connection.close())
+        self._lock = threading.Condition()
+        self._idle = []  # (connection, released at), most recently released last
+        self.in_use = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.opened = 0
+        self.discarded = 0
+
+    def acquire(self, connect):
+        """An idle connection, or a new one made by calling `connect()`."""
+        with self._lock:
+            if not self._idle and self.in_use >= self.max_size:
+                self.waits += 1
+                start = time.monotonic()
+                free = self._lock.wait_for(lambda: self._idle or self.in_use < self.max_size, self.timeout)
+                self.wait_seconds += time.monotonic() - start
+                if not free:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s ({self.max_size} in use)')
+            self.in_use += 1
+            connection, released_at = self._idle.pop() if self._idle else (None, None)
+
+        try:
+            if connection is not None:
+                idle = time.monotonic() - released_at
+                if idle >= self.max_idle or (idle >= self.check_after and not self._check(connection)):
+                    self._discard(connection)
+                    connection = None
+            if connection is None:
+                connection = connect()
+                self.opened += 1
+        except BaseException:
+            with self._lock:
+                self.in_use -= 1
+                self._lock.notify()
+            raise
+        return connection
+
+    def release(self, connection, reusable=True):
+        """Give back a connection from acquire(); closed unless `reusable`."""
+        with self._lock:
+            self.in_use -= 1
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+        if not reusable:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        self.discarded += 1
+        try:
+            self._close(connection)
+        except Exception:  # pylint: disable=broad-except
+            # It is being thrown away because it is broken
+            pass
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'waits': self.waits,
+                'wait_seconds': self.wait_seconds,
+                'timeouts': self.timeouts,
+                'opened': self.opened,
+                'discarded': self.discarded,
+            }
+
+
+# alias -> ConnectionPool, filled in by the pooling database backend
+pools = {}
+
+
+@receiver(request_finished)
+def mark_idle(**kwargs):
+    """Note when the open persistent connections went idle, for check_connections()."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.catalogapp_idle_since = (connection.connection, now)
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Close persistent connections the database has dropped, before the request uses them.
+
+    Django only notices a dead connection when a query fails on it; with CONN_MAX_AGE set a
+    restarted or failed-over database would otherwise cost each worker one failed request.
+    As ConnectionPool does, only connections idle for CATALOGAPP_CONN_HEALTH_CHECK_AFTER
+    seconds are checked, so a busy worker does not pay a query per connection per request.
+    """
+    if not getattr(settings, 'CATALOGAPP_CONN_HEALTH_CHECKS', False):
+        return
+    check_after = getattr(settings, 'CATALOGAPP_CONN_HEALTH_CHECK_AFTER', 10.0)
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        # Connections opened outside a request have no mark and are checked
+        raw, idle_since = getattr(connection, 'catalogapp_idle_since', (None, None))
+        if raw is connection.connection and now - idle_since < check_after:
+            continue
+        if not connection.is_usable():
+            connection.close()
@@ -1,4 +1,5 @@
 import datetime
+import uuid
 from django import forms
 from django.core.exceptions import ValidationError
 
@@ -18,4 +19,46 @@ class RenewBookForm(forms.Form):
             raise ValidationError('Invalid date - renewal more than 4 weeks ahead')
 
         # Remember to always return the cleaned data.
-        return data
\ No newline at end of file
+        return data
+
+
+class MultipleUUIDField(forms.Field):
+    """A list of UUIDs, such as the ids of the copies ticked in a list, sent as hidden inputs."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [uuid.UUID(str(item)) for item in value or ()]
+        except ValueError as error:
+            raise ValidationError('Invalid copy id') from error
+
+    def validate(self, value):
+        if self.required and not value:
+            raise ValidationError('Select at least one copy')
+
+
+class BulkLoanForm(RenewBookForm):
+    """Renew or return several copies at once; the renewal date follows the RenewBookForm rules."""
+    ACTIONS = (
+        ('renew', 'Renew'),
+        ('return', 'Mark returned'),
+    )
+
+    action = forms.ChoiceField(choices=ACTIONS)
+    copies = MultipleUUIDField()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['renewal_date'].required = False
+
+    def clean_renewal_date(self):
+        if self.cleaned_data['renewal_date'] is None:
+            return None
+        return super().clean_renewal_date()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'renew' and 'renewal_date' in cleaned_data \
+                and cleaned_data['renewal_date'] is None:
+            self.add_error('renewal_date', 'A renewal needs a date')
+        return cleaned_data
@@ -0,0 +1,231 @@
+""" bulk catalog import: record readers and a batched loader"""
+
+import csv
+import io
+import json
+import re
+
+from django.db import connections, router, transaction
+
+from . import availability, counters, search, typeahead, versions
+from .models import Author, Book, BookInstance, Genre, Language
+
+FORMATS = ('csv', 'jsonl', 'marc')
+
+STATUSES = {code for code, _ in BookInstance.LOAN_STATUS}
+
+
+def _split_list(value):
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in re.split(r'[;|]', value or '') if item.strip()]
+
+
+def _split_name(name):
+    """'Last, First' (or 'First Last') -> (last, first)."""
+    name = (name or '').strip()
+    if ',' in name:
+        last, first = name.split(',', 1)
+        return last.strip(), first.strip()
+    first, _, last = name.rpartition(' ')
+    return last.strip(), first.strip()
+
+
+def normalize_record(raw):
+    """Turn a raw CSV/JSONL/MARC record into the dict the loader expects.
+
+    Recognised keys: title, author ('Last, First') or author_last_name and
+    author_first_name, summary, isbn, language, genres (list or ';'-separated),
+    imprint, copies (a number of copies or a list of {imprint, status, due_back}),
+    status (of numbered copies).
+    """
+    if raw.get('author_last_name') or raw.get('author_first_name'):
+        author = ((raw.get('author_last_name') or '').strip(), (raw.get('author_first_name') or '').strip())
+    elif raw.get('author'):
+        author = _split_name(raw['author'])
+    else:
+        author = None
+    if author:
+        author = (author[0][:100], author[1][:100])
+    imprint = (raw.get('imprint') or '').strip()
+    status = (raw.get('status') or 'a').strip()
+    copies = raw.get('copies') or []
+    if not isinstance(copies, list):
+        copies = [{'imprint': imprint, 'status': status}] * int(copies)
+    return {
+        'title': (raw.get('title') or '').strip()[:200],
+        'author': author,
+        'summary': (raw.get('summary') or '').strip()[:1000],
+        'isbn': (raw.get('isbn') or '').strip()[:13],
+        'language': (raw.get('language') or '').strip()[:200] or None,
+        'genres': [genre[:200] for genre in _split_list(raw.get('genres'))],
+        'copies': [{
+            'imprint': (copy.get('imprint') or imprint).strip()[:200],
+            'status': copy.get('status') if copy.get('status') in STATUSES else 'a',
+            'due_back': copy.get('due_back') or None,
+        } for copy in copies],
+    }
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+# MARC-lite: MARC mnemonic text (as written by MarcEdit), one '=TAG  indicators$a...' line
+# per field and a blank line between records. Used fields: 100 author, 245 title,
+# 020 ISBN, 041 language, 520 summary, 650/655 genres, 260/264 $b imprint, 852 one copy each.
+_MARC_FIELD_RE = re.compile(r'^=(\w{3})\s\s?(.*)$')
+
+
+def _marc_subfields(data):
+    subfields = {}
+    for part in data.split('$')[1:]:
+        if part:
+            subfields.setdefault(part[0], part[1:].strip().rstrip(' /:;,.'))
+    return subfields
+
+
+def _marc_record(fields):
+    record = {'genres': [], 'copies': []}
+    for tag, data in fields:
+        subfields = _marc_subfields(data)
+        value = subfields.get('a', '')
+        if tag == '100':
+            record['author'] = value
+        elif tag == '245':
+            record['title'] = ' '.join(filter(None, (value, subfields.get('b'))))
+        elif tag == '020':
+            record['isbn'] = value.split(' ')[0]
+        elif tag == '041':
+            record['language'] = value
+        elif tag == '520':
+            record['summary'] = value
+        elif tag in ('650', '655'):
+            record['genres'].append(value)
+        elif tag in ('260', '264') and subfields.get('b'):
+            record['imprint'] = subfields['b']
+        elif tag == '852':
+            record['copies'].append({'imprint': subfields.get('b', ''), 'status': subfields.get('x', 'a')})
+    return record
+
+
+def read_marc(stream):
+    fields = []
+    for line in stream:
+        line = line.rstrip('\r\n')
+        match = _MARC_FIELD_RE.match(line)
+        if match:
+            fields.append(match.groups())
+        elif not line.strip() and fields:
+            yield _marc_record(fields)
+            fields = []
+    if fields:
+        yield _marc_record(fields)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'marc': read_marc}
+
+
+def read_records(stream, fmt):
+    """Yield normalized records from a text stream in format `fmt`."""
+    for raw in READERS[fmt](stream):
+        yield normalize_record(raw)
+
+
+def open_text(path):
+    """Open `path` for streaming, transparently decompressing .gz files."""
+    if path.endswith('.gz'):
+        import gzip  # pylint: disable=import-outside-toplevel
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+class CatalogLoader:
+    """Write batches of normalized records with bulk_create.
+
+    Authors, languages and genres are resolved through in-memory maps loaded once,
+    so each batch costs a handful of INSERTs whatever its size.
+    """
+
+    def __init__(self, using=None):
+        self.using = using or router.db_for_write(Book)
+        self.created = {'books': 0, 'copies': 0, 'authors': 0, 'languages': 0, 'genres': 0}
+        self._load_maps()
+
+    def _load_maps(self):
+        self.authors = {(last, first): pk for pk, last, first in
+                        Author.objects.using(self.using).values_list('id', 'last_name', 'first_name').iterator()}
+        self.languages = {name: pk for pk, name in Language.objects.using(self.using).values_list('id', 'lang_name')}
+        self.genres = {name: pk for pk, name in Genre.objects.using(self.using).values_list('id', 'book_kind')}
+
+    def _resolve(self, model, lookup, keys, make, counter):
+        """Create the objects for `keys` missing from `lookup` and add their ids to it."""
+        missing = [key for key in dict.fromkeys(keys) if key not in lookup]
+        if not missing:
+            return
+        created = self._bulk_create(model, [make(key) for key in missing])
+        for key, obj in zip(missing, created):
+            lookup[key] = obj.pk
+        self.created[counter] += len(missing)
+
+    def _bulk_create(self, model, objs):
+        """bulk_create `objs`, one by one where the backend cannot return the new primary keys."""
+        if connections[self.using].features.can_return_rows_from_bulk_insert:
+            return model.objects.using(self.using).bulk_create(objs)
+        for obj in objs:
+            obj.save(using=self.using)
+        return objs
+
+    def load(self, records):
+        """Write one batch of records in a single transaction."""
+        try:
+            books, copies = self._load(records)
+        except Exception:
+            # The maps may hold ids of rows the rollback removed
+            self._load_maps()
+            raise
+        self.created['books'] += len(books)
+        self.created['copies'] += len(copies)
+
+    def _load(self, records):
+        with transaction.atomic(using=self.using):
+            self._resolve(Author, self.authors, [r['author'] for r in records if r['author']],
+                          lambda key: Author(last_name=key[0], first_name=key[1]), 'authors')
+            self._resolve(Language, self.languages, [r['language'] for r in records if r['language']],
+                          lambda name: Language(lang_name=name), 'languages')
+            self._resolve(Genre, self.genres, [genre for r in records for genre in r['genres']],
+                          lambda name: Genre(book_kind=name), 'genres')
+
+            books = self._bulk_create(Book, [Book(
+                title=record['title'],
+                summary=record['summary'],
+                isbn=record['isbn'],
+                author_id=self.authors.get(record['author']),
+                language_id=self.languages.get(record['language']),
+                **availability.summarize((copy['status'], copy['due_back']) for copy in record['copies']),
+            ) for record in records])
+
+            Book.genre.through.objects.using(self.using).bulk_create([
+                Book.genre.through(book_id=book.pk, genre_id=self.genres[genre])
+                for book, record in zip(books, records) for genre in dict.fromkeys(record['genres'])
+            ])
+            copies = BookInstance.objects.using(self.using).bulk_create([
+                BookInstance(book_id=book.pk, imprint=copy['imprint'], status=copy['status'],
+                             due_back=copy['due_back'])
+                for book, record in zip(books, records) for copy in record['copies']
+            ], batch_size=1000)
+        return books, copies
+
+    @staticmethod
+    def finish():
+        """Bring the data kept outside the catalog tables up to date; bulk_create sends no signals."""
+        counters.reconcile()
+        search.rebuild(missing_only=True)
+        typeahead.changed()
+        versions.touch(*versions.MODELS)
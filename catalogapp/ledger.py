@@ -0,0 +1,188 @@
+""" append-only loan history (LoanEvent), partitioned by month on PostgreSQL, and its archival
+
+On PostgreSQL each month of events is a partition of its own, so a history query for a
+date range reads only those months and archiving a month drops a whole table instead of
+deleting millions of rows. Elsewhere the events stay in a plain table.
+"""
+
+import datetime
+import gzip
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, ProgrammingError, connections, transaction
+from django.utils import timezone
+
+from .models import LoanEvent
+
+BATCH_SIZE = 1000
+
+# (database name, first of month) of the partitions known to exist
+_ready = set()
+
+
+def month_of(moment):
+    """The first day of the month (UTC) of an aware datetime."""
+    moment = moment.astimezone(timezone.utc)
+    return datetime.date(moment.year, moment.month, 1)
+
+
+def next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def previous_month(month):
+    return datetime.date(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """The (start, end) datetimes of `month`, end excluded."""
+    end = next_month(month)
+    return (datetime.datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+            datetime.datetime(end.year, end.month, 1, tzinfo=timezone.utc))
+
+
+def partition_name(table, month):
+    return f'{table}_{month:%Y%m}'
+
+
+def is_partitioned(connection, table=LoanEvent._meta.db_table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [table])
+        return cursor.fetchone() is not None
+
+
+def partitions(connection, table=LoanEvent._meta.db_table):
+    """The months that have a partition, oldest first."""
+    if not is_partitioned(connection, table):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'WHERE i.inhparent = to_regclass(%s)', [table])
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{table}_'
+    return sorted(datetime.date(int(name[-6:-2]), int(name[-2:]), 1) for name in names
+                  if name.startswith(prefix) and name[len(prefix):].isdigit() and len(name) == len(prefix) + 6)
+
+
+def _create_partition(cursor, quote, table, month):
+    start, end = month_bounds(month)
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS {quote(partition_name(table, month))} PARTITION OF {quote(table)} '
+                   f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+
+
+def ensure_partitions(months, using=DEFAULT_DB_ALIAS):
+    """Create the partitions of the given months (first days) that do not exist yet."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    missing = [month for month in set(months) if (connection.settings_dict['NAME'], month) not in _ready]
+    if not missing:
+        return
+    if is_partitioned(connection):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for month in missing:
+                try:
+                    with transaction.atomic(using):
+                        _create_partition(cursor, quote, LoanEvent._meta.db_table, month)
+                except (IntegrityError, ProgrammingError):
+                    # Created by another process at the same moment
+                    pass
+    # Only once committed: a partition created in a transaction rolled back is gone
+    transaction.on_commit(lambda: _ready.update((connection.settings_dict['NAME'], month) for month in missing),
+                          using)
+
+
+def record(events, using=DEFAULT_DB_ALIAS):
+    """Add LoanEvent `events` to the ledger, in bulk."""
+    events = list(events)
+    if events:
+        ensure_partitions({month_of(event.created) for event in events}, using)
+        LoanEvent.objects.using(using).bulk_create(events, batch_size=BATCH_SIZE)
+    return events
+
+
+def partition(schema_editor, model=LoanEvent):
+    """Turn `model`'s table into one range-partitioned by month of `created`, keeping its rows.
+
+    PostgreSQL only; returns whether the table was changed. The primary key becomes
+    (id, created), as a partitioned table's must include the partitioning column.
+    """
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    if connection.vendor != 'postgresql' or is_partitioned(connection, table):
+        return False
+    quote = schema_editor.quote_name
+    old = f'{table}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table])
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {quote(table)} DROP CONSTRAINT {quote(primary_key)}')
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS) '
+                       f'PARTITION BY RANGE ({quote("created")})')
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY ({quote("id")}, {quote("created")})')
+        # Kept when the old table is dropped
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.{quote("id")}')
+
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', {quote('created')} AT TIME ZONE 'UTC') FROM {quote(old)}")
+        months = {row[0].date() for row in cursor.fetchall()}
+        months.add(month_of(timezone.now()))
+        for month in sorted(months):
+            _create_partition(cursor, quote, table, month)
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+    return True
+
+
+def _write(path, rows):
+    """Write `rows` (dicts) to the gzipped JSON Lines file `path`, replacing it; returns how many."""
+    count = 0
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as archive:
+        for row in rows:
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            count += 1
+    os.replace(path + '.tmp', path)
+    return count
+
+
+def archive(before, directory, using=DEFAULT_DB_ALIAS):
+    """Move the events of the months before `before` (a first of month) to one gzipped JSON Lines
+    file per month in `directory`, dropping their partitions. Returns [(month, path, rows)].
+
+    A month's file is complete before its events are removed, so an interrupted run loses
+    nothing and can be run again.
+    """
+    connection = connections[using]
+    events = LoanEvent.objects.using(using)
+    columns = [field.attname for field in LoanEvent._meta.concrete_fields]
+    months = set(events.filter(created__lt=month_bounds(before)[0]).datetimes('created', 'month', tzinfo=timezone.utc))
+    months = {moment.date() for moment in months} | {month for month in partitions(connection) if month < before}
+
+    os.makedirs(directory, exist_ok=True)
+    archived = []
+    for month in sorted(months):
+        start, end = month_bounds(month)
+        in_month = events.filter(created__gte=start, created__lt=end)
+        path = os.path.join(directory, f'loanevent-{month:%Y-%m}.jsonl.gz')
+        count = _write(path, in_month.order_by('created', 'id').values(*columns).iterator(chunk_size=BATCH_SIZE))
+        with transaction.atomic(using):
+            if month in partitions(connection):
+                quote = connection.ops.quote_name
+                name = partition_name(LoanEvent._meta.db_table, month)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ALTER TABLE {quote(LoanEvent._meta.db_table)} DETACH PARTITION {quote(name)}')
+                    cursor.execute(f'DROP TABLE {quote(name)}')
+                _ready.discard((connection.settings_dict['NAME'], month))
+            else:
+                in_month.delete()
+        archived.append((month, path, count))
+    return archived
@@ -0,0 +1,99 @@
+""" bulk renewals and returns of copies on loan, overdue notices"""
+
+import itertools
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from . import availability, counters, ledger, reservations, versions
+from .models import BookInstance, LoanEvent
+
+# Copies updated per UPDATE statement (and transaction)
+CHUNK_SIZE = 500
+
+
+def _chunks(ids, size=CHUNK_SIZE):
+    ids = list(dict.fromkeys(ids))
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _apply(copy_ids, action, changes, librarian):
+    """Apply `changes` to the copies on loan among `copy_ids`, recording each change in the ledger.
+
+    Returns the ids of the books of the copies changed. QuerySet.update() sends no signals,
+    so the counters, the copies summaries and the book versions are adjusted here.
+    """
+    book_ids = []
+    for chunk in _chunks(copy_ids):
+        with transaction.atomic():
+            rows = list(BookInstance.objects.select_for_update().filter(id__in=chunk, status='o').values_list(
+                'id', 'book_id', 'due_back', 'borrower_id'))
+            if not rows:
+                continue
+            BookInstance.objects.filter(id__in=[row[0] for row in rows]).update(**changes)
+            ledger.record([LoanEvent(
+                action=action,
+                bookinstance_id=copy_id,
+                book_id=book_id,
+                borrower_id=borrower_id,
+                librarian=librarian,
+                previous_due_back=due_back,
+                due_back=changes.get('due_back', due_back),
+            ) for copy_id, book_id, due_back, borrower_id in rows])
+            deltas = defaultdict(Counter)
+            if changes.get('status', 'o') != 'o':
+                for _, book_id, _, _ in rows:
+                    deltas[book_id]['copies_on_loan'] -= 1
+                    deltas[book_id][availability.STATUS_FIELDS[changes['status']]] += 1
+            availability.record(deltas, {row[1] for row in rows})
+        book_ids.extend(row[1] for row in rows)
+        versions.bump('book', *{row[1] for row in rows})
+        versions.touch('bookinstance', 'book')
+        if changes.get('status') == 'a':
+            counters.incr('num_instances_available', len(rows))
+    return book_ids
+
+
+def renew(copy_ids, due_back, librarian=None):
+    """Set the due date of the given copies on loan; returns how many were renewed."""
+    return len(_apply(copy_ids, 'renew', {'due_back': due_back}, librarian))
+
+
+def mark_returned(copy_ids, librarian=None):
+    """Make the given copies on loan available again; returns how many were returned.
+
+    The returned copies are set aside for the holds waiting for their books first.
+    """
+    book_ids = _apply(copy_ids, 'return', {'status': 'a', 'due_back': None, 'borrower': None}, librarian)
+    reservations.fulfil(book_id for book_id in book_ids if book_id is not None)
+    return len(book_ids)
+
+
+def overdue_by_borrower(today=None, chunk_size=2000):
+    """Yield (borrower, loans) for every borrower with overdue loans, from one streamed query.
+
+    `borrower` is a dict of id, username, email and first_name, `loans` a list of dicts
+    of the copy's id, book_id, title and due_back.
+    """
+    rows = BookInstance.objects.overdue(today).filter(borrower__isnull=False).order_by(
+        'borrower_id', 'due_back', 'id').values(
+        'borrower_id', 'borrower__username', 'borrower__email', 'borrower__first_name', 'id', 'book_id', 'book__title',
+        'due_back')
+    for _, loans in itertools.groupby(rows.iterator(chunk_size=chunk_size), key=lambda row: row['borrower_id']):
+        loans = list(loans)
+        first = loans[0]
+        borrower = {'id': first['borrower_id'], 'username': first['borrower__username'],
+                    'email': first['borrower__email'], 'first_name': first['borrower__first_name']}
+        yield borrower, [{'id': loan['id'], 'book_id': loan['book_id'], 'title': loan['book__title'],
+                          'due_back': loan['due_back']} for loan in loans]
+
+
+def overdue_notice(borrower, loans, connection=None):
+    """The EmailMessage reminding `borrower` of their overdue `loans`."""
+    body = render_to_string('catalogapp/email/overdue_notice.txt', {'borrower': borrower, 'loans': loans})
+    return EmailMessage('Overdue library books', body, settings.DEFAULT_FROM_EMAIL, [borrower['email']],
+                        connection=connection)
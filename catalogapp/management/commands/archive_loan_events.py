@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from catalogapp import ledger
+
+
+class Command(BaseCommand):
+    help = ('Move the loan events of the months older than the retention period to gzipped JSON Lines files, one '
+            'per month, dropping their partitions, and create the partition of next month ahead of time. '
+            'Meant to run monthly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.CATALOGAPP_LEDGER_RETENTION_MONTHS,
+                            help='Full months of events kept besides the current one '
+                                 f'(default {settings.CATALOGAPP_LEDGER_RETENTION_MONTHS}).')
+        parser.add_argument('--directory', default=settings.CATALOGAPP_LEDGER_ARCHIVE_DIR,
+                            help=f'Where the files go (default {settings.CATALOGAPP_LEDGER_ARCHIVE_DIR}).')
+
+    def handle(self, *args, **options):
+        this_month = ledger.month_of(timezone.now())
+        before = this_month
+        for _ in range(options['months']):
+            before = ledger.previous_month(before)
+
+        for month, path, rows in ledger.archive(before, options['directory']):
+            self.stdout.write(f'{month:%Y-%m}: {rows} events -> {path}')
+        ledger.ensure_partitions([this_month, ledger.next_month(this_month)])
+        kept = ledger.partitions(connection)
+        if kept:
+            self.stdout.write(f'Partitions: {kept[0]:%Y-%m} to {kept[-1]:%Y-%m}')
@@ -0,0 +1,64 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from catalogapp import benchmarking
+from catalogapp.models import Book
+
+# Sync view name -> its async variant (catalogapp/async_views.py)
+VIEWS = {
+    'index': 'async-index',
+    'books': 'async-books',
+    'book-detail': 'async-book-detail',
+    'authors': 'async-authors',
+    'author-detail': 'async-author-detail',
+}
+
+
+class Command(BaseCommand):
+    help = ('Load test the catalog read views: the sync views through the WSGI application with one request per '
+            'worker thread at a time (as gunicorn sync workers), against their async variants through the ASGI '
+            'application on one event loop (as uvicorn). Runs in-process on a generated catalog in a separate '
+            'test database and reports requests/s and p50/p99 latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmarking.SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per run (default 200).')
+        parser.add_argument('--concurrency', type=int, action='append',
+                            help='Requests in flight: WSGI worker threads, ASGI concurrent requests '
+                                 '(repeatable; default 1, 4 and 16).')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and its catalog, for the next run.')
+
+    def handle(self, *args, **options):
+        with benchmarking.benchmark_database(keepdb=options['keepdb']), override_settings(DEBUG=False):
+            self._run(options)
+
+    def _run(self, options):
+        if not Book.objects.exists():
+            self.stdout.write(f"Generating the {options['scale']} catalog...")
+            benchmarking.generate_catalog(seed=options['seed'], **benchmarking.SCALES[options['scale']])
+        # pylint: disable=import-outside-toplevel
+        from library.asgi import application as asgi_application
+        from library.wsgi import application as wsgi_application
+        wsgi = benchmarking.WSGIHarness(wsgi_application)
+        asgi = benchmarking.ASGIHarness(asgi_application)
+        paths = dict(benchmarking.catalog_urls())
+        sync_urls = [paths[name] for name in VIEWS]
+        async_urls = [paths[name] for name in VIEWS.values()]
+        # Warm up the caches, connections and templates
+        for url in sync_urls:
+            wsgi.get(url)
+        asyncio.run(benchmarking.load_test_asgi(asgi, async_urls, len(async_urls), 1))
+
+        self.stdout.write(f"{'server':<6} {'in flight':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for concurrency in options['concurrency'] or (1, 4, 16):
+            runs = (
+                ('WSGI', benchmarking.load_test_wsgi(wsgi, sync_urls, options['requests'], concurrency)),
+                ('ASGI', asyncio.run(benchmarking.load_test_asgi(asgi, async_urls, options['requests'], concurrency))),
+            )
+            for server, stats in runs:
+                self.stdout.write(f"{server:<6} {concurrency:>9} {stats['rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+                                  f"{stats['p99_ms']:>8.2f}")
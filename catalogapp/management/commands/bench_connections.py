@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+
+from catalogapp import benchmarking, dbpool
+from catalogapp.backends.postgresql_pool.base import DatabaseWrapper as PooledDatabaseWrapper
+from catalogapp.models import Book
+
+# Cheap pages, where opening the connection is a large part of the request
+URL_NAMES = ('index', 'authors', 'author-detail', 'book-detail')
+MODES = ('fresh', 'persistent', 'pooled')
+
+
+class Command(BaseCommand):
+    help = ('Compare the latency of cheap catalog pages with a new database connection per request (CONN_MAX_AGE=0), '
+            'with persistent connections and with the connection pool, through the WSGI application, in-process, '
+            'on a generated catalog in a separate test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per URL and mode (default 50).')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and its catalog, for the next run.')
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        settings_dict = connection.settings_dict
+        old_max_age = settings_dict['CONN_MAX_AGE']
+        with benchmarking.benchmark_database(keepdb=options['keepdb']):
+            try:
+                with override_settings(DEBUG=False):
+                    self._run(options)
+            finally:
+                settings_dict['CONN_MAX_AGE'] = old_max_age
+                connections[DEFAULT_DB_ALIAS].close()
+                connections[DEFAULT_DB_ALIAS] = connection
+
+    def _use(self, mode):
+        """Make the default database connect the way `mode` says."""
+        settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+        connections[DEFAULT_DB_ALIAS].close()
+        settings_dict['CONN_MAX_AGE'] = None if mode == 'persistent' else 0
+        if mode == 'pooled':
+            connections[DEFAULT_DB_ALIAS] = PooledDatabaseWrapper(settings_dict, DEFAULT_DB_ALIAS)
+
+    def _run(self, options):
+        if not Book.objects.exists():
+            self.stdout.write('Generating the small catalog...')
+            benchmarking.generate_catalog(seed=options['seed'], **benchmarking.SCALES['small'])
+        from library.wsgi import application  # pylint: disable=import-outside-toplevel
+        harness = benchmarking.WSGIHarness(application)
+        urls = dict(benchmarking.catalog_urls())
+
+        results = {}
+        for mode in MODES:
+            self._use(mode)
+            for name in URL_NAMES:
+                results[mode, name] = harness.measure(urls[name], options['requests'])
+
+        self.stdout.write(f"{'view':<15} {'mode':<11} {'p50 ms':>8} {'p99 ms':>8} {'p50 vs fresh':>13}")
+        for name in URL_NAMES:
+            fresh = results['fresh', name]['p50_ms']
+            for mode in MODES:
+                stats = results[mode, name]
+                delta = (stats['p50_ms'] - fresh) / fresh * 100 if fresh else 0.0
+                self.stdout.write(f"{name:<15} {mode:<11} {stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                                  f"{delta:>+12.0f}%")
+        pool = dbpool.pools.pop(DEFAULT_DB_ALIAS, None)
+        if pool is not None:
+            self.stdout.write(f'Pool: {pool.stats()}')
+            pool.close()
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogapp import availability, benchmarking, loans, reservations
+from catalogapp.models import Book, BookInstance, Hold
+
+ISBN = '9780000000000'
+
+
+class Command(BaseCommand):
+    help = ('Hammer the checkout, hold and return services from many threads at once: patrons rush one popular '
+            'title, those left without a copy queue for it, every copy is returned and picked up by the front of '
+            'the queue. Checks that no copy is lent or set aside twice and reports the throughput of each step, '
+            'in a separate test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=50, help='Copies of the title (default 50).')
+        parser.add_argument('--patrons', type=int, default=500, help='Patrons wanting it (default 500).')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent threads (default 16).')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database for the next run.')
+
+    def handle(self, *args, **options):
+        with benchmarking.benchmark_database(keepdb=options['keepdb']):
+            self._run(options)
+
+    def _step(self, name, function, arguments, threads):
+        results, errors, elapsed = benchmarking.hammer(function, arguments, threads)
+        unexpected = [error for error in errors if not isinstance(error, reservations.Unavailable)]
+        if unexpected:
+            raise CommandError(f'{name}: {unexpected[0]!r}')
+        rate = len(arguments) / elapsed if elapsed else 0.0
+        self.stdout.write(f'{name:<10} {len(arguments):>6} calls {elapsed:>8.3f} s {rate:>9.1f} calls/s '
+                          f'({len(errors)} unavailable)')
+        return results
+
+    def _check(self, condition, message):
+        if not condition:
+            raise CommandError(message)
+
+    def _run(self, options):
+        copies, threads = options['copies'], options['threads']
+        # Rows of a previous run kept with --keepdb
+        BookInstance.objects.filter(book__isbn=ISBN).delete()
+        Book.objects.filter(isbn=ISBN).delete()
+        User.objects.filter(username__startswith='patron').delete()
+        book = Book.objects.create(title='Popular title', summary='Everyone wants it.', isbn=ISBN)
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='Bench Press', status='a')
+                                          for _ in range(copies)])
+        availability.reconcile([book.pk])
+        patrons = User.objects.bulk_create([User(username=f'patron{number}') for number in range(options['patrons'])])
+
+        lent = self._step('checkout', lambda patron: (patron.pk, reservations.checkout(book.pk, patron)),
+                          patrons, threads)
+        self._check(len({copy_id for _, copy_id in lent}) == len(lent) == min(copies, len(patrons)),
+                    f'{len(lent)} checkouts of {copies} copies')
+        borrowers = dict(BookInstance.objects.filter(book=book, status='o').values_list('id', 'borrower_id'))
+        self._check(borrowers == {copy_id: patron_id for patron_id, copy_id in lent},
+                    'The copies on loan do not match the checkouts')
+
+        waiting = [patron for patron in patrons if patron.pk not in {patron_id for patron_id, _ in lent}]
+        holds = self._step('reserve', lambda patron: reservations.reserve(book.pk, patron), waiting, threads)
+        queue = sorted(holds, key=lambda hold: (hold.created, hold.id))
+
+        self._step('return', lambda copy_id: loans.mark_returned([copy_id]), [copy_id for _, copy_id in lent],
+                   threads)
+        ready = list(Hold.objects.filter(book=book, copy__isnull=False).order_by('created', 'id'))
+        self._check([hold.pk for hold in ready] == [hold.pk for hold in queue[:len(ready)]],
+                    'Copies were set aside out of queue order')
+        self._check(len(ready) == min(copies, len(queue)), f'{len(ready)} holds served with {copies} copies returned')
+
+        self._step('pickup', lambda hold: reservations.checkout(book.pk, hold.patron_id), ready, threads)
+        self._check(BookInstance.objects.filter(book=book, status='o').count() == len(ready),
+                    'The picked up copies are not all on loan')
+        self._check(availability.reconcile([book.pk]) == 0, 'The copies summary drifted from the copies')
+        self.stdout.write(f'No copy lent or set aside twice; {len(queue) - len(ready)} patrons still waiting.')
@@ -0,0 +1,68 @@
+import copy
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from catalogapp import benchmarking, metrics, templating
+from catalogapp.models import Book
+
+MODES = ('reload', 'cached')
+
+
+def _templates(mode):
+    """The TEMPLATES setting with the loaders of `mode` (see CATALOGAPP_TEMPLATE_MODE)."""
+    templates = copy.deepcopy(settings.TEMPLATES)
+    loaders = list(settings.TEMPLATE_LOADERS)
+    templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', loaders)] \
+        if mode == 'cached' else loaders
+    return templates
+
+
+class Command(BaseCommand):
+    help = ('Compare the template rendering time of every catalog page with templates read on each render '
+            '(CATALOGAPP_TEMPLATE_MODE=reload) and with the cached loader and navigation cache (cached), through '
+            'the WSGI application, in-process, on a generated catalog in a separate test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmarking.SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per URL and mode (default 20).')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and its catalog, for the next run.')
+
+    def handle(self, *args, **options):
+        with benchmarking.benchmark_database(keepdb=options['keepdb']):
+            self._run(options)
+
+    def _run(self, options):
+        if not Book.objects.exists():
+            self.stdout.write(f"Generating the {options['scale']} catalog...")
+            benchmarking.generate_catalog(seed=options['seed'], **benchmarking.SCALES[options['scale']])
+        from library.wsgi import application  # pylint: disable=import-outside-toplevel
+        harness = benchmarking.WSGIHarness(application)
+        # The async views render in worker threads, where the metrics middleware does not time them
+        urls = [(name, url) for name, url in benchmarking.catalog_urls() if not name.startswith('async-')]
+
+        results = {}
+        for mode in MODES:
+            nav_timeout = 60 * 60 * 24 if mode == 'cached' else 0
+            with override_settings(DEBUG=False, TEMPLATES=_templates(mode), CATALOGAPP_NAV_CACHE_TIMEOUT=nav_timeout):
+                if mode == 'cached':
+                    templating.warm()
+                for name, url in urls:
+                    harness.get(url)
+                    metrics.registry.reset()
+                    for _ in range(options['requests']):
+                        harness.get(url)
+                    histogram = metrics.registry.get('catalogapp_template_duration_seconds', name)
+                    results[mode, name] = histogram.sum / histogram.count * 1000 if histogram else 0.0
+
+        self.stdout.write(f"{'view':<22} {'reload ms':>10} {'cached ms':>10} {'change':>8}")
+        for name, _ in urls:
+            before, after = results['reload', name], results['cached', name]
+            if not before or not after:
+                self.stdout.write(f'{name:<22} {"no templates rendered":>30}')
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            self.stdout.write(f'{name:<22} {before:>10.2f} {after:>10.2f} {change:>+7.0f}%')
@@ -0,0 +1,61 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from catalogapp.benchmarking import summarize, time_calls, vocabulary
+from catalogapp.typeahead import TypeaheadIndex, author_label
+
+
+def synthetic_rows(titles, rng, words):
+    for pk in range(1, titles + 1):
+        yield 'book', pk, ' '.join(rng.choice(words) for _ in range(rng.randint(1, 5))).capitalize()
+    for pk in range(1, titles // 10 + 1):
+        yield 'author', pk, author_label(rng.choice(words).capitalize(), rng.choice(words).capitalize())
+
+
+def misspell(rng, word):
+    """Drop one letter of a word."""
+    position = rng.randrange(len(word))
+    return word[:position] + word[position + 1:]
+
+
+class Command(BaseCommand):
+    help = 'Measure the memory and lookup latency of the typeahead index on synthetic titles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100000, help='Number of book titles (default 100000).')
+        parser.add_argument('--lookups', type=int, default=5000, help='Number of timed lookups (default 5000).')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        titles = options['titles']
+        rng = random.Random(options['seed'])
+        words = vocabulary(rng, 20000)
+
+        rows = list(synthetic_rows(titles, rng, words))
+        start = time.perf_counter()
+        index = TypeaheadIndex()
+        index.build(rows)
+        build_seconds = time.perf_counter() - start
+
+        # Memory is traced on a second build, as tracing slows allocation down
+        tracemalloc.start()
+        traced = TypeaheadIndex()
+        traced.build(rows)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+
+        lookups = [rng.choice(words) for _ in range(options['lookups'])]
+        prefixes = [word[:rng.randint(1, len(word))] for word in lookups]
+        typos = [misspell(rng, word) for word in lookups]
+
+        self.stdout.write(f'entries: {len(index)}, built in {build_seconds:.2f}s')
+        self.stdout.write(f'memory: {memory / 2 ** 20:.1f} MiB total, '
+                          f'{memory / 2 ** 20 * 100000 / titles:.1f} MiB per 100k titles')
+        for name, queries in (('prefix', prefixes), ('fuzzy', typos)):
+            stats = summarize(time_calls(index.suggest, queries))
+            self.stdout.write(f'{name} lookups: p50 {stats["p50_ms"]:.3f} ms, p99 {stats["p99_ms"]:.3f} ms, '
+                              f'max {stats["max_ms"]:.3f} ms')
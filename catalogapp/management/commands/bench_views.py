@@ -0,0 +1,70 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from catalogapp import benchmarking
+from catalogapp.models import Book
+
+DEFAULT_BASELINE_DIR = os.path.join(os.path.dirname(benchmarking.__file__), 'benchmarks')
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every catalogapp URL through the WSGI application, in-process, on a generated catalog '
+            'in a separate test database. Reports requests/s, p50/p99 latency and queries per request, and '
+            'compares them with a stored baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmarking.SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per URL (default 20).')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and its catalog, for the next run.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store the results as the baseline of this scale.')
+        parser.add_argument('--compare', action='store_true',
+                            help='Compare the results with the baseline of this scale; fail on regressions.')
+        parser.add_argument('--baseline', help='Baseline file (default: catalogapp/benchmarks/baseline-SCALE.json).')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='p50 slowdown counted as a regression (default 0.25, i.e. 25%%).')
+
+    def handle(self, *args, **options):
+        baseline = options['baseline'] or os.path.join(DEFAULT_BASELINE_DIR, f"baseline-{options['scale']}.json")
+        if options['compare'] and not os.path.exists(baseline):
+            raise CommandError(f'No baseline at {baseline}; create one with --save-baseline')
+
+        with benchmarking.benchmark_database(keepdb=options['keepdb']), override_settings(DEBUG=False):
+            results = self._run(options)
+
+        meta = {'scale': options['scale'], 'seed': options['seed'], 'requests': options['requests']}
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(baseline), exist_ok=True)
+            benchmarking.save_baseline(baseline, results, meta)
+            self.stdout.write(f'Baseline saved to {baseline}')
+        if options['compare']:
+            stored = benchmarking.load_baseline(baseline)
+            if stored['meta'] != meta:
+                self.stdout.write(self.style.WARNING(f"Baseline made with {stored['meta']}, not {meta}"))
+            regressions = benchmarking.compare(results, stored['results'], options['threshold'])
+            for name, reason in regressions:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {name}: {reason}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {baseline}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline}'))
+
+    def _run(self, options):
+        if not Book.objects.exists():
+            self.stdout.write(f"Generating the {options['scale']} catalog...")
+            benchmarking.generate_catalog(seed=options['seed'], **benchmarking.SCALES[options['scale']])
+        from library.wsgi import application  # pylint: disable=import-outside-toplevel
+        harness = benchmarking.WSGIHarness(application)
+
+        results = {}
+        self.stdout.write(f"{'view':<22} {'status':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'queries':>7}")
+        for name, url in benchmarking.catalog_urls():
+            stats = results[name] = harness.measure(url, options['requests'])
+            self.stdout.write(f"{name:<22} {stats['status']:>6} {stats['rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+                              f"{stats['p99_ms']:>8.2f} {stats['queries']:>7}")
+        for name, reason in benchmarking.SKIPPED_URLS.items():
+            self.stdout.write(f'{name:<22} skipped: {reason}')
+        return results
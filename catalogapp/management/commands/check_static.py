@@ -0,0 +1,61 @@
+import os
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.files.storage import get_storage_class
+from django.core.management.base import BaseCommand, CommandError
+
+ASSET_EXTENSIONS = ('.css', '.js', '.map', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2', '.ttf')
+
+# href="..." and src="..." values, and the names given to {% static %}
+ATTRIBUTE = re.compile(r'''\b(?:href|src)\s*=\s*(["'])(.*?)\1''', re.IGNORECASE)
+STATIC_TAG = re.compile(r'''{%\s*static\s+(["'])(.+?)\1''')
+
+
+def _template_files():
+    roots = [*settings.TEMPLATES[0]['DIRS'], os.path.join(apps.get_app_config('catalogapp').path, 'templates')]
+    for root in roots:
+        for directory, _, files in os.walk(root):
+            for filename in sorted(files):
+                if filename.endswith(('.html', '.txt')):
+                    yield os.path.join(directory, filename)
+
+
+def problems(path):
+    """(line, message) for each asset the template at `path` references without a hashed name."""
+    found = []
+    with open(path, encoding='utf-8') as template:
+        for number, line in enumerate(template, 1):
+            for match in ATTRIBUTE.finditer(line):
+                value = match.group(2)
+                if '{' not in value and value.split('?')[0].split('#')[0].lower().endswith(ASSET_EXTENSIONS):
+                    found.append((number, f'{value} is not served through {{% static %}}'))
+            for match in STATIC_TAG.finditer(line):
+                name = match.group(2)
+                try:
+                    staticfiles_storage.stored_name(name)
+                except ValueError:
+                    found.append((number, f'{name} is missing from the staticfiles manifest'))
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Fail if a template references a static asset that is not served under a content-hashed name: '
+            'a literal asset URL (a CDN or /static/ path) instead of {% static %}, or a {% static %} name '
+            'missing from the manifest written by collectstatic. Run it after collectstatic.')
+
+    def handle(self, *args, **options):
+        if not issubclass(get_storage_class(settings.STATICFILES_STORAGE), ManifestFilesMixin):
+            raise CommandError(f'{settings.STATICFILES_STORAGE} does not hash file names; '
+                               'set CATALOGAPP_STATICFILES_STORAGE or DJANGO_DEBUG=False')
+
+        failures = 0
+        for path in _template_files():
+            for number, message in problems(path):
+                failures += 1
+                self.stderr.write(f'{os.path.relpath(path, settings.BASE_DIR)}:{number}: {message}')
+        if failures:
+            raise CommandError(f'{failures} unhashed static asset reference(s)')
+        self.stdout.write('All static assets in templates have hashed names.')
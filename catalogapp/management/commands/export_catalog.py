@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from catalogapp import exporting
+
+
+class Command(BaseCommand):
+    help = 'Stream a catalog dataset (books, copies, loans or authors) as CSV or JSON lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exporting.DATASETS))
+        parser.add_argument('--format', choices=exporting.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument('--output', help='Output file (default: standard output).')
+        parser.add_argument('--chunk-size', type=int, default=exporting.CHUNK_SIZE,
+                            help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        chunks = exporting.export(options['dataset'], options['format'], compress=options['gzip'],
+                                  chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as stream:
+                stream.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.flush()
@@ -0,0 +1,82 @@
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogapp import importing
+
+
+class Command(BaseCommand):
+    help = ('Import books and their copies from a CSV, JSON lines or MARC-lite (mnemonic MARC) file, '
+            'in batches of one transaction each. An interrupted import continues with --resume.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file; .gz files are decompressed on the fly.')
+        parser.add_argument('--format', choices=importing.FORMATS,
+                            help='Input format; guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records per transaction.')
+        parser.add_argument('--checkpoint',
+                            help='File recording the records committed so far (default: PATH.checkpoint).')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the records the checkpoint file says were already imported.')
+
+    @staticmethod
+    def _guess_format(path):
+        name = path[:-3] if path.endswith('.gz') else path
+        extension = os.path.splitext(name)[1].lstrip('.').lower()
+        return {'mrk': 'marc', 'json': 'jsonl', 'ndjson': 'jsonl'}.get(extension, extension)
+
+    @staticmethod
+    def _write_checkpoint(checkpoint, path, done):
+        temporary = checkpoint + '.tmp'
+        with open(temporary, 'w') as stream:
+            json.dump({'path': os.path.abspath(path), 'records': done}, stream)
+        os.replace(temporary, checkpoint)
+
+    def _skip(self, checkpoint, path):
+        try:
+            with open(checkpoint) as stream:
+                state = json.load(stream)
+        except FileNotFoundError:
+            return 0
+        if state['path'] != os.path.abspath(path):
+            raise CommandError(f"{checkpoint} belongs to an import of {state['path']}")
+        return state['records']
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or self._guess_format(path)
+        if fmt not in importing.FORMATS:
+            raise CommandError(f'Cannot tell the format of {path}; use --format')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        done = self._skip(checkpoint, path) if options['resume'] else 0
+
+        loader = importing.CatalogLoader()
+        started = time.perf_counter()
+        imported = 0
+        with importing.open_text(path) as stream:
+            records = itertools.islice(importing.read_records(stream, fmt), done, None)
+            if done:
+                self.stdout.write(f'Resuming after {done} records')
+            while True:
+                batch = list(itertools.islice(records, options['batch_size']))
+                if not batch:
+                    break
+                loader.load(batch)
+                imported += len(batch)
+                self._write_checkpoint(checkpoint, path, done + imported)
+                if options['verbosity'] > 1:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'{done + imported} records ({imported / elapsed:.0f} rows/s)')
+        loader.finish()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.perf_counter() - started
+        created = ', '.join(f'{count} {name}' for name, count in loader.created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} records in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s): {created}'))
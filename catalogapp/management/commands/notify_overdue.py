@@ -0,0 +1,55 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from catalogapp import ledger, loans
+from catalogapp.models import LoanEvent
+
+
+class Command(BaseCommand):
+    help = ('Email every borrower with overdue loans one reminder listing them, over a single mail connection, '
+            'and add an overdue event for each loan to the loan ledger.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Messages handed to the backend at a time.')
+        parser.add_argument('--dry-run', action='store_true', help='Build the messages but do not send them.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        sending = 0.0
+        stats = {'borrowers': 0, 'loans': 0, 'sent': 0, 'no_email': 0}
+        batch, events = [], []
+
+        def flush():
+            nonlocal sending
+            if batch and not options['dry_run']:
+                sent_at = time.perf_counter()
+                stats['sent'] += connection.send_messages(batch) or 0
+                sending += time.perf_counter() - sent_at
+            if not options['dry_run']:
+                ledger.record(events)
+            batch.clear()
+            events.clear()
+
+        connection = get_connection()
+        with connection:
+            for borrower, overdue in loans.overdue_by_borrower():
+                stats['borrowers'] += 1
+                stats['loans'] += len(overdue)
+                events.extend(LoanEvent(action='overdue', bookinstance_id=loan['id'], book_id=loan['book_id'],
+                                        borrower_id=borrower['id'], due_back=loan['due_back']) for loan in overdue)
+                if not borrower['email']:
+                    stats['no_email'] += 1
+                    continue
+                batch.append(loans.overdue_notice(borrower, overdue, connection=connection))
+                if len(batch) >= options['batch_size']:
+                    flush()
+            flush()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{stats['loans']} overdue loans of {stats['borrowers']} borrowers; {stats['sent']} notices sent, "
+            f"{stats['no_email']} borrowers without an email address")
+        self.stdout.write(f'Finished in {elapsed:.2f}s ({elapsed - sending:.2f}s querying and rendering, '
+                          f'{sending:.2f}s sending)')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalogapp import search
+
+
+class Command(BaseCommand):
+    help = 'Recompute the full-text search document of every book.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true',
+                            help='Only index books without a search document (PostgreSQL).')
+
+    def handle(self, *args, **options):
+        count = search.rebuild(missing_only=options['missing'])
+        self.stdout.write(f'Indexed {count} books')
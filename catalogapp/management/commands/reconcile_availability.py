@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalogapp import availability
+
+
+class Command(BaseCommand):
+    help = 'Recompute the copies summary (totals by status, next due date) stored on every book.'
+
+    def handle(self, *args, **options):
+        changed = availability.reconcile()
+        self.stdout.write(f'Corrected {changed} books')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from catalogapp import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the home page counters from the database and overwrite the stored and cached values.'
+
+    def handle(self, *args, **options):
+        counts = counters.reconcile()
+        for name in counters.COUNTERS:
+            self.stdout.write(f'{name}: {counts[name]}')
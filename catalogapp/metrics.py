@@ -0,0 +1,121 @@
+""" in-process request metrics (histograms per view) in the Prometheus text format"""
+
+import bisect
+import threading
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (help text, buckets)
+METRICS = {
+    'catalogapp_request_duration_seconds': ('Time spent handling the request.', SECONDS_BUCKETS),
+    'catalogapp_db_duration_seconds': ('Time spent running SQL queries during the request.', SECONDS_BUCKETS),
+    'catalogapp_db_queries': ('Number of SQL queries run during the request.', QUERIES_BUCKETS),
+    'catalogapp_template_duration_seconds': ('Time spent rendering templates during the request.',
+                                             SECONDS_BUCKETS),
+}
+
+# ConnectionPool.stats() key -> (metric name, type, help text)
+POOL_METRICS = {
+    'in_use': ('catalogapp_db_pool_connections_in_use', 'gauge', 'Pooled database connections handed out.'),
+    'idle': ('catalogapp_db_pool_connections_idle', 'gauge', 'Pooled database connections waiting for reuse.'),
+    'max_size': ('catalogapp_db_pool_connections_max', 'gauge', 'Size limit of the connection pool.'),
+    'waits': ('catalogapp_db_pool_waits_total', 'counter', 'Times a thread waited for a free pooled connection.'),
+    'wait_seconds': ('catalogapp_db_pool_wait_seconds_total', 'counter',
+                     'Time spent waiting for a free pooled connection.'),
+    'timeouts': ('catalogapp_db_pool_timeouts_total', 'counter', 'Waits for a pooled connection that timed out.'),
+    'opened': ('catalogapp_db_pool_opened_total', 'counter', 'Database connections opened by the pool.'),
+    'discarded': ('catalogapp_db_pool_discarded_total', 'counter',
+                  'Pooled database connections closed as broken or idle too long.'),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def cumulative(self):
+        """(upper bound, number of values <= bound) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip((*self.buckets, float('inf')), self.counts):
+            total += count
+            yield bound, total
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    """Histograms of every metric, per view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, view, values):
+        """Record `values` ({metric name: value}) of one request handled by `view`."""
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, view))
+                if histogram is None:
+                    histogram = self._histograms[name, view] = Histogram(METRICS[name][1])
+                histogram.observe(value)
+
+    def get(self, name, view):
+        return self._histograms.get((name, view))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'view="{_escape(view)}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{label},le="{_format_value(bound)}"}} {count}')
+                    lines.append(f'{name}_sum{{{label}}} {_format_value(histogram.sum)}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def render_pools(pools):
+    """Statistics of the connection pools ({database alias: ConnectionPool}) in the text format."""
+    stats = {alias: pool.stats() for alias, pool in sorted(pools.items())}
+    lines = []
+    for key, (name, kind, help_text) in POOL_METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, values in stats.items():
+            lines.append(f'{name}{{database="{_escape(alias)}"}} {_format_value(values[key])}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,122 @@
+""" middleware measuring the SQL queries, database time and template time of each request,
+and keeping a visitor's reads on the primary database after they write"""
+
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+from . import metrics, routers
+
+_local = threading.local()
+
+
+class RequestStats:
+    """Costs accumulated while handling one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        stats = getattr(_local, 'stats', None)
+        if stats is None or stats._rendering:
+            return render(self, context, request)
+        stats._rendering += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+            stats._rendering -= 1
+    wrapper.timed = True
+    return wrapper
+
+
+def _instrument_templates():
+    # Templates rendered through the Django backend (render(), TemplateResponse,
+    # render_to_string) are timed; nested renders count once.
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+
+
+class MetricsMiddleware:
+    """Record per-request query count, database, template and total time, tagged by URL name.
+
+    Histograms go to catalogapp.metrics.registry (served at /metrics) and, unless
+    CATALOGAPP_SERVER_TIMING is False, the figures are sent in a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'CATALOGAPP_SERVER_TIMING', True)
+        _instrument_templates()
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats()
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        metrics.registry.observe(view, {
+            'catalogapp_request_duration_seconds': total,
+            'catalogapp_db_duration_seconds': stats.db_time,
+            'catalogapp_db_queries': stats.queries,
+            'catalogapp_template_duration_seconds': stats.template_time,
+        })
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'tpl;dur={stats.template_time * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """Read from the primary database for the rest of a request that wrote to it, and for
+    CATALOGAPP_REPLICA_PIN_SECONDS afterwards, so the redirect after a form shows the change
+    even while the replicas lag behind.
+    """
+
+    cookie_name = 'pin_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'CATALOGAPP_REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        routers.pin(self.cookie_name in request.COOKIES)
+        routers.prefer_primary(False)
+        try:
+            response = self.get_response(request)
+            if routers.is_pinned() and routers.replicas() and self.pin_seconds:
+                response.set_cookie(self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        finally:
+            routers.pin(False)
+            routers.prefer_primary(False)
+        return response
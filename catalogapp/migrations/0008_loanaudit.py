@@ -0,0 +1,32 @@
+# Generated by Django 3.0.5 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalogapp', '0007_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanAudit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('renew', 'Renewed'), ('return', 'Returned')], max_length=6)),
+                ('previous_due_back', models.DateField(blank=True, null=True)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('bookinstance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalogapp.bookinstance')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('librarian', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
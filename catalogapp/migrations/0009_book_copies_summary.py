@@ -0,0 +1,56 @@
+# Generated by Django 3.0.5 on 2026-10-18 11:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+
+
+def summarize_copies(apps, schema_editor):
+    Book = apps.get_model('catalogapp', 'Book')
+    BookInstance = apps.get_model('catalogapp', 'BookInstance')
+    statuses = {'a': 'copies_available', 'o': 'copies_on_loan', 'm': 'copies_maintenance', 'r': 'copies_reserved'}
+    aggregates = {field: Count('id', filter=Q(status=status)) for status, field in statuses.items()}
+    rows = BookInstance.objects.filter(book__isnull=False).values('book_id').annotate(
+        copies_total=Count('id'), next_due_back=Min('due_back', filter=Q(status='o')), **aggregates).order_by()
+    for row in rows.iterator():
+        Book.objects.filter(pk=row.pop('book_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogapp', '0008_loanaudit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_maintenance',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='next_due_back',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(summarize_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 3.0.5 on 2026-10-18 13:05
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# A copy of catalogapp.ledger as of this migration, so that later changes to it cannot
+# change what this migration does
+BATCH_SIZE = 1000
+
+
+def copy_audit(apps, schema_editor):
+    """Start the ledger with the renewals and returns recorded so far."""
+    LoanAudit = apps.get_model('catalogapp', 'LoanAudit')
+    LoanEvent = apps.get_model('catalogapp', 'LoanEvent')
+    rows = LoanAudit.objects.order_by('created', 'id').values(
+        'created', 'action', 'bookinstance_id', 'bookinstance__book_id', 'borrower_id', 'librarian_id',
+        'previous_due_back', 'due_back')
+    LoanEvent.objects.bulk_create((LoanEvent(
+        created=row['created'],
+        action=row['action'],
+        bookinstance_id=row['bookinstance_id'],
+        book_id=row['bookinstance__book_id'],
+        borrower_id=row['borrower_id'],
+        librarian_id=row['librarian_id'],
+        previous_due_back=row['previous_due_back'],
+        due_back=row['due_back'],
+    ) for row in rows.iterator()), batch_size=BATCH_SIZE)
+
+
+def _month_bounds(month):
+    """The (start, end) datetimes of `month` (a first of month), end excluded."""
+    end = datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return (datetime.datetime(month.year, month.month, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(end.year, end.month, 1, tzinfo=datetime.timezone.utc))
+
+
+def partition(apps, schema_editor):
+    """Turn the LoanEvent table into one range-partitioned by month of `created`, keeping its rows.
+
+    The primary key becomes (id, created), as a partitioned table's must include the
+    partitioning column.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    model = apps.get_model('catalogapp', 'LoanEvent')
+    table = model._meta.db_table
+    quote = schema_editor.quote_name
+    old = f'{table}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [table])
+        if cursor.fetchone() is not None:
+            return
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table])
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {quote(table)} DROP CONSTRAINT {quote(primary_key)}')
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS) '
+                       f'PARTITION BY RANGE ({quote("created")})')
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY ({quote("id")}, {quote("created")})')
+        # Kept when the old table is dropped
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.{quote("id")}')
+
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', {quote('created')} AT TIME ZONE 'UTC') FROM {quote(old)}")
+        months = {row[0].date() for row in cursor.fetchall()}
+        now = django.utils.timezone.now().astimezone(datetime.timezone.utc)
+        months.add(datetime.date(now.year, now.month, 1))
+        for month in sorted(months):
+            start, end = _month_bounds(month)
+            cursor.execute(f'CREATE TABLE {quote(f"{table}_{month:%Y%m}")} PARTITION OF {quote(table)} '
+                           f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalogapp', '0010_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(choices=[('checkout', 'Checked out'), ('renew', 'Renewed'), ('return', 'Returned'), ('overdue', 'Overdue notice')], max_length=8)),
+                ('previous_due_back', models.DateField(blank=True, null=True)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('book', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogapp.book')),
+                ('bookinstance', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogapp.bookinstance')),
+                ('borrower', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('librarian', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['bookinstance', '-created'], name='loanevent_copy_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['book', '-created'], name='loanevent_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['borrower', '-created'], name='loanevent_borrower_idx'),
+        ),
+        migrations.RunPython(copy_audit, migrations.RunPython.noop),
+        # Range-partitioned by month on PostgreSQL; a plain table elsewhere
+        migrations.RunPython(partition, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.0.5 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogapp', '0011_loanevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitTotal',
+            fields=[
+                ('page', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogapp', '0012_visittotal'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='LoanAudit',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogapp', '0013_delete_loanaudit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterTotal',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,8 +1,10 @@
 """Creating models here"""
 
 import uuid
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from datetime import date
 
@@ -38,10 +40,39 @@ class Book(models.Model):
     # Language as a string rather than object because it hasn't been declared yet in the file
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
 
+    # Full-text search document (title, ISBN, author, genres, summary), maintained by
+    # catalogapp/search.py; GIN indexed on PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Summary of the copies of this book, maintained by catalogapp/availability.py
+    copies_total = models.PositiveIntegerField(default=0, editable=False)
+    copies_available = models.PositiveIntegerField(default=0, editable=False)
+    copies_on_loan = models.PositiveIntegerField(default=0, editable=False)
+    copies_maintenance = models.PositiveIntegerField(default=0, editable=False)
+    copies_reserved = models.PositiveIntegerField(default=0, editable=False)
+    next_due_back = models.DateField(null=True, editable=False)
+
+    # The copies summary fields, never written by save() once the book exists
+    COPIES_FIELDS = ('copies_total', 'copies_available', 'copies_on_loan', 'copies_maintenance', 'copies_reserved',
+                     'next_due_back')
+
     def __str__(self):
         """String for representing the Model object."""
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Save the book, leaving out the summary of its copies once it exists.
+
+        The summary is changed in place with F() updates; writing back the values this
+        instance was loaded with would undo the loans and returns made since.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname not in deferred
+                                       and field.name not in self.COPIES_FIELDS]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         """Returns the url to access a detail record for this book."""
         # pylint: disable=maybe-no-member
@@ -49,12 +80,34 @@ class Book(models.Model):
 
     def display_genre(self):
         """Create a string for the Genre. This is required to display genre in Admin."""
-        # pylint: disable=maybe-no-member
-        return ', '.join(genre.book_kind for genre in self.genre.all()[:3])
+        # Made once per instance; all() is served from prefetched genres where the admin loads them
+        if '_display_genre' not in self.__dict__:
+            # pylint: disable=maybe-no-member
+            self._display_genre = ', '.join(genre.book_kind for genre in self.genre.all()[:3])
+        return self._display_genre
 
     display_genre.short_description = 'Genre'
 
 
+class BookInstanceQuerySet(models.QuerySet):
+    """Queries on copies; overdue tests run in the database rather than per row in Python."""
+
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def overdue(self, today=None):
+        """Copies on loan due back before `today`."""
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        """Annotate each copy with `overdue`, a boolean computed like is_overdue."""
+        return self.annotate(overdue=models.Case(
+            models.When(due_back__lt=today or date.today(), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+
 class BookInstance(models.Model):
     """Model representing a specific copy of a book (i.e. that can be borrowed from the library1)."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4,
@@ -79,11 +132,20 @@ class BookInstance(models.Model):
     )
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = BookInstanceQuerySet.as_manager()
+
     class Meta:
         # pylint: disable=too-few-public-methods
         """Repesenting inner class with ordering options"""
         ordering = ['due_back']
         permissions = (("can_mark_returned", "Set book as returned"),)
+        indexes = [
+            # All borrowed books: status = 'o' ordered by due_back
+            models.Index(fields=['status', 'due_back'], name='bookinstance_status_due_idx'),
+            # A user's borrowed books; only loans are ever looked up this way
+            models.Index(fields=['borrower', 'status', 'due_back'], name='bookinstance_loans_idx',
+                         condition=models.Q(status='o')),
+        ]
 
     def __str__(self):
         """String for representing the Model object."""
@@ -92,6 +154,8 @@ class BookInstance(models.Model):
 
     @property
     def is_overdue(self):
+        if 'overdue' in self.__dict__:
+            return self.overdue
         if self.due_back and date.today() > self.due_back:
             return True
         return False
@@ -128,3 +192,96 @@ class Language(models.Model):
     def __str__(self):
         """String for representing the Model object (in Admin site etc.)"""
         return self.lang_name
+
+
+class LoanEvent(models.Model):
+    """Model recording one event in the life of a loan. Rows are only ever added, in bulk.
+
+    On PostgreSQL the table is partitioned by month of `created` (see catalogapp/ledger.py).
+    The history outlives the copies, books and users it mentions, so their ids are kept
+    without foreign key constraints.
+    """
+    ACTIONS = (
+        ('checkout', 'Checked out'),
+        ('renew', 'Renewed'),
+        ('return', 'Returned'),
+        ('overdue', 'Overdue notice'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    created = models.DateTimeField(default=timezone.now)
+    action = models.CharField(max_length=8, choices=ACTIONS)
+    bookinstance = models.ForeignKey('BookInstance', on_delete=models.DO_NOTHING, null=True, db_constraint=False,
+                                     db_index=False, related_name='+')
+    book = models.ForeignKey('Book', on_delete=models.DO_NOTHING, null=True, db_constraint=False, db_index=False,
+                             related_name='+')
+    borrower = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
+                                 db_index=False, related_name='+')
+    librarian = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False,
+                                  db_index=False, related_name='+')
+    previous_due_back = models.DateField(null=True, blank=True)
+    due_back = models.DateField(null=True, blank=True)
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        """Repesenting inner class with ordering options"""
+        ordering = ['-created']
+        indexes = [
+            # History of a copy, a book or a borrower, newest first
+            models.Index(fields=['bookinstance', '-created'], name='loanevent_copy_idx'),
+            models.Index(fields=['book', '-created'], name='loanevent_book_idx'),
+            models.Index(fields=['borrower', '-created'], name='loanevent_borrower_idx'),
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.get_action_display()} {self.bookinstance_id} ({self.created:%Y-%m-%d})'
+
+
+class Hold(models.Model):
+    """Model representing a patron's place in the queue for a book, served first come first served.
+
+    `copy` is the copy set aside (Reserved) for the patron once they reach the front of the queue.
+    """
+    book = models.ForeignKey('Book', on_delete=models.CASCADE)
+    patron = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    copy = models.OneToOneField('BookInstance', on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='hold')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        """Repesenting inner class with ordering options"""
+        ordering = ['created', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'patron'], name='hold_one_per_patron'),
+        ]
+        indexes = [
+            # The front of a book's queue
+            models.Index(fields=['book', 'created', 'id'], name='hold_queue_idx', condition=models.Q(copy=None)),
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.patron_id} waiting for {self.book_id}' if self.copy_id is None \
+            else f'{self.copy_id} set aside for {self.patron_id}'
+
+
+class CounterTotal(models.Model):
+    """Model representing a home page counter, changed with atomic updates (see counters.py)."""
+    name = models.CharField(max_length=100, primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.name}: {self.count}'
+
+
+class VisitTotal(models.Model):
+    """Model representing the site-wide number of visits to a page, added to in batches (see visits.py)."""
+    page = models.CharField(max_length=100, primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.page}: {self.count}'
@@ -0,0 +1,241 @@
+""" keyset (seek) pagination for the catalog list views"""
+
+import base64
+import binascii
+import collections.abc
+import json
+import uuid
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Return the planner's row estimate for `queryset` on PostgreSQL, its exact count elsewhere."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def table_estimate(model, using):
+    """The planner's row count of `model`'s table (pg_class.reltuples) on PostgreSQL; None if unknown.
+
+    A partitioned table counts the rows of its partitions.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.reltuples, c.relkind FROM pg_class c WHERE c.oid = %s::regclass '
+                       'UNION ALL SELECT c.reltuples, c.relkind FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'WHERE i.inhparent = %s::regclass', [model._meta.db_table] * 2)
+        rows = cursor.fetchall()
+    if rows and rows[0][1] == 'p':
+        rows = rows[1:]
+    # -1 until the table is first vacuumed or analyzed
+    estimates = [row[0] for row in rows if row[0] >= 0]
+    if not estimates:
+        return None
+    return int(sum(estimates))
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator taking the count of an unfiltered queryset from table_estimate() rather than COUNT(*).
+
+    Filtered querysets, and tables estimated under `exact_below` rows, are counted exactly.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = table_estimate(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+def _encode_value(value):
+    if isinstance(value, (date, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, reverse=False):
+    """Pack the ordering values of a boundary row into an opaque cursor string."""
+    payload = json.dumps({'v': [_encode_value(value) for value in values], 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor made by encode_cursor into (values, reverse)."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return list(payload['v']), bool(payload['r'])
+    except (binascii.Error, ValueError, TypeError, KeyError) as error:
+        raise InvalidPage('Invalid cursor') from error
+
+
+class KeysetPage(collections.abc.Sequence):
+    """A page of a KeysetPaginator, with cursors to its neighbours."""
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginate a queryset by seeking past the ordering values of the last row seen.
+
+    `ordering` lists field names sorted ascending and must end with a unique field
+    (normally 'id'). Nullable fields sort last. Unlike offset pagination, no page
+    costs more than the first one and no COUNT(*) is needed; `count` may be
+    None (not counted), 'approximate' (planner estimate) or 'exact'.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = list(ordering)
+        self.count_mode = count
+        opts = queryset.model._meta
+        self._fields = [opts.get_field(name) for name in self.ordering]
+        self._nullable = [field.null for field in self._fields]
+
+    @cached_property
+    def count(self):
+        if self.count_mode == 'exact':
+            return self.queryset.count()
+        if self.count_mode == 'approximate':
+            return estimate_count(self.queryset)
+        return None
+
+    def _order_by(self, reverse):
+        order = []
+        for name, nullable in zip(self.ordering, self._nullable):
+            if not nullable:
+                order.append(f'-{name}' if reverse else name)
+            elif reverse:
+                order.append(F(name).desc(nulls_first=True))
+            else:
+                order.append(F(name).asc(nulls_last=True))
+        return order
+
+    def _seek(self, values, reverse):
+        """Q matching rows after (or before, if `reverse`) the row with ordering `values`."""
+        branches = []
+        equal = Q()
+        for name, nullable, value in zip(self.ordering, self._nullable, values):
+            if value is None:
+                # NULLs sort last: only non-NULL values come before them
+                if reverse:
+                    branches.append(equal & Q(**{f'{name}__isnull': False}))
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            beyond = Q(**{f'{name}__lt' if reverse else f'{name}__gt': value})
+            if nullable and not reverse:
+                beyond |= Q(**{f'{name}__isnull': True})
+            branches.append(equal & beyond)
+            equal &= Q(**{name: value})
+        condition = Q(pk__in=[])
+        for branch in branches:
+            condition |= branch
+        return condition
+
+    def _clean(self, values):
+        """The values of a decoded cursor as those of the ordering fields; InvalidPage if they are not."""
+        if len(values) != len(self.ordering):
+            raise InvalidPage('Invalid cursor')
+        cleaned = []
+        for field, value in zip(self._fields, values):
+            if value is None and field.null:
+                cleaned.append(None)
+                continue
+            # encode_cursor() only makes strings and numbers
+            if not isinstance(value, (str, int, float)):
+                raise InvalidPage('Invalid cursor')
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError) as error:
+                raise InvalidPage('Invalid cursor') from error
+        return cleaned
+
+    def _values(self, obj):
+        # Rows of a values() queryset are dicts
+        if isinstance(obj, dict):
+            return [obj[name] for name in self.ordering]
+        return [getattr(obj, name) for name in self.ordering]
+
+    def page(self, cursor=None):
+        """Return the page following (or preceding) `cursor`, the first page if it is empty."""
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            values, reverse = decode_cursor(cursor)
+            values = self._clean(values)
+            queryset = queryset.filter(self._seek(values, reverse))
+        rows = list(queryset.order_by(*self._order_by(reverse))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        has_next = has_more if not reverse else True
+        has_previous = bool(cursor) if not reverse else has_more
+        next_cursor = encode_cursor(self._values(rows[-1])) if has_next and rows else None
+        previous_cursor = encode_cursor(self._values(rows[0]), reverse=True) if has_previous and rows else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin paginating with a KeysetPaginator when CATALOGAPP_PAGINATION_MODE is 'keyset'.
+
+    Views set `keyset_ordering`; the page is chosen by the `cursor` query parameter.
+    """
+    keyset_ordering = ('id',)
+    keyset_count = 'approximate'
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if getattr(settings, 'CATALOGAPP_PAGINATION_MODE', 'offset') != 'keyset':
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering, count=self.keyset_count)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidPage as error:
+            raise Http404(str(error)) from error
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,139 @@
+""" checkouts and a first come first served hold queue per book, safe under contention
+
+A copy is taken with SELECT ... FOR UPDATE SKIP LOCKED: patrons borrowing the same title at
+the same time each lock a different available copy instead of queueing on the first one.
+(Without SKIP LOCKED they would also miss copies: once the first locker commits, the others
+find that row no longer available and get nothing.) Returns go through loans.mark_returned(),
+which hands the copies to the front of the queue with fulfil().
+
+The Book copies summary is updated after each transaction commits, so concurrent checkouts
+only contend for the book row for the length of one UPDATE.
+"""
+
+import datetime
+from collections import Counter
+
+from django.db import transaction
+
+from . import availability, counters, ledger, versions
+from .models import BookInstance, Hold, LoanEvent
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+
+class Unavailable(Exception):
+    """No copy of the book can be lent now; the patron can place a hold instead."""
+
+
+def _take(book_id, status='a'):
+    """Lock a copy of `book_id` in `status` no one else has locked; returns its id or None."""
+    return BookInstance.objects.select_for_update(skip_locked=True).filter(
+        book_id=book_id, status=status).order_by().values_list('id', flat=True).first()
+
+
+def _moved(book_id, moves):
+    """Account for copies of `book_id` changing status; `moves` is a list of (old, new) statuses."""
+    deltas = Counter()
+    for old, new in moves:
+        deltas[availability.STATUS_FIELDS[old]] -= 1
+        deltas[availability.STATUS_FIELDS[new]] += 1
+    on_loan = any('o' in move for move in moves)
+    availability.record({book_id: deltas}, {book_id} if on_loan else ())
+    counters.incr('num_instances_available', deltas['copies_available'])
+    versions.bump('book', book_id)
+    versions.touch('bookinstance', 'book')
+
+
+def checkout(book_id, patron, due_back=None):
+    """Lend a copy of the book to `patron` (a User or its id): the copy set aside for their hold, else
+    any available one.
+
+    Returns the id of the copy lent; raises Unavailable when there is none.
+    """
+    due_back = due_back or datetime.date.today() + LOAN_PERIOD
+    with transaction.atomic():
+        # Their hold whether or not a copy is set aside for it yet: once locked, fulfil() skips it
+        # instead of setting a copy aside for it while they take another one
+        hold = Hold.objects.select_for_update().filter(book_id=book_id, patron=patron).first()
+        if hold is not None and hold.copy_id is not None:
+            copy_id, status = hold.copy_id, 'r'
+            hold.delete()
+        else:
+            copy_id, status = _take(book_id), 'a'
+            if copy_id is None:
+                raise Unavailable(f'No copy of book {book_id} is available')
+            if hold is not None:
+                # Borrowed without waiting: their place in the queue is not needed any more
+                Hold.objects.filter(pk=hold.pk, copy__isnull=True).delete()
+        BookInstance.objects.filter(pk=copy_id).update(status='o', borrower=patron, due_back=due_back)
+        ledger.record([LoanEvent(action='checkout', bookinstance_id=copy_id, book_id=book_id,
+                                 borrower_id=getattr(patron, 'pk', patron), due_back=due_back)])
+    _moved(book_id, [(status, 'o')])
+    return copy_id
+
+
+def reserve(book_id, patron):
+    """Put `patron` (a User) in the queue for the book, once; returns their Hold.
+
+    A copy is set aside for the hold (hold.copy) straight away when one is available.
+    """
+    hold, created = Hold.objects.get_or_create(book_id=book_id, patron=patron)
+    if created:
+        fulfil([book_id])
+        hold.refresh_from_db(fields=['copy'])
+    return hold
+
+
+def position(hold):
+    """Place of a waiting `hold` in its book's queue, from 1; 0 once a copy is set aside for it."""
+    if hold.copy_id is not None:
+        return 0
+    ahead = Hold.objects.filter(book_id=hold.book_id, copy__isnull=True, created__lte=hold.created).exclude(
+        created=hold.created, id__gt=hold.id)
+    return ahead.count()
+
+
+def cancel(hold_id):
+    """Remove a hold; a copy set aside for it goes to the next in the queue. Returns whether it existed."""
+    with transaction.atomic():
+        hold = Hold.objects.select_for_update().filter(pk=hold_id).first()
+        if hold is None:
+            return False
+        hold.delete()
+        if hold.copy_id is not None:
+            BookInstance.objects.filter(pk=hold.copy_id).update(status='a', borrower=None, due_back=None)
+    if hold.copy_id is not None:
+        _moved(hold.book_id, [('r', 'a')])
+        fulfil([hold.book_id])
+    return True
+
+
+def fulfil(book_ids):
+    """Set available copies of the given books aside for the holds at the front of their queues.
+
+    Returns how many holds got a copy.
+    """
+    served = 0
+    for book_id in dict.fromkeys(book_ids):
+        if not BookInstance.objects.filter(book_id=book_id, status='a').exists():
+            continue
+        moves = []
+        with transaction.atomic():
+            # One fulfil() per book at a time, so holds are served strictly in queue order;
+            # checkouts do not take this lock
+            availability.lock(book_id)
+            while True:
+                # Locked holds are being cancelled or picked up
+                hold = Hold.objects.select_for_update(skip_locked=True).filter(
+                    book_id=book_id, copy__isnull=True).order_by('created', 'id').first()
+                copy_id = _take(book_id) if hold is not None else None
+                if copy_id is None:
+                    break
+                BookInstance.objects.filter(pk=copy_id).update(status='r', borrower=hold.patron_id, due_back=None)
+                hold.copy_id = copy_id
+                hold.save(update_fields=['copy'])
+                moves.append(('a', 'r'))
+        if moves:
+            _moved(book_id, moves)
+            served += len(moves)
+    return served
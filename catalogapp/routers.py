@@ -0,0 +1,72 @@
+""" database router sending catalog reads to the read replicas"""
+
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_local = threading.local()
+
+
+def replicas():
+    """The replica aliases in use (CATALOGAPP_DB_REPLICAS that are configured in DATABASES)."""
+    return [alias for alias in getattr(settings, 'CATALOGAPP_DB_REPLICAS', ()) if alias in settings.DATABASES]
+
+
+def pin(pinned=True):
+    """Send this thread's reads to the primary (or, with False, let them go to the replicas again)."""
+    _local.pinned = pinned
+
+
+def is_pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def prefer_primary(preferred=True):
+    """Send this thread's reads to the primary too, without pinning the client to it (see pin())."""
+    _local.primary = preferred
+
+
+def reads_primary():
+    return is_pinned() or getattr(_local, 'primary', False)
+
+
+class ReplicaRouter:
+    """Read catalogapp models from a random replica, write everything to the primary.
+
+    Reads go to the primary once the thread has written anything (see pin(); the
+    middleware resets this for each request), while the catalog changed too recently
+    for the replicas to have it (see prefer_primary()) and inside transactions on the
+    primary, so that select_for_update() and read-your-writes keep working. Other apps are
+    left to the default routing.
+    """
+
+    app_label = 'catalogapp'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        aliases = replicas()
+        if not aliases or reads_primary() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        # Entries of the database cache, the counters and the visit totals are not catalog data
+        if model._meta.app_label != 'django_cache' and model._meta.model_name not in ('countertotal', 'visittotal'):
+            pin()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in replicas():
+            return False
+        return None
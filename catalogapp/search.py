@@ -0,0 +1,243 @@
+""" full-text catalog search: PostgreSQL text search, with an in-memory index elsewhere"""
+
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import F, Func, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Author, Book
+
+# Text search configuration used to parse both the documents and the queries
+SEARCH_CONFIG = getattr(settings, 'CATALOGAPP_SEARCH_CONFIG', 'english')
+
+# Highlighted words are wrapped in these private-use characters, then escaped and marked up
+START_SEL, STOP_SEL = '\ue000', '\ue001'
+
+# Relative weights of the A (title, ISBN), B (author), C (genres) and D (summary)
+# parts of a book, as PostgreSQL's ts_rank uses them by default
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+
+def _uses_postgres():
+    return connections[router.db_for_read(Book)].vendor == 'postgresql'
+
+
+class Headline(Func):
+    """PostgreSQL ts_headline(): `expression` with the words matching `query` marked."""
+    function = 'ts_headline'
+    output_field = TextField()
+
+    def __init__(self, expression, query, options, **extra):
+        super().__init__(Value(SEARCH_CONFIG), expression, query, Value(options), **extra)
+
+
+def render_highlight(text):
+    """Escape `text` and turn its highlight markers into <mark> tags."""
+    return mark_safe(escape(text).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
+
+
+def _book_vector():
+    author_name = Author.objects.filter(pk=OuterRef('author_id')).annotate(
+        name=Concat('first_name', Value(' '), 'last_name')).values('name')[:1]
+    genre_kinds = Book.genre.through.objects.filter(book_id=OuterRef('pk')).values('book_id').annotate(
+        kinds=StringAgg('genre__book_kind', ' ')).values('kinds')
+    return (SearchVector('title', 'isbn', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Subquery(author_name), weight='B', config=SEARCH_CONFIG)
+            + SearchVector(Subquery(genre_kinds, output_field=TextField()), weight='C', config=SEARCH_CONFIG)
+            + SearchVector('summary', weight='D', config=SEARCH_CONFIG))
+
+
+# Pure-Python inverted index, used when the database is not PostgreSQL
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class PythonSearchIndex:
+    """An inverted index of book documents: token -> {book id: score}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self.built = False
+
+    def __len__(self):
+        return len(self._documents)
+
+    @staticmethod
+    def _load(books):
+        rows = books.values('pk', 'title', 'isbn', 'summary', 'author__first_name', 'author__last_name')
+        genres = defaultdict(list)
+        for book_id, book_kind in Book.genre.through.objects.filter(book__in=books).values_list(
+                'book_id', 'genre__book_kind'):
+            genres[book_id].append(book_kind)
+        for row in rows:
+            yield row['pk'], {
+                'A': f"{row['title']} {row['isbn']}",
+                'B': f"{row['author__first_name'] or ''} {row['author__last_name'] or ''}",
+                'C': ' '.join(genres[row['pk']]),
+                'D': row['summary'],
+            }
+
+    def _add(self, book_id, parts):
+        scores = defaultdict(float)
+        for weight, text in parts.items():
+            for token in tokenize(text):
+                scores[token] += WEIGHTS[weight]
+        for token, score in scores.items():
+            self._postings[token][book_id] = score
+        self._documents[book_id] = list(scores)
+
+    def _remove(self, book_id):
+        for token in self._documents.pop(book_id, ()):
+            postings = self._postings[token]
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[token]
+
+    def build(self):
+        """(Re)load every book from the database."""
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for book_id, parts in self._load(Book.objects.all()):
+                self._add(book_id, parts)
+            self.built = True
+
+    def update(self, book_ids):
+        """Reload the given books; ids of deleted books are dropped."""
+        if not self.built:
+            return
+        book_ids = set(book_ids)
+        with self._lock:
+            for book_id in book_ids:
+                self._remove(book_id)
+            for book_id, parts in self._load(Book.objects.filter(pk__in=book_ids)):
+                self._add(book_id, parts)
+
+    def search(self, query):
+        """Return (book id, rank) pairs of books containing every word of `query`, best first."""
+        if not self.built:
+            self.build()
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        with self._lock:
+            postings = [self._postings.get(token, {}) for token in tokens]
+        postings.sort(key=len)
+        ranks = {book_id: score for book_id, score in postings[0].items()}
+        for other in postings[1:]:
+            ranks = {book_id: rank + other[book_id] for book_id, rank in ranks.items() if book_id in other}
+        return sorted(ranks.items(), key=lambda item: (-item[1], item[0]))
+
+
+python_index = PythonSearchIndex()
+
+
+def _highlight_words(text, query):
+    words = tokenize(query)
+    if not words or not text:
+        return text or ''
+    pattern = re.compile(r'\b(%s)\b' % '|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    return pattern.sub(lambda match: START_SEL + match.group(0) + STOP_SEL, text)
+
+
+class PythonRanking(list):
+    """Books found by the Python index; a list so it can be paginated lazily like a queryset."""
+
+    def __init__(self, ranking, query):
+        super().__init__(ranking)
+        self.query = query
+
+    def __getitem__(self, index):
+        items = super().__getitem__(index)
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        books = Book.objects.select_related('author').in_bulk([book_id for book_id, _ in items])
+        page = []
+        for book_id, rank in items:
+            if book_id in books:
+                book = books[book_id]
+                book.rank = rank
+                book.title_headline = _highlight_words(book.title, self.query)
+                book.summary_headline = _highlight_words(book.summary, self.query)
+                page.append(book)
+        return page
+
+
+class PostgresRanking:
+    """Books matching a text search query, paginated lazily like a queryset.
+
+    The count only reads the matches, and the headlines, the costly part of a search, are
+    made for the books of the page sliced only.
+    """
+
+    def __init__(self, search_query):
+        self.search_query = search_query
+        self.matches = Book.objects.filter(search_vector=search_query)
+
+    def count(self):
+        return self.matches.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        items = self.matches.annotate(rank=SearchRank(F('search_vector'), self.search_query)).order_by(
+            '-rank', 'id').values_list('id', 'rank')[index]
+        start_stop = f'StartSel={START_SEL}, StopSel={STOP_SEL}'
+        books = Book.objects.select_related('author').annotate(
+            title_headline=Headline('title', self.search_query, start_stop + ', HighlightAll=true'),
+            summary_headline=Headline('summary', self.search_query, start_stop + ', MaxFragments=2'),
+        ).in_bulk([book_id for book_id, _ in items])
+        page = []
+        for book_id, rank in items:
+            if book_id in books:
+                book = books[book_id]
+                book.rank = rank
+                page.append(book)
+        return page
+
+
+def search_books(query):
+    """Return the books matching `query`, best first, each with `rank`, `title_headline` and `summary_headline`."""
+    if not _uses_postgres():
+        return PythonRanking(python_index.search(query), query)
+    return PostgresRanking(SearchQuery(query, config=SEARCH_CONFIG))
+
+
+def update_books(book_ids):
+    """Refresh the search documents of the given books."""
+    book_ids = [book_id for book_id in book_ids if book_id is not None]
+    if not book_ids:
+        return
+    if _uses_postgres():
+        Book.objects.filter(pk__in=book_ids).update(search_vector=_book_vector())
+    else:
+        python_index.update(book_ids)
+
+
+def rebuild(missing_only=False):
+    """Recompute the search documents of every book, or of those never indexed."""
+    if _uses_postgres():
+        books = Book.objects.filter(search_vector__isnull=True) if missing_only else Book.objects.all()
+        return books.update(search_vector=_book_vector())
+    python_index.build()
+    return len(python_index)
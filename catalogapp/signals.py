@@ -0,0 +1,209 @@
+""" signal receivers keeping cached catalog data in step with model writes"""
+
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import availability, counters, search, typeahead, versions
+from .models import Book, BookInstance, Author, Genre, Language
+
+# Counter holding the total number of rows for models counted only on create/delete
+_TOTALS = {
+    Book: 'num_books',
+    Author: 'num_authors',
+}
+
+
+def _is_available(status):
+    return 1 if status == 'a' else 0
+
+
+def _is_love(book_kind):
+    return 1 if book_kind == counters.LOVE_GENRE else 0
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_bookinstance_state(sender, instance, **kwargs):
+    """Keep the loaded status and book so a later save can tell whether they changed."""
+    # Read from __dict__ so deferred fields are not fetched here.
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_book_id = instance.__dict__.get('book_id')
+
+
+@receiver(post_init, sender=Genre)
+def remember_genre_kind(sender, instance, **kwargs):
+    """Keep the loaded book_kind so a later save can tell whether it changed."""
+    instance._loaded_book_kind = instance.__dict__.get('book_kind')
+
+
+# Registered before the receivers below, which reset the loaded state
+@receiver(post_save, sender=BookInstance)
+def summarize_saved_copy(sender, instance, created, **kwargs):
+    """Update the copies summary of the book(s) of a saved copy."""
+    if created:
+        availability.copy_moved(None, None, instance.book_id, instance.status)
+    elif instance._loaded_status is None:
+        # Loaded without its status: the previous state is unknown
+        availability.reconcile({instance._loaded_book_id, instance.book_id} - {None})
+    else:
+        availability.copy_moved(instance._loaded_book_id, instance._loaded_status, instance.book_id, instance.status)
+
+
+@receiver(post_delete, sender=BookInstance)
+def summarize_deleted_copy(sender, instance, **kwargs):
+    """Update the copies summary of the book of a removed copy."""
+    availability.copy_moved(instance.book_id, instance.status, None, None)
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_bookinstance(sender, instance, created, **kwargs):
+    """Update the copies counters after a copy is added or its status changes."""
+    available = _is_available(instance.status)
+    if created:
+        counters.incr('num_instances')
+        counters.incr('num_instances_available', available)
+    elif instance._loaded_status is not None:
+        counters.incr('num_instances_available', available - _is_available(instance._loaded_status))
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_bookinstance(sender, instance, **kwargs):
+    """Update the copies counters after a copy is removed."""
+    counters.incr('num_instances', -1)
+    counters.incr('num_instances_available', -_is_available(instance.status))
+
+
+@receiver(post_save, sender=Genre)
+def count_saved_genre(sender, instance, created, **kwargs):
+    """Update the genre counters after a genre is added or renamed."""
+    love = _is_love(instance.book_kind)
+    if created:
+        counters.incr('num_genre')
+        counters.incr('num_books_available', love)
+    elif instance._loaded_book_kind is not None:
+        counters.incr('num_books_available', love - _is_love(instance._loaded_book_kind))
+    instance._loaded_book_kind = instance.book_kind
+
+
+@receiver(post_delete, sender=Genre)
+def count_deleted_genre(sender, instance, **kwargs):
+    """Update the genre counters after a genre is removed."""
+    counters.incr('num_genre', -1)
+    counters.incr('num_books_available', -_is_love(instance.book_kind))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+def count_created_object(sender, instance, created, **kwargs):
+    """Count a newly added book or author."""
+    if created:
+        counters.incr(_TOTALS[sender])
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def count_deleted_object(sender, instance, **kwargs):
+    """Uncount a removed book or author."""
+    counters.incr(_TOTALS[sender], -1)
+
+
+def _books_changed(book_ids):
+    """Invalidate the cached detail pages and search documents of the given books."""
+    book_ids = list(book_ids)
+    versions.bump('book', *book_ids)
+    search.update_books(book_ids)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed(sender, instance, **kwargs):
+    """Refresh the cached data of a changed book."""
+    _books_changed([instance.pk])
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bump_book_version_for_copy(sender, instance, **kwargs):
+    """Invalidate the cached detail pages of the book(s) a changed copy belongs to."""
+    versions.bump('book', instance.book_id)
+    if instance._loaded_book_id != instance.book_id:
+        versions.bump('book', instance._loaded_book_id)
+    instance._loaded_book_id = instance.book_id
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh the cached data of books whose genres changed."""
+    if not reverse:
+        if action.startswith('post_'):
+            _books_changed([instance.pk])
+    elif action == 'pre_clear':
+        # Clearing a genre's books does not say which books they were
+        instance._cleared_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _books_changed(instance._cleared_book_ids)
+    elif action.startswith('post_'):
+        _books_changed(pk_set)
+
+
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Author)
+def remember_related_books(sender, instance, **kwargs):
+    """Keep the books of a genre or author about to be removed, which lose it silently."""
+    instance._deleted_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Author)
+def related_books_changed(sender, instance, **kwargs):
+    """Refresh the cached data of books which lost a genre or author."""
+    _books_changed(instance._deleted_book_ids)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Author)
+def related_books_renamed(sender, instance, created, **kwargs):
+    """Refresh the cached data of books of a renamed genre or author."""
+    if not created:
+        _books_changed(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Language)
+def bump_book_version_for_renamed_language(sender, instance, created, **kwargs):
+    """Invalidate the cached detail pages of books in a renamed language."""
+    if not created:
+        versions.bump('book', *instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def suggestions_changed(sender, **kwargs):
+    """Make every process reload its typeahead index after a title or an author name changed."""
+    typeahead.changed()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=BookInstance)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=BookInstance)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def touch_model(sender, **kwargs):
+    """Give a new version to the model of a changed row; a changed copy also changes its book's summary."""
+    if sender is BookInstance:
+        versions.touch('bookinstance', 'book')
+    else:
+        versions.touch(sender._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_genre_links(sender, action, **kwargs):
+    """Give new versions to books and genres when their links change."""
+    if action.startswith('post_'):
+        versions.touch('book', 'genre')
@@ -0,0 +1,43 @@
+""" template tag caching the page navigation"""
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from catalogapp import versions
+
+register = template.Library()
+
+
+class NavCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = getattr(settings, 'CATALOGAPP_NAV_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return self.nodelist.render(context)
+        # URLs only change with a release
+        key = make_template_fragment_key(f'nav:{self.name}', [versions.RELEASE] + [
+            var.resolve(context) for var in self.vary_on])
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, timeout)
+        return content
+
+
+@register.tag
+def navcache(parser, token):
+    """Cache a navigation fragment for CATALOGAPP_NAV_CACHE_TIMEOUT seconds, per release and
+    per value of the variables it varies on: {% navcache name [var ...] %} ... {% endnavcache %}.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('endnavcache',))
+    parser.delete_first_token()
+    return NavCacheNode(nodelist, bits[1], [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,13 @@
+""" template filters for search results"""
+
+from django import template
+
+from catalogapp.search import render_highlight
+
+register = template.Library()
+
+
+@register.filter
+def highlight(text):
+    """Render a search headline with its matches in <mark> tags."""
+    return render_highlight(text or '')
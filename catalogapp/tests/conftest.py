@@ -0,0 +1,25 @@
+import pytest
+from django.core.cache import caches
+from django.db import connection
+
+from catalogapp import ledger, search, typeahead
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # The database is rolled back after each test, so cached data must go too
+    for cache in caches.all():
+        cache.clear()
+    # So are the in-process indexes
+    typeahead.index.clear()
+    search.python_index.built = False
+    yield
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    # The test database is made from the models, without migrations: partition the loan
+    # ledger as migration 0011 does
+    with django_db_blocker.unblock():
+        with connection.schema_editor() as schema_editor:
+            ledger.partition(schema_editor)
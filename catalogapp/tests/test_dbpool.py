@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+from django.db import connection
+
+from catalogapp.dbpool import ConnectionPool, PoolTimeout, check_connections, mark_idle
+from catalogapp.metrics import render_pools
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool:
+    def test_reuses_released_connections(self):
+        pool = ConnectionPool(max_size=2)
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+        assert pool.acquire(FakeConnection) is first
+        assert pool.stats()['opened'] == 1
+        assert pool.stats()['in_use'] == 1
+
+    def test_waits_for_a_free_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        first = pool.acquire(FakeConnection)
+        threading.Timer(0.05, pool.release, [first]).start()
+        assert pool.acquire(FakeConnection) is first
+        assert pool.stats()['waits'] == 1
+        assert pool.stats()['wait_seconds'] > 0
+
+    def test_times_out(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.acquire(FakeConnection)
+        with pytest.raises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        assert pool.stats()['timeouts'] == 1
+
+    def test_discards_broken_connections(self):
+        pool = ConnectionPool(check_after=0, check=lambda conn: False)
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+        second = pool.acquire(FakeConnection)
+        assert second is not first
+        assert first.closed
+        pool.release(second, reusable=False)
+        assert second.closed
+        assert pool.stats() == dict(pool.stats(), in_use=0, idle=0, opened=2, discarded=2)
+
+    def test_failed_connect_frees_its_place(self):
+        pool = ConnectionPool(max_size=1)
+        with pytest.raises(RuntimeError):
+            pool.acquire(lambda: (_ for _ in ()).throw(RuntimeError))
+        assert pool.stats()['in_use'] == 0
+
+    def test_metrics(self):
+        pool = ConnectionPool(max_size=3)
+        pool.acquire(FakeConnection)
+        body = render_pools({'default': pool})
+        assert '# TYPE catalogapp_db_pool_connections_in_use gauge' in body
+        assert 'catalogapp_db_pool_connections_in_use{database="default"} 1' in body
+        assert 'catalogapp_db_pool_connections_max{database="default"} 3' in body
+
+
+@pytest.mark.django_db(transaction=True)
+class TestHealthChecks:
+    def test_closes_dropped_connections(self, settings):
+        settings.CATALOGAPP_CONN_HEALTH_CHECKS = True
+        settings.CATALOGAPP_CONN_HEALTH_CHECK_AFTER = 0
+        connection.ensure_connection()
+        check_connections()
+        assert connection.connection is not None
+
+        connection.connection.close()  # as if the server had gone away
+        check_connections()
+        assert connection.connection is None
+
+    def test_skips_recently_used_connections(self, settings):
+        settings.CATALOGAPP_CONN_HEALTH_CHECKS = True
+        settings.CATALOGAPP_CONN_HEALTH_CHECK_AFTER = 60
+        connection.ensure_connection()
+        mark_idle()
+        connection.connection.close()
+        check_connections()
+        assert connection.connection is not None
+
+        settings.CATALOGAPP_CONN_HEALTH_CHECK_AFTER = 0
+        check_connections()
+        assert connection.connection is None
@@ -1,9 +1,10 @@
 import datetime
+import uuid
 import pytest
 from django.test import TestCase
 from django.utils import timezone
 
-from catalogapp.forms import RenewBookForm
+from catalogapp.forms import BulkLoanForm, RenewBookForm
 
 
 class TestRenewBookForm:
@@ -38,4 +39,24 @@ class TestRenewBookForm:
     def test_renew_form_date_max(self):
         date = timezone.localtime() + datetime.timedelta(weeks=4)
         form = RenewBookForm(data={'renewal_date': date})
-        assert form.is_valid()
\ No newline at end of file
+        assert form.is_valid()
+
+
+class TestBulkLoanForm:
+    def test_return_needs_no_date(self):
+        form = BulkLoanForm(data={'action': 'return', 'copies': [str(uuid.uuid4())]})
+        assert form.is_valid()
+
+    def test_renew_needs_a_date(self):
+        form = BulkLoanForm(data={'action': 'renew', 'copies': [str(uuid.uuid4())]})
+        assert not form.is_valid()
+        assert 'renewal_date' in form.errors
+
+    def test_renewal_date_rules(self):
+        date = datetime.date.today() + datetime.timedelta(weeks=5)
+        form = BulkLoanForm(data={'action': 'renew', 'renewal_date': date, 'copies': [str(uuid.uuid4())]})
+        assert not form.is_valid()
+
+    def test_invalid_copy_id(self):
+        form = BulkLoanForm(data={'action': 'return', 'copies': ['not-a-uuid']})
+        assert not form.is_valid()
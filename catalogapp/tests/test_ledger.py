@@ -0,0 +1,67 @@
+import datetime
+import gzip
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from catalogapp import ledger
+from catalogapp.models import LoanEvent
+from catalogapp.pagination import table_estimate
+
+postgres_only = pytest.mark.skipif(connection.vendor != 'postgresql', reason='Partitioning is PostgreSQL only')
+
+
+def _at(year, month, day=15):
+    return datetime.datetime(year, month, day, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.django_db
+class TestLedger:
+    def test_months(self):
+        assert ledger.next_month(datetime.date(2019, 12, 1)) == datetime.date(2020, 1, 1)
+        assert ledger.previous_month(datetime.date(2020, 1, 1)) == datetime.date(2019, 12, 1)
+        assert ledger.month_bounds(datetime.date(2020, 2, 1)) == (_at(2020, 2, 1).replace(hour=0),
+                                                                  _at(2020, 3, 1).replace(hour=0))
+
+    @postgres_only
+    def test_events_go_to_their_month(self):
+        ledger.record([LoanEvent(action='renew', created=_at(2020, 1)), LoanEvent(action='return', created=_at(2020, 3))])
+        assert {datetime.date(2020, 1, 1), datetime.date(2020, 3, 1)} <= set(ledger.partitions(connection))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT action FROM {ledger.partition_name(LoanEvent._meta.db_table, datetime.date(2020, 3, 1))}')
+            assert cursor.fetchall() == [('return',)]
+
+    @postgres_only
+    def test_estimate_counts_the_partitions(self):
+        ledger.record([LoanEvent(action='renew', created=_at(2020, month)) for month in (1, 2, 2)])
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {LoanEvent._meta.db_table}')
+        assert table_estimate(LoanEvent, 'default') == 3
+
+    def test_archive(self, tmp_path):
+        ledger.record([LoanEvent(action='renew', created=_at(2020, 1), due_back=datetime.date(2020, 2, 1)),
+                       LoanEvent(action='return', created=_at(2020, 1, 20)),
+                       LoanEvent(action='overdue', created=_at(2020, 2)),
+                       LoanEvent(action='checkout')])
+
+        archived = ledger.archive(datetime.date(2020, 2, 1), str(tmp_path))
+        assert [(month, rows) for month, _, rows in archived] == [(datetime.date(2020, 1, 1), 2)]
+        with gzip.open(archived[0][1], 'rt') as archive:
+            rows = [json.loads(line) for line in archive]
+        assert [(row['action'], row['due_back']) for row in rows] == [('renew', '2020-02-01'), ('return', None)]
+        assert sorted(LoanEvent.objects.values_list('action', flat=True)) == ['checkout', 'overdue']
+        assert datetime.date(2020, 1, 1) not in ledger.partitions(connection)
+
+    def test_archive_command_keeps_the_retention_period(self, tmp_path):
+        this_month = ledger.month_of(timezone.now())
+        old = ledger.previous_month(ledger.previous_month(ledger.previous_month(this_month)))
+        ledger.record([LoanEvent(action='renew', created=ledger.month_bounds(old)[0]), LoanEvent(action='checkout')])
+
+        call_command('archive_loan_events', months=2, directory=str(tmp_path))
+        assert list(LoanEvent.objects.values_list('action', flat=True)) == ['checkout']
+        assert (tmp_path / f'loanevent-{old:%Y-%m}.jsonl.gz').exists()
+        if connection.vendor == 'postgresql':
+            assert ledger.next_month(this_month) in ledger.partitions(connection)
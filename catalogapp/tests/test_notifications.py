@@ -0,0 +1,65 @@
+import datetime
+import io
+
+import pytest
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.management import call_command
+from django.urls import reverse
+
+from catalogapp.models import Book, BookInstance, LoanEvent
+
+
+@pytest.mark.django_db
+class TestOverdue:
+    @pytest.fixture
+    def loans(self):
+        today = datetime.date.today()
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        alice = User.objects.create_user(username='alice', email='alice@example.com', first_name='Alice')
+        bob = User.objects.create_user(username='bob', email='')
+        librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD', is_staff=True)
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        return {
+            'alice_late': BookInstance.objects.create(book=book, imprint='I', status='o', borrower=alice,
+                                                      due_back=today - datetime.timedelta(days=3)),
+            'alice_later': BookInstance.objects.create(book=book, imprint='I', status='o', borrower=alice,
+                                                       due_back=today - datetime.timedelta(days=9)),
+            'alice_due': BookInstance.objects.create(book=book, imprint='I', status='o', borrower=alice,
+                                                     due_back=today),
+            'bob_late': BookInstance.objects.create(book=book, imprint='I', status='o', borrower=bob,
+                                                    due_back=today - datetime.timedelta(days=1)),
+            'returned': BookInstance.objects.create(book=book, imprint='I', status='a',
+                                                    due_back=today - datetime.timedelta(days=1)),
+        }
+
+    def test_overdue_queryset(self, loans):
+        assert set(BookInstance.objects.overdue()) == {loans['alice_late'], loans['alice_later'], loans['bob_late']}
+        flags = dict(BookInstance.objects.on_loan().with_overdue().values_list('id', 'overdue'))
+        assert flags == {copy.pk: copy.is_overdue for name, copy in loans.items() if name != 'returned'}
+
+    def test_report_view(self, client, loans):
+        client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = client.get(reverse('overdue-loans'))
+        assert response.status_code == 200
+        assert list(response.context['bookinstance_list']) == [loans['alice_later'], loans['alice_late'],
+                                                               loans['bob_late']]
+
+    def test_report_view_requires_permission(self, client, loans):
+        assert client.get(reverse('overdue-loans')).status_code == 302
+
+    def test_notify_overdue(self, loans):
+        out = io.StringIO()
+        call_command('notify_overdue', stdout=out)
+        [message] = mail.outbox
+        assert message.to == ['alice@example.com']
+        assert message.body.startswith('Dear Alice,')
+        assert message.body.count('Book Title') == 2
+        assert '3 overdue loans of 2 borrowers; 1 notices sent, 1 borrowers without an email address' in out.getvalue()
+        assert set(LoanEvent.objects.filter(action='overdue').values_list('bookinstance', 'borrower')) == {
+            (loans[name].pk, loans[name].borrower_id) for name in ('alice_late', 'alice_later', 'bob_late')}
+
+    def test_dry_run(self, loans):
+        call_command('notify_overdue', '--dry-run', stdout=io.StringIO())
+        assert not mail.outbox
+        assert not LoanEvent.objects.exists()
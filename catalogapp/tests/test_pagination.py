@@ -0,0 +1,94 @@
+import datetime
+import pytest
+from django.core.paginator import InvalidPage
+from django.urls import reverse
+
+from catalogapp.models import Author, Book, BookInstance
+from catalogapp.pagination import KeysetPaginator, decode_cursor, encode_cursor
+
+
+def walk(paginator):
+    """Follow next cursors from the first page, then previous cursors back to it."""
+    pages = [paginator.page()]
+    while pages[-1].has_next():
+        pages.append(paginator.page(pages[-1].next_cursor))
+    backwards = [pages[-1]]
+    while backwards[-1].has_previous():
+        backwards.append(paginator.page(backwards[-1].previous_cursor))
+    return pages, backwards
+
+
+@pytest.mark.django_db
+class TestKeysetPaginator:
+    @pytest.fixture
+    def authors(self):
+        # Duplicate names make the id tie-breaker matter
+        for author_id in range(13):
+            Author.objects.create(first_name=f'Christian {author_id % 3}', last_name=f'Surname {author_id % 4}')
+        return list(Author.objects.order_by('last_name', 'first_name', 'id'))
+
+    def test_pages_cover_the_ordering(self, authors):
+        paginator = KeysetPaginator(Author.objects.all(), 5, ('last_name', 'first_name', 'id'))
+        pages, backwards = walk(paginator)
+        assert [len(page) for page in pages] == [5, 5, 3]
+        assert [author for page in pages for author in page] == authors
+        assert [list(page) for page in reversed(backwards)] == [list(page) for page in pages]
+        assert not pages[0].has_previous()
+
+    def test_nullable_ordering_field(self):
+        book = Book.objects.create(title='Book Title')
+        for days in (3, None, 1, None, 2, 1):
+            due_back = datetime.date.today() + datetime.timedelta(days=days) if days else None
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back)
+        paginator = KeysetPaginator(BookInstance.objects.all(), 2, ('due_back', 'id'))
+        pages, backwards = walk(paginator)
+        copies = [copy for page in pages for copy in page]
+        assert [copy.due_back for copy in copies][-2:] == [None, None]
+        assert len(copies) == 6
+        assert [list(page) for page in reversed(backwards)] == [list(page) for page in pages]
+
+    def test_counts(self, authors):
+        assert KeysetPaginator(Author.objects.all(), 5, ('id',)).count is None
+        assert KeysetPaginator(Author.objects.all(), 5, ('id',), count='exact').count == 13
+        assert KeysetPaginator(Author.objects.all(), 5, ('id',), count='approximate').count >= 0
+
+    def test_crafted_cursors(self, authors):
+        paginator = KeysetPaginator(Author.objects.all(), 5, ('last_name', 'id'))
+        for values in (['Surname', 'x'], ['Surname', {'a': 1}], ['Surname', [1]], [None, 1], ['Surname', None],
+                       ['Surname']):
+            with pytest.raises(InvalidPage):
+                paginator.page(encode_cursor(values))
+        assert list(paginator.page(encode_cursor(['Surname 0', '3']))) == \
+            sorted((author for author in authors if (author.last_name, author.id) > ('Surname 0', 3)),
+                   key=lambda author: (author.last_name, author.id))[:5]
+
+    def test_cursor_round_trip(self):
+        values = ['Surname', datetime.date(2020, 4, 23), 7]
+        assert decode_cursor(encode_cursor(values, reverse=True)) == (['Surname', '2020-04-23', 7], True)
+        with pytest.raises(InvalidPage):
+            decode_cursor('not a cursor')
+
+
+@pytest.mark.django_db
+class TestKeysetListViews:
+    @pytest.fixture
+    def books(self, settings):
+        settings.CATALOGAPP_PAGINATION_MODE = 'keyset'
+        for book_id in range(13):
+            Book.objects.create(title=f'Book {book_id:02}')
+
+    def test_book_list_cursors(self, client, books):
+        response = client.get(reverse('books'))
+        assert response.status_code == 200
+        assert response.context['is_paginated'] is True
+        assert len(response.context['book_list']) == 10
+        next_cursor = response.context['page_obj'].next_cursor
+        assert f'?cursor={next_cursor}' in response.content.decode()
+
+        response = client.get(reverse('books') + f'?cursor={next_cursor}')
+        assert [book.title for book in response.context['book_list']] == ['Book 10', 'Book 11', 'Book 12']
+        assert response.context['page_obj'].has_previous()
+        assert not response.context['page_obj'].has_next()
+
+    def test_invalid_cursor_is_not_found(self, client, books):
+        assert client.get(reverse('books') + '?cursor=garbage').status_code == 404
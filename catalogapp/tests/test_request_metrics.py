@@ -0,0 +1,52 @@
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from catalogapp.metrics import Histogram, registry
+from catalogapp.models import Book
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    registry.reset()
+
+
+class TestHistogram:
+    def test_cumulative_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe(value)
+        assert list(histogram.cumulative()) == [(1, 2), (5, 3), (float('inf'), 4)]
+        assert histogram.sum == 11
+        assert histogram.count == 4
+
+
+@pytest.mark.django_db
+class TestMetricsMiddleware:
+    def test_records_queries_by_view(self, client):
+        Book.objects.create(title='Book Title')
+        response = client.get(reverse('books'))
+        assert response['Server-Timing'].startswith('db;dur=')
+        queries = registry.get('catalogapp_db_queries', 'books')
+        assert queries.count == 1
+        assert queries.sum >= 1
+        assert registry.get('catalogapp_template_duration_seconds', 'books').sum > 0
+        assert registry.get('catalogapp_request_duration_seconds', 'books').count == 1
+
+    def test_metrics_endpoint(self, client):
+        client.get(reverse('book-detail', args=[12345]))
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        body = response.content.decode()
+        assert '# TYPE catalogapp_db_queries histogram' in body
+        assert 'catalogapp_db_queries_count{view="book-detail"} 1' in body
+        assert 'catalogapp_request_duration_seconds_bucket{view="book-detail",le="+Inf"} 1' in body
+
+    def test_metrics_endpoint_restricted(self, client, settings):
+        settings.CATALOGAPP_METRICS_ALLOWED_IPS = ['10.0.0.1']
+        assert client.get('/metrics').status_code == 404
+
+    def test_server_timing_can_be_disabled(self, client, settings):
+        settings.CATALOGAPP_SERVER_TIMING = False
+        # The middleware reads the setting when it is created, so use a new client
+        assert 'Server-Timing' not in Client().get(reverse('books'))
@@ -0,0 +1,132 @@
+import datetime
+
+import pytest
+from django.contrib.auth.models import User
+
+from catalogapp import availability, benchmarking, loans, reservations
+from catalogapp.models import Book, BookInstance, Hold, LoanEvent
+
+
+def _book(copies):
+    book = Book.objects.create(title='Popular title', summary='Everyone wants it.', isbn='9780000000000')
+    for _ in range(copies):
+        BookInstance.objects.create(book=book, imprint='Test Press', status='a')
+    return book
+
+
+def _patrons(count):
+    return [User.objects.create_user(f'patron{number}') for number in range(count)]
+
+
+@pytest.mark.django_db
+class TestReservations:
+    def test_checkout_lends_an_available_copy(self):
+        book = _book(2)
+        patron, = _patrons(1)
+        copy_id = reservations.checkout(book.pk, patron)
+
+        copy = BookInstance.objects.get(pk=copy_id)
+        assert (copy.status, copy.borrower, copy.due_back) == (
+            'o', patron, datetime.date.today() + reservations.LOAN_PERIOD)
+        book.refresh_from_db()
+        assert (book.copies_available, book.copies_on_loan, book.next_due_back) == (1, 1, copy.due_back)
+
+    def test_checkout_is_recorded_in_the_ledger(self):
+        book = _book(1)
+        patron, = _patrons(1)
+        copy_id = reservations.checkout(book.pk, patron)
+        event = LoanEvent.objects.get()
+        assert (event.action, event.bookinstance_id, event.book_id, event.borrower_id, event.due_back) == (
+            'checkout', copy_id, book.pk, patron.pk, datetime.date.today() + reservations.LOAN_PERIOD)
+
+    def test_checkout_without_copies_raises(self):
+        book = _book(1)
+        first, second = _patrons(2)
+        reservations.checkout(book.pk, first)
+        with pytest.raises(reservations.Unavailable):
+            reservations.checkout(book.pk, second)
+
+    def test_reserve_sets_an_available_copy_aside(self):
+        book = _book(1)
+        patron, = _patrons(1)
+        hold = reservations.reserve(book.pk, patron)
+        assert hold.copy.status == 'r'
+        assert hold.copy.borrower == patron
+        assert reservations.position(hold) == 0
+        assert reservations.reserve(book.pk, patron) == hold
+
+    def test_returns_serve_the_queue_in_order(self):
+        book = _book(1)
+        borrower, *waiting = _patrons(4)
+        copy_id = reservations.checkout(book.pk, borrower)
+        holds = [reservations.reserve(book.pk, patron) for patron in waiting]
+        assert [reservations.position(hold) for hold in holds] == [1, 2, 3]
+
+        assert loans.mark_returned([copy_id]) == 1
+        first = Hold.objects.get(pk=holds[0].pk)
+        assert first.copy_id == copy_id
+        assert BookInstance.objects.get(pk=copy_id).status == 'r'
+        # Someone else cannot take the copy set aside
+        with pytest.raises(reservations.Unavailable):
+            reservations.checkout(book.pk, waiting[2])
+
+        assert reservations.checkout(book.pk, waiting[0]) == copy_id
+        assert not Hold.objects.filter(pk=first.pk).exists()
+        assert reservations.position(Hold.objects.get(pk=holds[1].pk)) == 1
+        assert availability.reconcile() == 0
+
+    def test_cancel_passes_the_copy_on(self):
+        book = _book(1)
+        first, second = _patrons(2)
+        hold = reservations.reserve(book.pk, first)
+        reservations.reserve(book.pk, second)
+
+        assert reservations.cancel(hold.pk)
+        assert Hold.objects.get(patron=second).copy_id == hold.copy_id
+        assert not reservations.cancel(hold.pk)
+        assert availability.reconcile() == 0
+
+
+class TestReservationsUnderContention:
+    # Transactional: the threads use connections of their own, which must see the committed rows
+    @pytest.mark.django_db(transaction=True)
+    def test_no_copy_is_lent_twice(self):
+        book = _book(5)
+        patrons = _patrons(30)
+
+        lent, errors, _ = benchmarking.hammer(lambda patron: reservations.checkout(book.pk, patron), patrons, 8)
+        assert len(lent) == len(set(lent)) == 5
+        assert len(errors) == 25
+        assert all(isinstance(error, reservations.Unavailable) for error in errors)
+        on_loan = BookInstance.objects.filter(book=book, status='o')
+        assert on_loan.count() == 5
+        assert on_loan.values('borrower').distinct().count() == 5
+
+        borrowers = set(on_loan.values_list('borrower', flat=True))
+        waiting = [patron for patron in patrons if patron.pk not in borrowers]
+        holds, errors, _ = benchmarking.hammer(lambda patron: reservations.reserve(book.pk, patron), waiting, 8)
+        assert not errors
+        queue = sorted(holds, key=lambda hold: (hold.created, hold.id))
+
+        _, errors, _ = benchmarking.hammer(lambda copy_id: loans.mark_returned([copy_id]), lent, 8)
+        assert not errors
+        ready = Hold.objects.filter(book=book, copy__isnull=False).order_by('created', 'id')
+        assert [hold.pk for hold in ready] == [hold.pk for hold in queue[:5]]
+        assert set(ready.values_list('copy', flat=True)) == set(lent)
+        assert availability.reconcile() == 0
+
+    @pytest.mark.django_db(transaction=True)
+    def test_checkout_racing_fulfil_lends_one_copy(self):
+        for round_ in range(50):
+            book = _book(2)
+            patron = User.objects.create_user(f'waiting{round_}')
+            # As just after two returns, before they serve the queue
+            Hold.objects.create(book=book, patron=patron)
+
+            calls = [lambda: reservations.fulfil([book.pk]), lambda: reservations.checkout(book.pk, patron)]
+            _, errors, _ = benchmarking.hammer(lambda call: call(), calls, 2)
+            assert not errors
+            # The patron got one copy, and no copy is set aside for a hold that is gone
+            assert list(BookInstance.objects.filter(book=book).exclude(status='a').values_list(
+                'status', 'borrower')) == [('o', patron.pk)]
+            assert not Hold.objects.filter(book=book).exists()
@@ -0,0 +1,102 @@
+import pytest
+from django.contrib.auth.models import Permission, User
+from django.db import connections, transaction
+from django.urls import reverse
+
+from catalogapp import routers, versions
+from catalogapp.models import Author, Book
+
+REPLICAS = ('replica1', 'replica2')
+
+
+@pytest.fixture
+def replicas(settings, tmp_path):
+    """Two SQLite databases standing in for the replicas, each with its own copy of the catalog."""
+    for alias in REPLICAS:
+        connections.databases[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(tmp_path / alias)}
+        connections.ensure_defaults(alias)
+        connections.prepare_test_settings(alias)
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(Author)
+        Author.objects.using(alias).create(first_name='Read', last_name=alias)
+    settings.CATALOGAPP_DB_REPLICAS = list(REPLICAS)
+    settings.DATABASES = dict(settings.DATABASES, **{alias: connections.databases[alias] for alias in REPLICAS})
+    routers.pin(False)
+    yield REPLICAS
+    routers.pin(False)
+    for alias in REPLICAS:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+
+
+@pytest.fixture
+def settled():
+    """Catalog versions old enough for the replicas to have caught up with them."""
+    old = versions._fresh() - 60 * 10 ** 6
+    versions._cache().set_many({versions._key('model', model): old for model in versions.MODELS}, timeout=None)
+
+
+# Reads inside the test case's transaction would all go to the primary
+@pytest.mark.django_db(transaction=True)
+class TestReplicaRouter:
+    def test_reads_go_to_replicas(self, replicas):
+        seen = {Author.objects.get().last_name for _ in range(50)}
+        assert seen == set(replicas)
+
+    def test_writes_go_to_primary_and_pin_reads(self, replicas):
+        author = Author.objects.create(first_name='Written', last_name='Primary')
+        assert author._state.db == 'default'
+        assert Author.objects.get() == author
+
+    def test_transactions_read_from_primary(self, replicas):
+        with transaction.atomic():
+            assert not Author.objects.exists()
+        assert Author.objects.exists()
+
+    def test_other_apps_use_default(self, replicas):
+        assert routers.ReplicaRouter().db_for_read(User) is None
+
+    def test_without_replicas(self):
+        assert routers.ReplicaRouter().db_for_read(Book) == 'default'
+
+    def test_no_migrations_on_replicas(self, replicas):
+        router = routers.ReplicaRouter()
+        assert router.allow_migrate('replica1', 'catalogapp') is False
+        assert router.allow_migrate('default', 'catalogapp') is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplicaPinningMiddleware:
+    def test_write_pins_the_next_requests(self, replicas, settled, client, settings):
+        user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        user.user_permissions.add(Permission.objects.get(codename='add_author'))
+        client.login(username='librarian', password='1X<ISRUkw+tuK')
+        routers.pin(False)
+
+        response = client.get(reverse('authors'))
+        assert response.context['author_list'][0].last_name in replicas
+        assert 'pin_primary' not in response.cookies
+
+        response = client.post(reverse('author_create'), {'first_name': 'New', 'last_name': 'Author'})
+        assert response.cookies['pin_primary']['max-age'] == 5
+        # The redirect sees the new author, which the replicas have not got
+        response = client.get(reverse('authors'))
+        assert [author.last_name for author in response.context['author_list']] == ['Author']
+
+        client.cookies.pop('pin_primary')
+        settings.CATALOGAPP_REPLICA_PIN_SECONDS = 0  # as if the change were old enough
+        assert client.get(reverse('authors')).context['author_list'][0].last_name in replicas
+
+    def test_recent_changes_read_from_primary(self, replicas, settled, client, settings):
+        # The replicas lag behind: they do not have this author
+        Author.objects.create(first_name='New', last_name='Author')
+        routers.pin(False)
+
+        # Another reader, not pinned, must not render the replica's rows under the new versions
+        response = client.get(reverse('authors'))
+        assert [author.last_name for author in response.context['author_list']] == ['Author']
+        assert 'pin_primary' not in response.cookies
+
+        settings.CATALOGAPP_REPLICA_PIN_SECONDS = 0
+        assert client.get(reverse('authors')).context['author_list'][0].last_name in replicas
@@ -0,0 +1,81 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalogapp.models import Author, Book, Genre
+from catalogapp.search import PythonSearchIndex, START_SEL, STOP_SEL, render_highlight, search_books
+
+
+@pytest.fixture
+def books(db):
+    tolstoy = Author.objects.create(first_name='Leo', last_name='Tolstoy')
+    orwell = Author.objects.create(first_name='George', last_name='Orwell')
+    war = Book.objects.create(title='War and Peace', summary='Napoleon invades Russia.', isbn='9780140447934',
+                              author=tolstoy)
+    farm = Book.objects.create(title='Animal Farm', summary='A farm at war with its humans.', isbn='9780451526342',
+                               author=orwell)
+    war.genre.add(Genre.objects.create(book_kind='Historical'))
+    return war, farm
+
+
+@pytest.mark.django_db
+class TestSearchView:
+    def test_ranked_by_field_weight(self, client, books):
+        war, farm = books
+        response = client.get(reverse('search') + '?q=war')
+        assert response.status_code == 200
+        # A title match outranks a summary match
+        assert list(response.context['book_list']) == [war, farm]
+        assert '<mark>War</mark> and Peace' in response.content.decode()
+
+    def test_matches_author_genre_and_isbn(self, client, books):
+        war, farm = books
+        assert list(search_books('orwell')) == [farm]
+        assert list(search_books('historical')) == [war]
+        assert list(search_books('9780140447934')) == [war]
+
+    def test_follows_related_changes(self, books):
+        war, farm = books
+        orwell = farm.author
+        orwell.last_name = 'Blair'
+        orwell.save()
+        assert list(search_books('blair')) == [farm]
+        Genre.objects.get(book_kind='Historical').delete()
+        assert list(search_books('historical')) == []
+
+    def test_headlines_only_for_the_page(self, client, books):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('search') + '?q=war')
+        assert len(response.context['book_list']) == 2
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+        assert counts and not any('ts_headline' in sql or 'ts_rank' in sql for sql in counts)
+
+    def test_empty_query(self, client, books):
+        response = client.get(reverse('search'))
+        assert response.status_code == 200
+        assert list(response.context['book_list']) == []
+
+    def test_highlight_is_escaped(self):
+        assert render_highlight(f'<b>{START_SEL}war{STOP_SEL}</b>') == '&lt;b&gt;<mark>war</mark>&lt;/b&gt;'
+
+
+@pytest.mark.django_db
+class TestPythonSearchIndex:
+    def test_search_and_update(self, books):
+        war, farm = books
+        index = PythonSearchIndex()
+        assert [book_id for book_id, rank in index.search('war')] == [war.pk, farm.pk]
+        assert [book_id for book_id, rank in index.search('leo tolstoy')] == [war.pk]
+        assert index.search('war unicorn') == []
+
+        farm.title = 'Unicorn Farm'
+        farm.save()
+        index.update([farm.pk])
+        assert [book_id for book_id, rank in index.search('unicorn')] == [farm.pk]
+
+        farm_id = farm.pk
+        farm.delete()
+        index.update([farm_id])
+        assert index.search('unicorn') == []
+        assert len(index) == 1
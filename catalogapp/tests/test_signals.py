@@ -0,0 +1,139 @@
+import datetime
+import io
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalogapp import availability, benchmarking, counters
+from catalogapp.models import Author, Book, BookInstance, CounterTotal, Genre
+
+
+@pytest.mark.django_db
+class TestCounters:
+    @pytest.fixture
+    def catalog(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', author=author)
+        Genre.objects.create(book_kind='Love')
+        Genre.objects.create(book_kind='Fantasy')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o')
+        return book
+
+    def test_counts_match_database(self, catalog):
+        assert counters.get_counts() == counters.compute_counts() == {
+            'num_books': 1,
+            'num_instances': 2,
+            'num_instances_available': 1,
+            'num_authors': 1,
+            'num_genre': 2,
+            'num_books_available': 1,
+        }
+
+    def test_counters_follow_writes(self, catalog):
+        counters.get_counts()
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        Author.objects.create(first_name='Jane', last_name='Doe')
+        Genre.objects.get(book_kind='Fantasy').delete()
+        love = Genre.objects.get(book_kind='Love')
+        love.book_kind = 'Romance'
+        love.save()
+        catalog.delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = counters.get_counts()
+        assert len(queries) == 0
+        assert counts == counters.compute_counts()
+
+    def test_reconcile_command_fixes_drift(self, catalog):
+        counters.get_counts()
+        BookInstance.objects.update(status='a')
+        assert counters.get_counts()['num_instances_available'] == 1
+
+        call_command('reconcile_counters', stdout=io.StringIO())
+        assert counters.get_counts()['num_instances_available'] == 2
+
+    # Transactional: the threads use connections of their own
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_changes_are_not_lost(self, catalog):
+        counters.get_counts()
+        _, errors, _ = benchmarking.hammer(lambda _: counters.incr('num_instances'), range(200), 8)
+        assert not errors
+        assert counters.get_counts()['num_instances'] == 202
+        assert CounterTotal.objects.get(name='num_instances').count == 202
+
+    def test_index_runs_no_catalog_queries(self, client, catalog):
+        client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('index'))
+        assert response.status_code == 200
+        assert response.context['num_instances'] == 2
+        assert not [query for query in queries if 'catalogapp_' in query['sql']]
+
+
+@pytest.mark.django_db
+class TestAvailability:
+    @pytest.fixture
+    def book(self):
+        return Book.objects.create(title='Book Title')
+
+    @staticmethod
+    def summary(book):
+        book.refresh_from_db()
+        return {field: getattr(book, field) for field in availability.FIELDS}
+
+    def test_follows_copy_changes(self, book):
+        soon = datetime.date.today() + datetime.timedelta(days=3)
+        later = soon + datetime.timedelta(days=7)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=later)
+        loan = BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=soon)
+        assert self.summary(book) == {'copies_total': 3, 'copies_available': 1, 'copies_on_loan': 2,
+                                      'copies_maintenance': 0, 'copies_reserved': 0, 'next_due_back': soon}
+        loan.status = 'r'
+        loan.save()
+        assert self.summary(book)['copies_reserved'] == 1
+        assert self.summary(book)['next_due_back'] == later
+        loan.delete()
+        assert self.summary(book) == {'copies_total': 2, 'copies_available': 1, 'copies_on_loan': 1,
+                                      'copies_maintenance': 0, 'copies_reserved': 0, 'next_due_back': later}
+
+    def test_copy_moved_to_another_book(self, book):
+        other = Book.objects.create(title='Other')
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='m')
+        copy.book = other
+        copy.save()
+        assert self.summary(book)['copies_total'] == 0
+        assert self.summary(other)['copies_maintenance'] == 1
+
+    def test_save_of_partially_loaded_copy(self, book):
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        copy = BookInstance.objects.only('id', 'book').get()
+        copy.status = 'm'
+        copy.save()
+        assert self.summary(book)['copies_maintenance'] == 1
+        assert self.summary(book)['copies_available'] == 0
+
+    def test_save_of_stale_book_keeps_summary(self, book):
+        stale = Book.objects.get()
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        stale.title = 'New title'
+        stale.save()
+        assert self.summary(book)['copies_total'] == 2
+        assert self.summary(book)['copies_available'] == 2
+        assert book.title == 'New title'
+
+    def test_reconcile_command_fixes_drift(self, book):
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        Book.objects.filter(pk=book.pk).update(copies_total=5, copies_on_loan=2)
+        out = io.StringIO()
+        call_command('reconcile_availability', stdout=out)
+        assert 'Corrected 1 books' in out.getvalue()
+        assert self.summary(book)['copies_total'] == 1
+        assert self.summary(book)['copies_on_loan'] == 0
+        assert availability.reconcile() == 0
@@ -0,0 +1,60 @@
+import pytest
+from django.urls import reverse
+
+from catalogapp import pagination
+from catalogapp.models import Author, Book, BookInstance, Genre
+from catalogapp.pagination import ApproximateCountPaginator
+
+
+def create_books(count):
+    genres = [Genre.objects.create(book_kind=f'Genre {number}') for number in range(4)]
+    for number in range(count):
+        book = Book.objects.create(title=f'Title {number}',
+                                   author=Author.objects.create(first_name='First', last_name=f'Last {number}'))
+        book.genre.set(genres)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+
+@pytest.mark.django_db
+class TestAdminChangelists:
+    @pytest.mark.parametrize('model', ['book', 'bookinstance'])
+    def test_queries_do_not_depend_on_rows(self, admin_client, model, django_assert_max_num_queries):
+        url = reverse(f'admin:catalogapp_{model}_changelist')
+        create_books(2)
+        with django_assert_max_num_queries(20) as few:
+            admin_client.get(url)
+        create_books(10)
+        with django_assert_max_num_queries(len(few.captured_queries)):
+            response = admin_client.get(url)
+        assert response.status_code == 200
+
+    def test_display_genre(self, admin_client):
+        create_books(1)
+        response = admin_client.get(reverse('admin:catalogapp_book_changelist'))
+        assert 'Genre 0, Genre 1, Genre 2' in response.content.decode()
+
+    def test_book_copies_paginated(self, admin_client):
+        book = Book.objects.create(title='Title')
+        for number in range(25):
+            BookInstance.objects.create(book=book, imprint=f'Imprint {number:02}', status='a')
+        url = reverse('admin:catalogapp_book_change', args=[book.pk])
+
+        formset = admin_client.get(url).context['inline_admin_formsets'][0].formset
+        assert len(formset.get_queryset()) == 20
+        response = admin_client.get(url, {'bookinstance_set-page': 2})
+        formset = response.context['inline_admin_formsets'][0].formset
+        assert len(formset.get_queryset()) == 5
+        assert 'Book instances 21-25 of 25' in response.content.decode()
+
+
+@pytest.mark.django_db
+class TestApproximateCountPaginator:
+    def test_unfiltered_counts_are_estimated(self, monkeypatch):
+        Book.objects.create(title='Title')
+        monkeypatch.setattr(pagination, 'table_estimate', lambda model, using: 50000)
+        assert ApproximateCountPaginator(Book.objects.order_by('id'), 10).count == 50000
+        assert ApproximateCountPaginator(Book.objects.filter(title='Title').order_by('id'), 10).count == 1
+
+    def test_small_tables_are_counted(self):
+        Book.objects.create(title='Title')
+        assert ApproximateCountPaginator(Book.objects.order_by('id'), 10).count == 1
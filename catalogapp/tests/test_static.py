@@ -0,0 +1,67 @@
+import pytest
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+BOOTSTRAP = 'vendor/bootstrap-4.1.3/css/bootstrap.min.css'
+
+
+@pytest.fixture
+def collected(settings, tmp_path):
+    """The static files collected into a temporary STATIC_ROOT by the production storage."""
+    settings.STATIC_ROOT = str(tmp_path)
+    settings.STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    call_command('collectstatic', interactive=False, verbosity=0)
+    return tmp_path
+
+
+class TestStaticPipeline:
+    def test_collectstatic_writes_hashed_and_compressed_files(self, collected):
+        hashed = staticfiles_storage.stored_name(BOOTSTRAP)
+        assert hashed != BOOTSTRAP
+        assert (collected / hashed).exists()
+        assert (collected / (hashed + '.gz')).exists()
+
+    def test_hashed_files_are_immutable(self, collected, client):
+        response = client.get(staticfiles_storage.url(BOOTSTRAP), HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == 200
+        assert 'immutable' in response['Cache-Control']
+        assert response['Content-Encoding'] == 'gzip'
+
+    @pytest.mark.django_db
+    def test_pages_link_hashed_assets(self, collected, client):
+        content = client.get(reverse('index')).content.decode()
+        assert staticfiles_storage.url(BOOTSTRAP) in content
+        assert staticfiles_storage.url('css/styles.css') in content
+        assert 'bootstrapcdn' not in content
+
+
+class TestCheckStatic:
+    def test_passes_after_collectstatic(self, collected, capsys):
+        call_command('check_static')
+        assert 'hashed names' in capsys.readouterr().out
+
+    def test_fails_without_manifest_storage(self, settings):
+        settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        with pytest.raises(CommandError, match='does not hash'):
+            call_command('check_static')
+
+    def test_fails_before_collectstatic(self, settings, tmp_path):
+        settings.STATIC_ROOT = str(tmp_path)
+        settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+        with pytest.raises(CommandError):
+            call_command('check_static')
+
+    def test_fails_on_literal_asset_urls(self, collected, settings, tmp_path_factory, capsys):
+        templates = tmp_path_factory.mktemp('templates')
+        (templates / 'cdn.html').write_text(
+            '<link rel="stylesheet" href="https://cdn.example.com/lib.min.css">\n'
+            '<script src="/static/js/app.js"></script>\n'
+            '<a href="{% url \'index\' %}">Home</a>\n'
+        )
+        settings.TEMPLATES = [dict(settings.TEMPLATES[0], DIRS=[str(templates)])]
+        with pytest.raises(CommandError, match='2 unhashed'):
+            call_command('check_static')
+        errors = capsys.readouterr().err
+        assert 'cdn.html:1: https://cdn.example.com/lib.min.css' in errors
+        assert 'cdn.html:2: /static/js/app.js' in errors
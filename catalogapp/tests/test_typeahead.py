@@ -0,0 +1,88 @@
+import pytest
+from django.urls import reverse
+
+from catalogapp.models import Author, Book
+from catalogapp import typeahead
+from catalogapp.typeahead import TypeaheadIndex, normalize
+
+
+def labels(results):
+    return [result['label'] for result in results]
+
+
+class TestTypeaheadIndex:
+    @pytest.fixture
+    def index(self):
+        index = TypeaheadIndex()
+        index.build([
+            ('book', 1, 'War and Peace'),
+            ('book', 2, 'The War of the Worlds'),
+            ('book', 3, 'Warlock'),
+            ('book', 4, 'Crime and Punishment'),
+            ('author', 1, 'Tolstoy, Leo'),
+        ])
+        return index
+
+    def test_normalize(self):
+        assert normalize('  Les Misérables -- Tome I ') == 'les miserables tome i'
+
+    def test_prefix_matches_label_starts_first(self, index):
+        assert labels(index.suggest('war')) == ['Warlock', 'War and Peace', 'The War of the Worlds']
+        assert labels(index.suggest('pea')) == ['War and Peace']
+        assert index.suggest('tol') == [{'type': 'author', 'id': 1, 'label': 'Tolstoy, Leo'}]
+        assert labels(index.suggest('war', limit=1)) == ['Warlock']
+
+    def test_fuzzy_matches(self, index):
+        assert labels(index.suggest('punishmnet')) == ['Crime and Punishment']
+        assert labels(index.suggest('tolstoi')) == ['Tolstoy, Leo']
+        assert index.suggest('zzz') == []
+
+    def test_update_and_remove(self, index):
+        index.update('book', 3, 'Dune')
+        index.remove('book', 1)
+        assert labels(index.suggest('war')) == ['The War of the Worlds']
+        assert labels(index.suggest('dune')) == ['Dune']
+        assert len(index) == 4
+
+    def test_compaction_keeps_live_entries(self, index):
+        for pk in range(1, 1300):
+            index.update('book', 3, f'Warlock {pk}')
+        assert labels(index.suggest('warlock', limit=1)) == ['Warlock 1299']
+        assert len(index) == 5
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSuggestView:
+    def test_suggestions_follow_the_catalog(self, client):
+        author = Author.objects.create(first_name='Leo', last_name='Tolstoy')
+        book = Book.objects.create(title='War and Peace', author=author)
+
+        response = client.get(reverse('suggest') + '?q=wa')
+        assert response.status_code == 200
+        assert response.json() == {'query': 'wa', 'results': [
+            {'type': 'book', 'id': book.pk, 'label': 'War and Peace', 'url': book.get_absolute_url()},
+        ]}
+
+        # Signals change the shared generation when the writes commit, and the index reloads
+        Book.objects.create(title='Warlock', author=author)
+        author.last_name = 'Tolstoi'
+        author.save()
+        assert labels(client.get(reverse('suggest') + '?q=war').json()['results']) == ['Warlock', 'War and Peace']
+        assert labels(client.get(reverse('suggest') + '?q=tolstoi').json()['results']) == ['Tolstoi, Leo']
+        book.delete()
+        assert labels(client.get(reverse('suggest') + '?q=war').json()['results']) == ['Warlock']
+
+    def test_other_processes_and_bulk_updates_reload(self, client):
+        author = Author.objects.create(first_name='Leo', last_name='Tolstoy')
+        Book.objects.create(title='War and Peace', author=author)
+        other = TypeaheadIndex()  # the index of another worker process
+        assert labels(other.suggest('war')) == ['War and Peace']
+
+        Book.objects.create(title='Warlock', author=author)
+        assert labels(other.suggest('war')) == ['Warlock', 'War and Peace']
+
+        Book.objects.filter(title='Warlock').update(title='Anna Karenina')  # no signal
+        assert labels(other.suggest('war')) == ['Warlock', 'War and Peace']
+        typeahead.changed()
+        assert labels(other.suggest('war')) == ['War and Peace']
+        assert labels(client.get(reverse('suggest') + '?q=anna').json()['results']) == ['Anna Karenina']
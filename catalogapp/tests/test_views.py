@@ -1,10 +1,16 @@
 import pytest
 import datetime
 import uuid
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User, Permission  # Required to assign User as a borrower
 from django.utils import timezone
-from catalogapp.models import Book, Author, Genre, BookInstance, Language
+from django.contrib.sessions.models import Session
+from django.template import engines
+from catalogapp import counters, templating, versions
+from catalogapp.visits import VisitCounter
+from catalogapp.models import Book, Author, Genre, BookInstance, Language, LoanEvent, VisitTotal
 
 
 @pytest.mark.django_db
@@ -270,3 +276,347 @@ class TestRenewBookInstancesView:
         response = client.post(reverse('renew-book-librarian', kwargs={'pk': self.test_bookinstance1.pk, }),
                                     {'renewal_date': valid_date_in_future})
         assert response.url == reverse('all-borrowed')
+
+
+@pytest.mark.django_db
+class TestAuthorDetailView:
+    def create_author_with_books(self, number_of_books):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_id in range(number_of_books):
+            book = Book.objects.create(title=f'Book {book_id}', summary='My book summary', author=author)
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='o')
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='m')
+        return author
+
+    def test_books_have_copy_counts(self, client):
+        author = self.create_author_with_books(2)
+        BookInstance.objects.create(book=Book.objects.get(title='Book 0'), imprint='Unlikely Imprint, 2016', status='a')
+        response = client.get(reverse('author-detail', args=[author.pk]))
+        assert response.status_code == 200
+        books = response.context['author'].books
+        assert [book.title for book in books] == ['Book 0', 'Book 1']
+        assert [(book.copies_total, book.copies_available, book.copies_on_loan, book.copies_maintenance)
+                for book in books] == [(4, 2, 1, 1), (3, 1, 1, 1)]
+
+    def test_query_count_does_not_depend_on_books(self, client, django_assert_num_queries):
+        few = self.create_author_with_books(1)
+        many = self.create_author_with_books(20)
+        with django_assert_num_queries(2):
+            client.get(reverse('author-detail', args=[few.pk]))
+        with django_assert_num_queries(2):
+            response = client.get(reverse('author-detail', args=[many.pk]))
+        assert len(response.context['author'].books) == 20
+
+
+@pytest.mark.django_db
+class TestBookDetailView:
+    @pytest.fixture
+    def book(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_language = Language.objects.create(lang_name='English')
+        test_book = Book.objects.create(
+            title='Book Title',
+            summary='My book summary',
+            isbn='ABCDEFG',
+            author=test_author,
+            language=test_language,
+        )
+        test_book.genre.add(Genre.objects.create(book_kind='Fantasy'))
+        for status in 'aom':
+            BookInstance.objects.create(book=test_book, imprint='Unlikely Imprint, 2016', status=status)
+        return test_book
+
+    def test_query_count(self, client, book, django_assert_num_queries):
+        # book with author and language, genres, copies
+        with django_assert_num_queries(3):
+            response = client.get(reverse('book-detail', args=[book.pk]))
+        assert response.status_code == 200
+        assert 'Fantasy' in response.content.decode()
+        # rendered fragment served from the cache
+        with django_assert_num_queries(1):
+            cached = client.get(reverse('book-detail', args=[book.pk]))
+        assert cached.content == response.content
+
+    # Transactional: versions change once the write commits
+    @pytest.mark.django_db(transaction=True)
+    def test_fragment_refreshed_on_changes(self, client, book):
+        client.get(reverse('book-detail', args=[book.pk]))
+
+        BookInstance.objects.create(book=book, imprint='Likely Imprint, 2020', status='a')
+        assert 'Likely Imprint, 2020' in client.get(reverse('book-detail', args=[book.pk])).content.decode()
+
+        book.genre.add(Genre.objects.create(book_kind='Poetry'))
+        assert 'Fantasy, Poetry' in client.get(reverse('book-detail', args=[book.pk])).content.decode()
+
+        Genre.objects.filter(book_kind='Poetry').get().book_set.clear()
+        assert 'Poetry' not in client.get(reverse('book-detail', args=[book.pk])).content.decode()
+
+        language = book.language
+        language.lang_name = 'French'
+        language.save()
+        assert 'French' in client.get(reverse('book-detail', args=[book.pk])).content.decode()
+
+
+@pytest.mark.django_db
+class TestLoanedBooksAllListView:
+    @pytest.fixture
+    def setUp(self):
+        test_user1 = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        test_user2 = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        permission = Permission.objects.get(name='Set book as returned')
+        test_user2.user_permissions.add(permission)
+        test_user2.is_staff = True
+        test_user2.save()
+        self.test_user1 = test_user1
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+
+    def create_loans(self, number_of_loans):
+        for day in range(number_of_loans):
+            BookInstance.objects.create(
+                book=self.test_book,
+                imprint='Unlikely Imprint, 2016',
+                due_back=datetime.date.today() + datetime.timedelta(days=(day * 7) % 10),
+                borrower=self.test_user1,
+                status='o',
+            )
+
+    def test_ordered_by_due_date(self, client, setUp):
+        self.create_loans(10)
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = client.get(reverse('all-borrowed'))
+        assert response.status_code == 200
+        due_dates = [bookinst.due_back for bookinst in response.context['bookinstance_list']]
+        assert len(due_dates) == 10
+        assert due_dates == sorted(due_dates)
+
+    def test_query_count_does_not_depend_on_loans(self, client, setUp):
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        self.create_loans(1)
+        with CaptureQueriesContext(connection) as few:
+            client.get(reverse('all-borrowed'))
+        self.create_loans(9)
+        with CaptureQueriesContext(connection) as many:
+            response = client.get(reverse('all-borrowed'))
+        assert len(response.context['bookinstance_list']) == 10
+        assert len(many) == len(few)
+
+
+@pytest.mark.django_db
+class TestBulkLoans:
+    @pytest.fixture
+    def copies(self):
+        borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        librarian = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD', is_staff=True)
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        due_back = datetime.date.today() + datetime.timedelta(days=2)
+        on_loan = [BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, borrower=borrower,
+                                               status='o') for _ in range(3)]
+        available = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        return on_loan, available
+
+    def test_renew(self, client, copies):
+        on_loan, available = copies
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        response = client.post(reverse('bulk-loans'), {
+            'action': 'renew', 'renewal_date': renewal_date,
+            'copies': [copy.id for copy in on_loan[:2]] + [available.id],
+        })
+        assert response.status_code == 302
+        assert [copy.due_back for copy in BookInstance.objects.filter(status='o').order_by('due_back')] == \
+            [on_loan[2].due_back, renewal_date, renewal_date]
+        events = LoanEvent.objects.all()
+        assert {event.bookinstance_id for event in events} == {copy.id for copy in on_loan[:2]}
+        assert {(event.action, event.previous_due_back, event.due_back, event.librarian.username)
+                for event in events} == {('renew', on_loan[0].due_back, renewal_date, 'testuser2')}
+
+    def test_renewal_date_validated(self, client, copies):
+        on_loan, _ = copies
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = client.post(reverse('bulk-loans'), {
+            'action': 'renew', 'renewal_date': datetime.date.today() - datetime.timedelta(days=1),
+            'copies': [on_loan[0].id],
+        }, follow=True)
+        assert 'Invalid date - renewal in past' in response.content.decode()
+        assert not LoanEvent.objects.exists()
+
+    def test_return_updates_counters(self, client, copies):
+        on_loan, _ = copies
+        assert counters.get_counts()['num_instances_available'] == 1
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        client.post(reverse('bulk-loans'), {'action': 'return', 'copies': [copy.id for copy in on_loan]})
+        assert BookInstance.objects.filter(status='a', borrower=None, due_back=None).count() == 4
+        assert counters.get_counts()['num_instances_available'] == 4
+        assert set(LoanEvent.objects.filter(action='return').values_list('bookinstance', flat=True)) == {
+            copy.id for copy in on_loan}
+        book = Book.objects.get()
+        assert (book.copies_available, book.copies_on_loan, book.next_due_back) == (4, 0, None)
+
+    def test_requires_permission(self, client, copies):
+        on_loan, _ = copies
+        client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        client.post(reverse('bulk-loans'), {'action': 'return', 'copies': [on_loan[0].id]})
+        assert BookInstance.objects.filter(status='o').count() == 3
+
+    def test_admin_action(self, client, copies):
+        on_loan, _ = copies
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        User.objects.filter(username='testuser2').update(is_superuser=True)
+        response = client.post(reverse('admin:catalogapp_bookinstance_changelist'), {
+            'action': 'mark_returned', '_selected_action': [copy.id for copy in on_loan],
+        })
+        assert response.status_code == 302
+        assert not BookInstance.objects.filter(status='o').exists()
+
+    def test_single_renewal_is_audited(self, client, copies):
+        on_loan, _ = copies
+        client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        client.post(reverse('renew-book-librarian', args=[on_loan[0].pk]), {'renewal_date': renewal_date})
+        event = LoanEvent.objects.get()
+        assert (event.action, event.bookinstance_id, event.previous_due_back, event.due_back) == (
+            'renew', on_loan[0].pk, on_loan[0].due_back, renewal_date)
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    @pytest.fixture
+    def book(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        return Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=author)
+
+    def test_not_modified_without_queries(self, client, book, django_assert_num_queries):
+        response = client.get(reverse('books'))
+        assert response.status_code == 200
+        assert 'no-cache' in response['Cache-Control']
+        with django_assert_num_queries(0):
+            revalidated = client.get(reverse('books'), HTTP_IF_NONE_MATCH=response['ETag'])
+        assert revalidated.status_code == 304
+        with django_assert_num_queries(0):
+            revalidated = client.get(reverse('books'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        assert revalidated.status_code == 304
+
+    # Transactional: versions change once the write commits
+    @pytest.mark.django_db(transaction=True)
+    def test_etag_follows_model_changes(self, client, book):
+        etag = client.get(reverse('books'))['ETag']
+        Author.objects.update(first_name='Jane')  # no signal: the registry does not see it
+        assert client.get(reverse('books'), HTTP_IF_NONE_MATCH=etag).status_code == 304
+        book.author.save()
+        response = client.get(reverse('books'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    # Transactional: versions change once the write commits
+    @pytest.mark.django_db(transaction=True)
+    def test_book_detail_follows_its_book(self, client, book):
+        url = reverse('book-detail', args=[book.pk])
+        etag = client.get(url)['ETag']
+        Book.objects.create(title='Other book')
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_etag_depends_on_session(self, client, book):
+        etag = client.get(reverse('authors'))['ETag']
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = client.get(reverse('authors'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert 'private' in response['Cache-Control']
+
+
+@pytest.mark.django_db
+class TestIndexVisits:
+    def test_visit_count_in_signed_cookie(self, client):
+        for expected in (0, 1, 2):
+            response = client.get(reverse('index'))
+            assert response.context['num_visits'] == expected
+        assert 'num_visits' in response.cookies
+        assert not Session.objects.exists()
+
+    def test_tampered_cookie_starts_over(self, client):
+        client.cookies['num_visits'] = '41'
+        assert client.get(reverse('index')).context['num_visits'] == 0
+
+    def test_visit_count_in_session(self, client, settings):
+        settings.CATALOGAPP_VISITS_STORE = 'session'
+        client.get(reverse('index'))
+        assert client.get(reverse('index')).context['num_visits'] == 1
+        assert client.session['num_visits'] == 2
+
+    def test_site_total_flushed_in_batches(self):
+        counter = VisitCounter(interval=3600, batch=3)
+        counter.hit()
+        counter.hit()
+        assert counter.total() == 2
+        assert counter._cache().get('catalogapp:visits:index') is None
+        counter.hit()
+        assert counter._cache().get('catalogapp:visits:index') == 3
+        counter.hit()
+        counter.flush()
+        assert counter.total() == 4
+
+    def test_site_total_shared_by_processes(self, client):
+        first, second = VisitCounter(interval=3600), VisitCounter(interval=3600)
+        for _ in range(3):
+            first.hit()
+        second.hit()
+        first.flush()
+        second.flush()
+        assert VisitTotal.objects.get(page='index').count == 4
+        assert first.total() == second.total() == 4
+        assert client.get(reverse('index')).context['total_visits'] >= 4
+
+
+@pytest.mark.django_db
+class TestSharedCaches:
+    # Transactional: versions change once the write commits
+    @pytest.mark.django_db(transaction=True)
+    def test_versions_do_not_evict_counters_or_sessions(self, client, settings):
+        settings.SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        client.login(username='reader', password='1X<ISRUkw+tuK')
+        counters.reconcile()
+        for pk in range(400):
+            versions.bump('book', pk)
+        assert counters.cached_counts() is not None
+        assert client.get(reverse('my-borrowed')).status_code == 200
+
+    @pytest.mark.django_db(transaction=True)
+    def test_versions_change_when_the_write_commits(self):
+        before = versions.get('book', 1)
+        with transaction.atomic():
+            versions.bump('book', 1)
+            assert versions.get('book', 1) == before
+        assert versions.get('book', 1) > before
+
+
+@pytest.mark.django_db
+class TestTemplates:
+    def test_navigation_cached_per_permissions(self, client, settings):
+        settings.CATALOGAPP_NAV_CACHE_TIMEOUT = 60
+        librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK', is_staff=True)
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        User.objects.create_user(username='staff', password='2HJ1vRV0Z&3iD', is_staff=True)
+
+        client.login(username='librarian', password='1X<ISRUkw+tuK')
+        assert 'All borrowed' in client.get(reverse('books')).content.decode()
+        client.login(username='staff', password='2HJ1vRV0Z&3iD')
+        content = client.get(reverse('books')).content.decode()
+        assert 'Staff' in content
+        assert 'All borrowed' not in content
+        assert 'User: staff' in content
+
+    def test_warm_compiles_every_template(self, settings):
+        settings.TEMPLATES = [dict(settings.TEMPLATES[0], OPTIONS=dict(
+            settings.TEMPLATES[0]['OPTIONS'],
+            loaders=[('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)]))]
+        names = templating.template_names()
+        assert 'base_generic.html' in names
+        assert 'catalogapp/email/overdue_notice.txt' in names
+        assert templating.warm() == len(names)
+        loader = engines['django'].engine.template_loaders[0]
+        assert len(loader.get_template_cache) >= len(names)
@@ -0,0 +1,87 @@
+import gzip
+import json
+
+import pytest
+from django.urls import reverse
+
+from catalogapp.models import Author, Book, BookInstance, Genre, Language
+from catalogapp.pagination import encode_cursor
+
+
+@pytest.fixture
+def books():
+    english = Language.objects.create(lang_name='English')
+    fantasy = Genre.objects.create(book_kind='Fantasy')
+    books = []
+    for number in range(5):
+        author = Author.objects.create(first_name='First', last_name=f'Last {number}')
+        book = Book.objects.create(title=f'Title {number}', author=author, language=english, isbn=f'{number:013}')
+        book.genre.add(fantasy)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        books.append(book)
+    return books
+
+
+def get_json(client, url, **params):
+    response = client.get(url, params)
+    return response.status_code, json.loads(response.content)
+
+
+@pytest.mark.django_db
+class TestApi:
+    def test_sparse_fields(self, client, books):
+        status, body = get_json(client, reverse('api-list', args=['books']), fields='title,isbn')
+        assert status == 200
+        assert body['results'][0] == {'id': books[0].pk, 'title': 'Title 0', 'isbn': '0000000000000'}
+
+    def test_embeds_in_two_queries(self, client, books, django_assert_num_queries):
+        # the books joined with their authors, then the copies of the whole page
+        with django_assert_num_queries(2):
+            status, body = get_json(client, reverse('api-list', args=['books']),
+                                    embed='author,copies', fields='title,author.last_name,copies.status')
+        assert status == 200
+        assert body['results'][1] == {
+            'id': books[1].pk, 'title': 'Title 1', 'author': {'id': books[1].author_id, 'last_name': 'Last 1'},
+            'copies': [{'id': str(books[1].bookinstance_set.get().pk), 'status': 'a'}],
+        }
+
+    def test_batched_ids(self, client, books, django_assert_num_queries):
+        ids = f'{books[3].pk},{books[1].pk},123456'
+        with django_assert_num_queries(1):
+            status, body = get_json(client, reverse('api-list', args=['books']), ids=ids, fields='title')
+        assert [book['title'] for book in body['results']] == ['Title 1', 'Title 3']
+        assert body['next'] is None
+
+    def test_keyset_pages(self, client, books):
+        _, first = get_json(client, reverse('api-list', args=['authors']), limit=3)
+        assert [author['last_name'] for author in first['results']] == ['Last 0', 'Last 1', 'Last 2']
+        assert first['previous'] is None
+        second = json.loads(client.get(first['next']).content)
+        assert [author['last_name'] for author in second['results']] == ['Last 3', 'Last 4']
+        assert second['next'] is None
+
+    def test_detail(self, client, books):
+        status, body = get_json(client, reverse('api-detail', args=['genres', books[0].genre.get().pk]),
+                                embed='books', fields='book_kind,books.title')
+        assert status == 200
+        assert [book['title'] for book in body['books']] == [f'Title {number}' for number in range(5)]
+        assert client.get(reverse('api-detail', args=['genres', 123456])).status_code == 404
+        assert client.get(reverse('api-detail', args=['loans', 1])).status_code == 404
+
+    def test_borrower_not_exposed(self, client, books):
+        status, body = get_json(client, reverse('api-list', args=['copies']), fields='borrower')
+        assert status == 400
+        assert 'borrower' in body['error']
+
+    @pytest.mark.parametrize('params', [{'embed': 'publisher'}, {'fields': 'author.last_name'},
+                                        {'ids': '1,x'}, {'limit': '0'}, {'cursor': 'nonsense'},
+                                        {'cursor': encode_cursor(['t', 'x'])},
+                                        {'cursor': encode_cursor(['t', {'a': 1}])},
+                                        {'cursor': encode_cursor(['t', [1]])}])
+    def test_bad_requests(self, client, params):
+        assert client.get(reverse('api-list', args=['books']), params).status_code == 400
+
+    def test_gzip(self, client, books):
+        response = client.get(reverse('api-list', args=['books']), HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert len(json.loads(gzip.decompress(response.content))['results']) == 5
@@ -0,0 +1,74 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from catalogapp import counters
+from catalogapp.models import Author, Book, BookInstance, Genre, Language
+
+
+@pytest.fixture
+def catalog():
+    author = Author.objects.create(first_name='John', last_name='Smith')
+    book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=author,
+                               language=Language.objects.create(lang_name='English'))
+    book.genre.add(Genre.objects.create(book_kind='Fantasy'))
+    for status in 'aom':
+        BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status=status)
+    for number in range(12):
+        Book.objects.create(title=f'Other {number:02}', author=author)
+    return author, book
+
+
+def get(url, client=None, **headers):
+    async def request():
+        return await (client or AsyncClient()).get(url, **headers)
+    return async_to_sync(request)()
+
+
+# The queries run in worker threads, which cannot see a test case's transaction
+@pytest.mark.django_db(transaction=True)
+class TestAsyncViews:
+    @pytest.mark.parametrize('name', ['book-detail', 'author-detail'])
+    def test_detail_matches_sync_view(self, catalog, name):
+        author, book = catalog
+        pk = book.pk if name.startswith('book') else author.pk
+        url = reverse(f'async-{name}', args=[pk])
+        response = get(url)
+        assert response.status_code == 200
+        # The pages only differ in the login link back to them
+        sync_url = reverse(name, args=[pk])
+        assert response.content.replace(url.encode(), sync_url.encode()) == Client().get(sync_url).content
+
+    def test_detail_not_found(self):
+        assert get(reverse('async-book-detail', args=[12345])).status_code == 404
+        assert get(reverse('async-author-detail', args=[12345])).status_code == 404
+
+    def test_book_list_pages(self, catalog):
+        response = get(reverse('async-books') + '?page=2')
+        assert response.status_code == 200
+        assert [book.title for book in response.context['book_list']] == ['Other 09', 'Other 10', 'Other 11']
+        assert response.context['page_obj'].paginator.num_pages == 2
+        assert get(reverse('async-books') + '?page=3').status_code == 404
+        assert get(reverse('async-books') + '?page=x').status_code == 404
+
+    def test_author_list(self, catalog):
+        response = get(reverse('async-authors'))
+        assert [author.last_name for author in response.context['author_list']] == ['Smith']
+
+    def test_index_recounts_cold_cache(self, catalog):
+        client = AsyncClient()
+        response = get(reverse('async-index'), client)
+        assert response.context['num_books'] == 13
+        assert response.context['num_instances_available'] == 1
+        assert response.context['num_visits'] == 0
+        assert counters.cached_counts() == counters.compute_counts()
+        assert get(reverse('async-index'), client).context['num_visits'] == 1
+
+    def test_conditional_get(self, catalog):
+        url = reverse('async-author-detail', args=[catalog[0].pk])
+        response = get(url)
+        assert 'no-cache' in response['Cache-Control']
+        assert get(url, **{'If-None-Match': response['ETag']}).status_code == 304
+        Book.objects.create(title='New', author=catalog[0])
+        assert get(url, **{'If-None-Match': response['ETag']}).status_code == 200
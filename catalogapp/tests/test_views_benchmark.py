@@ -0,0 +1,26 @@
+import pytest
+
+from catalogapp import availability, benchmarking
+from catalogapp.models import Book, BookInstance
+from library.wsgi import application
+
+
+class TestViewBenchmark:
+    # Transactional: the WSGI handler closes the database connection after each request
+    @pytest.mark.django_db(transaction=True)
+    def test_generated_catalog_and_every_url(self):
+        benchmarking.generate_catalog(authors=5, books=30, genres=4, copies=2, borrowers=3, seed=7)
+        assert Book.objects.count() == 30
+        assert BookInstance.objects.filter(status='o', borrower__isnull=True).count() == 0
+        assert availability.reconcile() == 0
+
+        harness = benchmarking.WSGIHarness(application)
+        for name, url in benchmarking.catalog_urls():
+            stats = harness.measure(url, 1)
+            assert stats['status'] in (200, 403), name
+
+    def test_compare_flags_regressions(self):
+        baseline = {'books': {'p50_ms': 10.0, 'queries': 3}, 'gone': {'p50_ms': 1.0, 'queries': 1}}
+        assert benchmarking.compare({'books': {'p50_ms': 12.0, 'queries': 3}}, baseline, 0.25) == []
+        assert benchmarking.compare({'books': {'p50_ms': 13.0, 'queries': 4}}, baseline, 0.25) == [
+            ('books', 'queries 3 -> 4'), ('books', 'p50 10.00 -> 13.00 ms')]
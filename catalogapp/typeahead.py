@@ -0,0 +1,307 @@
+""" in-process typeahead index over book titles and author names, reloaded when they change"""
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection
+
+from . import versions
+from .models import Author, Book
+
+KINDS = ('book', 'author')
+
+# Fuzzy matches need at least this trigram similarity (as pg_trgm's default)
+SIMILARITY_THRESHOLD = 0.3
+
+# Each query word is matched against at most this many resembling vocabulary words
+SIMILAR_WORDS = 8
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Lowercase `text`, strip accents and reduce it to words separated by single spaces."""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def trigrams(normalized):
+    """The set of trigrams of a normalized string, each word padded as pg_trgm does."""
+    grams = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def author_label(last_name, first_name):
+    return f'{last_name}, {first_name}'
+
+
+def changed():
+    """Record that titles or author names changed, so every process reloads its index on next use."""
+    versions.touch('typeahead')
+
+
+def current_generation():
+    """The shared version of the titles and author names."""
+    return versions.model_versions('typeahead')['typeahead']
+
+
+class TypeaheadIndex:
+    """Prefix and trigram index of (kind, id, label) entries.
+
+    Entries live in parallel arrays indexed by entry number. Prefix lookups binary
+    search a sorted array of (entry, offset) word starts. Fuzzy lookups find the
+    vocabulary words resembling each query word through per-trigram arrays of word
+    numbers, then the entries holding those words through per-word arrays of entry
+    numbers. Changed or removed entries are marked dead and the arrays are
+    compacted once a quarter is dead.
+
+    A loaded index remembers the current_generation() it reflects and reloads once
+    that changes, so changes made by any process reach every process, including
+    bulk changes that send no signals (whose code calls changed()).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Empty the index; it is reloaded from the database on next use."""
+        with self._lock:
+            self.loaded = False
+            self.generation = None
+            self._ids = array('q')
+            self._kinds = bytearray()
+            self._alive = bytearray()
+            self._labels = []
+            self._norms = []
+            self._starts = array('I')         # entry of each word start, sorted by the text from there
+            self._start_offsets = array('H')  # offset of the word start in the normalized label
+            self._entries = {}                # kind * 2**48 + id -> live entry
+            self._dead = 0
+            self._words = {}                  # normalized word -> word number
+            self._word_ntrigrams = array('H')
+            self._word_entries = []           # word number -> array of entries
+            self._word_postings = {}          # trigram -> array of word numbers
+
+    def __len__(self):
+        return len(self._ids) - self._dead
+
+    @staticmethod
+    def _object_key(kind, pk):
+        return KINDS.index(kind) << 48 | pk
+
+    def _suffix(self, position):
+        return self._norms[self._starts[position]][self._start_offsets[position]:]
+
+    def _lower_bound(self, prefix):
+        low, high = 0, len(self._starts)
+        while low < high:
+            middle = (low + high) // 2
+            if self._suffix(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _word(self, word):
+        number = self._words.get(word)
+        if number is None:
+            number = self._words[word] = len(self._word_entries)
+            grams = trigrams(word)
+            self._word_ntrigrams.append(len(grams))
+            self._word_entries.append(array('I'))
+            for gram in grams:
+                self._word_postings.setdefault(gram, array('I')).append(number)
+        return number
+
+    def _append(self, kind, pk, label):
+        entry = len(self._ids)
+        norm = normalize(label)
+        self._ids.append(pk)
+        self._kinds.append(KINDS.index(kind))
+        self._alive.append(1)
+        self._labels.append(label)
+        self._norms.append(norm)
+        self._entries[self._object_key(kind, pk)] = entry
+        for word in set(norm.split()):
+            self._word_entries[self._word(word)].append(entry)
+        return entry, norm
+
+    def _insert_starts(self, entry, norm):
+        for match in re.finditer(r'\S+', norm):
+            position = self._lower_bound(norm[match.start():])
+            self._starts.insert(position, entry)
+            self._start_offsets.insert(position, match.start())
+
+    def build(self, rows):
+        """Replace the contents with `rows` of (kind, id, label)."""
+        with self._lock:
+            self.clear()
+            starts = []
+            for kind, pk, label in rows:
+                entry, norm = self._append(kind, pk, label)
+                starts.extend((norm[match.start():], entry, match.start()) for match in re.finditer(r'\S+', norm))
+            starts.sort()
+            self._starts = array('I', (entry for _, entry, _ in starts))
+            self._start_offsets = array('H', (offset for _, _, offset in starts))
+            self.loaded = True
+
+    def load(self, generation=None):
+        """Load every book title and author name from the database, as of `generation`."""
+        if generation is None:
+            generation = current_generation()
+
+        # Read from the primary: a lagging replica could miss the change that made the
+        # generation, and the index would keep that until the next one.
+        def rows():
+            for pk, title in Book.objects.using(DEFAULT_DB_ALIAS).values_list('id', 'title').iterator():
+                yield 'book', pk, title
+            authors = Author.objects.using(DEFAULT_DB_ALIAS).values_list('id', 'last_name', 'first_name')
+            for pk, last_name, first_name in authors.iterator():
+                yield 'author', pk, author_label(last_name, first_name)
+        with self._lock:
+            self.build(rows())
+            self.generation = generation
+
+    def ensure_loaded(self):
+        """Load the index if it is empty or the titles and names changed since it was loaded."""
+        if self.loaded and self.generation is None:
+            return  # built from given rows rather than loaded
+        current = current_generation()
+        if not self.loaded or self.generation != current:
+            with self._lock:
+                if not self.loaded or self.generation != current:
+                    self.load(current)
+
+    def load_in_background(self):
+        """Load the index in a separate thread, so start-up is not delayed."""
+        def target():
+            try:
+                self.ensure_loaded()
+            except DatabaseError:
+                # e.g. tables not migrated yet; the index then loads on first use
+                pass
+            finally:
+                connection.close()
+        threading.Thread(target=target, name='typeahead-load', daemon=True).start()
+
+    def _kill(self, kind, pk):
+        entry = self._entries.pop(self._object_key(kind, pk), None)
+        if entry is not None:
+            self._alive[entry] = 0
+            self._dead += 1
+
+    def update(self, kind, pk, label):
+        """Add or replace the entry of an object. Ignored until the index is loaded."""
+        with self._lock:
+            if not self.loaded:
+                return
+            entry = self._entries.get(self._object_key(kind, pk))
+            if entry is not None and self._labels[entry] == label:
+                return
+            self._kill(kind, pk)
+            self._insert_starts(*self._append(kind, pk, label))
+            self._compact_if_needed()
+
+    def remove(self, kind, pk):
+        """Remove the entry of an object."""
+        with self._lock:
+            if self.loaded:
+                self._kill(kind, pk)
+                self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        if self._dead > 1000 and self._dead * 4 > len(self._ids):
+            live = [entry for entry in range(len(self._ids)) if self._alive[entry]]
+            generation = self.generation
+            self.build([(KINDS[self._kinds[entry]], self._ids[entry], self._labels[entry]) for entry in live])
+            self.generation = generation
+
+    def _result(self, entry):
+        return {'type': KINDS[self._kinds[entry]], 'id': self._ids[entry], 'label': self._labels[entry]}
+
+    def suggest(self, query, limit=10):
+        """Return up to `limit` entries starting with (or else resembling) `query`.
+
+        Entries whose label starts with the query come first, then entries with a
+        later word starting with it, then trigram matches, most similar first.
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+        self.ensure_loaded()
+        with self._lock:
+            found = {}
+            position = self._lower_bound(query)
+            while position < len(self._starts) and len(found) < limit * 4:
+                entry = self._starts[position]
+                if not self._suffix(position).startswith(query):
+                    break
+                if self._alive[entry]:
+                    rank = (self._start_offsets[position] > 0, len(self._norms[entry]))
+                    found[entry] = min(rank, found.get(entry, rank))
+                position += 1
+            ranked = sorted(found, key=lambda entry: (found[entry], entry))[:limit]
+            if len(ranked) < limit and len(query) >= 3:
+                ranked.extend(self._similar(query, limit - len(ranked), exclude=found))
+            return [self._result(entry) for entry in ranked]
+
+    def _similar_words(self, word):
+        """Map the SIMILAR_WORDS vocabulary words most resembling `word` to their trigram similarity."""
+        # A match must share at least `needed` of the word's trigrams, so it has to appear
+        # in one of the len(grams) - needed + 1 rarest ones: only those supply candidates.
+        grams = sorted(trigrams(word), key=lambda gram: len(self._word_postings.get(gram, ())))
+        needed = max(math.ceil(SIMILARITY_THRESHOLD * len(grams)), 1)
+        candidates = set()
+        for gram in grams[:len(grams) - needed + 1]:
+            candidates.update(self._word_postings.get(gram, ()))
+        shared = Counter()
+        for gram in grams:
+            shared.update(candidates.intersection(self._word_postings.get(gram, ())))
+        similar = []
+        for number, count in shared.items():
+            similarity = count / (len(grams) + self._word_ntrigrams[number] - count)
+            if similarity >= SIMILARITY_THRESHOLD:
+                similar.append((similarity, number))
+        return {number: similarity for similarity, number in heapq.nlargest(SIMILAR_WORDS, similar)}
+
+    def _similar(self, query, limit, exclude):
+        """Entries scoring at least SIMILARITY_THRESHOLD, most similar first.
+
+        An entry scores the mean, over the query words, of the best similarity
+        between that query word and a word of the entry.
+        """
+        matches = [self._similar_words(word) for word in query.split()]
+        # Candidates hold a word resembling the most selective query word
+        pivots = [match for match in matches if match]
+        if not pivots:
+            return []
+        pivot = min(pivots, key=lambda match: sum(len(self._word_entries[number]) for number in match))
+        candidates = set()
+        for number in pivot:
+            candidates.update(self._word_entries[number])
+        candidates.difference_update(exclude)
+        scored = []
+        for entry in candidates:
+            if not self._alive[entry]:
+                continue
+            numbers = [self._words[word] for word in set(self._norms[entry].split())]
+            score = sum(max((match.get(number, 0) for number in numbers), default=0) for match in matches)
+            score /= len(matches)
+            if score >= SIMILARITY_THRESHOLD:
+                scored.append((score, -entry))
+        return [-negated for _, negated in heapq.nlargest(limit, scored)]
+
+
+index = TypeaheadIndex()
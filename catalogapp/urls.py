@@ -1,17 +1,24 @@
 """ mapping application urls to view functions"""
 
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('books/', views.BookListView.as_view(), name='books'),
+    path('search/', views.search, name='search'),
+    path('suggest/', views.suggest, name='suggest'),
     path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
     path('authors/', views.AuthorListView.as_view(), name='authors'),
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
     path(r'borrowed/', views.LoanedBooksAllListView.as_view(), name='all-borrowed'),  # Added for challenge
+    path('borrowed/overdue/', views.OverdueLoansListView.as_view(), name='overdue-loans'),
+    path('borrowed/bulk/', views.bulk_loans, name='bulk-loans'),
+    path('export/<slug:dataset>.<slug:fmt>', views.export, name='export'),
+    path('api/<slug:resource>/', views.api_list, name='api-list'),
+    path('api/<slug:resource>/<str:pk>/', views.api_detail, name='api-detail'),
     path('author/create/', views.AuthorCreate.as_view(), name='author_create'),
     path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author_update'),
     path('author/<int:pk>/delete/', views.AuthorDelete.as_view(), name='author_delete'),
@@ -19,3 +26,12 @@ urlpatterns = [
     path('book/<int:pk>/update/', views.BookUpdate.as_view(), name='book_update'),
     path('book/<int:pk>/delete/', views.BookDelete.as_view(), name='book_delete'),
 ]
+
+# Async variants of the read views, for ASGI servers
+urlpatterns += [
+    path('async/', async_views.index, name='async-index'),
+    path('async/books/', async_views.book_list, name='async-books'),
+    path('async/book/<int:pk>', async_views.book_detail, name='async-book-detail'),
+    path('async/authors/', async_views.author_list, name='async-authors'),
+    path('async/author/<int:pk>', async_views.author_detail, name='async-author-detail'),
+]
@@ -0,0 +1,97 @@
+""" version numbers of catalog objects and models, used to key cached renderings and HTTP validators"""
+
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Versions must be shared by all worker processes, like the counters
+CACHE_ALIAS = getattr(settings, 'CATALOGAPP_VERSIONS_CACHE', 'versions')
+KEY_PREFIX = 'catalogapp:version:'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(name, pk):
+    return f'{KEY_PREFIX}{name}:{pk}'
+
+
+def _fresh():
+    # Time based, so a version lost from the cache is never handed out again
+    return time.time_ns() // 1000
+
+
+def get(name, pk):
+    """Return the current version of the object `name` with primary key `pk`."""
+    key = _key(name, pk)
+    version = _cache().get(key)
+    if version is None:
+        _cache().add(key, _fresh(), timeout=None)
+        version = _cache().get(key)
+    return version
+
+
+def get_many(name, pks):
+    """Return the current versions of the objects `name` with the given primary keys, as a dict."""
+    keys = {_key(name, pk): pk for pk in pks}
+    found = _cache().get_many(keys)
+    missing = {key: _fresh() for key in keys if key not in found}
+    if missing:
+        for key, version in missing.items():
+            _cache().add(key, version, timeout=None)
+        found.update(_cache().get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump(name, *pks):
+    """Give new versions to the objects `name` with the given primary keys.
+
+    A version is the time of the change in microseconds, so it also tells when the
+    object last changed. Inside a transaction the versions change when it commits: a
+    page read before then, from the old rows, must not be cached under the new version.
+    """
+    keys = [_key(name, pk) for pk in pks if pk is not None]
+    if keys:
+        transaction.on_commit(lambda: _cache().set_many(dict.fromkeys(keys, _fresh()), timeout=None))
+
+
+# Model-level versions: the 'model' object named after each catalog model changes
+# with any row of that model.
+
+MODELS = ('book', 'author', 'bookinstance', 'genre', 'language')
+
+# Start of this process: rendered pages may differ from those of the previous release
+STARTED = _fresh()
+
+# Identifies the code deployed, so entity tags change with it; the process start by default,
+# which makes every worker tag pages differently, so deployments should set it.
+RELEASE = getattr(settings, 'CATALOGAPP_RELEASE', '') or STARTED
+
+
+def touch(*models):
+    """Record that rows of the given models (by model_name) changed."""
+    bump('model', *models)
+
+
+def model_versions(*models):
+    return get_many('model', models)
+
+
+def age(*versions_):
+    """Seconds since the newest of the given versions."""
+    return time.time() - max(versions_) / 1e6
+
+
+def last_modified(*versions_):
+    """The time matching the newest of the given versions, or of the process start."""
+    return datetime.datetime.fromtimestamp(max(STARTED, *versions_) / 1e6, tz=datetime.timezone.utc)
+
+
+def etag(*parts):
+    """A strong entity tag made from `parts` (versions and whatever else the response varies with)."""
+    return hashlib.sha1(repr((RELEASE,) + parts).encode()).hexdigest()
@@ -1,91 +1,280 @@
 """ write all view functions here"""
 
 import datetime
+import functools
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.paginator import Paginator
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import render, get_object_or_404
 from django.views import generic
-from .models import Book, Author, BookInstance, Genre
+from .models import Book, Author, BookInstance, Genre, LoanEvent
+from . import availability, counters, dbpool, exporting, ledger, loans, metrics, routers, typeahead, versions, visits
+from . import api as catalog_api
+from . import search as catalog_search
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from .forms import RenewBookForm
-from django.http import HttpResponseRedirect
+from .forms import BulkLoanForm, RenewBookForm
+from .pagination import KeysetPaginationMixin
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
+from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 
+# How long rendered page fragments stay cached; their keys change with the object version anyway.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
 
-# pylint: disable=maybe-no-member
-def index(request):
-    """View function for home page of site."""
 
-    # Generate counts of some of the main objects
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
+def page_versions(request, models, book_pk=None):
+    """The versions of `models` (and of book `book_pk`) a catalog page depends on, looked up once per request.
+
+    While the newest of them is younger than CATALOGAPP_REPLICA_PIN_SECONDS the page is read
+    from the primary: read from a lagging replica, it would be cached under the new versions
+    with the old rows.
+    """
+    if not hasattr(request, '_catalog_versions'):
+        found = list(versions.model_versions(*models).values())
+        if book_pk is not None:
+            found.append(versions.get('book', book_pk))
+        request._catalog_versions = found
+        request._catalog_recent = versions.age(*found) < getattr(settings, 'CATALOGAPP_REPLICA_PIN_SECONDS', 5)
+    if request._catalog_recent:
+        routers.prefer_primary()
+    return request._catalog_versions
+
+
+def page_etag(request, found):
+    """ETag of a catalog page with versions `found`; the page header also depends on the URL and session."""
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    return versions.etag(request.get_full_path(), session, *found)
+
+
+def patch_page_cache_control(request, response):
+    # Stored copies must be revalidated; those of a session are not for shared caches
+    patch_cache_control(response, no_cache=True)
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        patch_cache_control(response, private=True)
+
 
-    # Available books (status = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
+def conditional(*models, book=False):
+    """Decorator answering conditional GETs of a catalog page from the version registry.
 
-    # The 'all()' is implied by default.
-    num_authors = Author.objects.count()
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    The page's ETag and Last-Modified come from the versions of `models` (and of the
+    book of the `pk` URL argument if `book`), so If-None-Match and If-Modified-Since
+    are answered with 304 before any query or rendering. The ETag also covers the URL
+    and the session, which the page header depends on.
+    """
+    def etag(request, *args, **kwargs):
+        return page_etag(request, page_versions(request, models, kwargs['pk'] if book else None))
 
-    # Generate counts of some of the main objects
-    num_genre = Genre.objects.all().count()
+    def last_modified(request, *args, **kwargs):
+        return versions.last_modified(*page_versions(request, models, kwargs['pk'] if book else None))
 
-    # Available books (book_kind = 'Love')
-    num_books_available = Genre.objects.filter(book_kind='Love').count()
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_page_cache_control(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+# pylint: disable=maybe-no-member
+def index(request):
+    """View function for home page of site."""
+
+    # Counts of the main objects and the site-wide visit total, served from the counters cache in one read
+    counts = counters.get_counts([visits.total_key()])
+
+    # Number of visits to this view by this visitor (signed cookie or session), and by everyone
+    num_visits = visits.visitor_count(request)
+    visits.counter.hit()
 
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_genre': num_genre,
-        'num_books_available': num_books_available,
+        'num_books': counts['num_books'],
+        'num_instances': counts['num_instances'],
+        'num_instances_available': counts['num_instances_available'],
+        'num_authors': counts['num_authors'],
+        'num_genre': counts['num_genre'],
+        'num_books_available': counts['num_books_available'],
         'num_visits': num_visits,
+        'total_visits': visits.counter.total(stored=counts.get(visits.total_key())),
     }
 
     # Render the HTML template index.html with the data in the context variable
-    return render(request, 'index.html', context=context)
+    response = render(request, 'index.html', context=context)
+    visits.remember_visit(request, response, num_visits + 1)
+    return response
 
 
 # pylint: disable=too-many-ancestors
-class BookListView(generic.ListView):
+@method_decorator(conditional('book', 'author'), name='dispatch')
+class BookListView(KeysetPaginationMixin, generic.ListView):
     """Generic class-based view for a list of books."""
     model = Book
     paginate_by = 10
+    ordering = ['title', 'id']
+    keyset_ordering = ('title', 'id')
     # Get 5 books containing the title war
 #   queryset = Book.objects.filter(title__icontains='war')[:5]
 
 
+@conditional('book', 'author', 'genre')
+def search(request):
+    """View function searching the catalog, best matches first."""
+    query = request.GET.get('q', '').strip()
+    books = catalog_search.search_books(query) if query else []
+    paginator = Paginator(books, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'book_list': page_obj.object_list,
+        'is_paginated': page_obj.has_other_pages(),
+    }
+    return render(request, 'catalogapp/book_search.html', context=context)
+
+
+@conditional('book', 'author')
+def suggest(request):
+    """View function returning typeahead suggestions (books and authors) as JSON."""
+    query = request.GET.get('q', '')
+    results = typeahead.index.suggest(query, limit=10)
+    for result in results:
+        result['url'] = reverse('book-detail' if result['type'] == 'book' else 'author-detail', args=[result['id']])
+    return JsonResponse({'query': query, 'results': results})
+
+
+def metrics_view(request):
+    """Request metrics and connection pool statistics in the Prometheus text format,
+    for staff and the CATALOGAPP_METRICS_ALLOWED_IPS."""
+    allowed_ips = getattr(settings, 'CATALOGAPP_METRICS_ALLOWED_IPS', ())
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        raise Http404
+    body = metrics.registry.render() + metrics.render_pools(dbpool.pools)
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _api_resource(resource):
+    try:
+        return catalog_api.RESOURCES[resource]
+    except KeyError as error:
+        raise Http404(f'No API resource {resource!r}') from error
+
+
+def _api_error(error):
+    return JsonResponse({'error': str(error)}, status=400)
+
+
+@gzip_page
+@conditional(*versions.MODELS)
+def api_list(request, resource):
+    """JSON API: a page of a catalog resource in keyset order, or the objects listed in ?ids=."""
+    api_resource = _api_resource(resource)
+    try:
+        embed = api_resource.parse_embed(request.GET.get('embed'))
+        fields = api_resource.parse_fields(request.GET.get('fields'), embed)
+        ids = api_resource.parse_ids(request.GET['ids']) if 'ids' in request.GET else None
+        try:
+            limit = min(int(request.GET.get('limit', catalog_api.DEFAULT_LIMIT)), catalog_api.MAX_LIMIT)
+        except ValueError as error:
+            raise catalog_api.BadRequest('Invalid limit') from error
+        if limit < 1:
+            raise catalog_api.BadRequest('Invalid limit')
+        results, cursors = api_resource.rows(fields, embed, ids=ids, cursor=request.GET.get('cursor'), limit=limit)
+    except catalog_api.BadRequest as error:
+        return _api_error(error)
+
+    links = {}
+    for name, cursor in zip(('next', 'previous'), cursors):
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        links[name] = f'{request.path}?{query.urlencode()}' if cursor else None
+    return JsonResponse(dict(links, results=results), json_dumps_params={'separators': (',', ':')})
+
+
+@gzip_page
+@conditional(*versions.MODELS)
+def api_detail(request, resource, pk):
+    """JSON API: one object of a catalog resource."""
+    api_resource = _api_resource(resource)
+    try:
+        embed = api_resource.parse_embed(request.GET.get('embed'))
+        fields = api_resource.parse_fields(request.GET.get('fields'), embed)
+        results, _ = api_resource.rows(fields, embed, ids=api_resource.parse_ids(pk))
+    except catalog_api.BadRequest as error:
+        return _api_error(error)
+    if not results:
+        raise Http404(f'No {resource} {pk}')
+    return JsonResponse(results[0], json_dumps_params={'separators': (',', ':')})
+
+
+@method_decorator(conditional(book=True), name='dispatch')
 class BookDetailView(generic.DetailView):
     """Generic class-based view for book details."""
     model = Book
+    queryset = Book.objects.select_related('author', 'language')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        book = self.object
+        # The genres and copies are rendered in a fragment cached per book version;
+        # only load them when that fragment has to be rendered again.
+        version = versions.get('book', book.pk)
+        if cache.get(make_template_fragment_key('book_detail', [book.pk, version])) is None:
+            prefetch_related_objects(
+                [book],
+                Prefetch('genre', queryset=Genre.objects.only('id', 'book_kind')),
+                Prefetch('bookinstance_set',
+                         queryset=BookInstance.objects.only('id', 'book', 'imprint', 'due_back', 'status')),
+            )
+        context['book_version'] = version
+        context['fragment_timeout'] = FRAGMENT_CACHE_TIMEOUT
+        return context
 
 
 # pylint: disable=too-many-ancestors
-class AuthorListView(generic.ListView):
+@method_decorator(conditional('author'), name='dispatch')
+class AuthorListView(KeysetPaginationMixin, generic.ListView):
     """Generic class-based view for a list of books."""
     model = Author
     paginate_by = 10
+    keyset_ordering = ('last_name', 'first_name', 'id')
     # Get 5 books containing the title war
 #   queryset = Book.objects.filter(title__icontains='war')[:5]
 
 
+@method_decorator(conditional('author', 'book'), name='dispatch')
 class AuthorDetailView(generic.DetailView):
     """Generic class-based view for author details"""
     model = Author
 
+    def get_queryset(self):
+        # The copy counts are stored on each book, so one query loads all the books
+        books = Book.objects.only('id', 'title', 'summary', 'author', *availability.FIELDS).order_by('title', 'id')
+        return Author.objects.prefetch_related(Prefetch('book_set', queryset=books, to_attr='books'))
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+
+class LoanedBooksByUserListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing books on loan to current user."""
     model = BookInstance
     template_name = 'catalogapp/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    keyset_ordering = ('due_back', 'id')
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').select_related(
+            'book').order_by('due_back')
 
 
 @permission_required('catalogapp.can_mark_returned')
@@ -102,8 +291,12 @@ def renew_book_librarian(request, pk):
         # Check if the form is valid:
         if form.is_valid():
             # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
+            previous_due_back = book_instance.due_back
             book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
+            book_instance.save(update_fields=['due_back'])
+            ledger.record([LoanEvent(action='renew', bookinstance_id=book_instance.pk, book_id=book_instance.book_id,
+                                     borrower_id=book_instance.borrower_id, librarian=request.user,
+                                     previous_due_back=previous_due_back, due_back=book_instance.due_back)])
 
             # redirect to a new URL:
             return HttpResponseRedirect(reverse('all-borrowed'))
@@ -121,16 +314,74 @@ def renew_book_librarian(request, pk):
     return render(request, 'catalogapp/book_renew_librarian.html', context)
 
 
-class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
+@require_POST
+@permission_required('catalogapp.can_mark_returned')
+def bulk_loans(request):
+    """Renew or mark returned the copies selected on the all borrowed books page."""
+    form = BulkLoanForm(request.POST)
+    if form.is_valid():
+        copies = form.cleaned_data['copies']
+        if form.cleaned_data['action'] == 'renew':
+            count = loans.renew(copies, form.cleaned_data['renewal_date'], librarian=request.user)
+            messages.success(request, f'Renewed {count} of {len(copies)} copies.')
+        else:
+            count = loans.mark_returned(copies, librarian=request.user)
+            messages.success(request, f'Marked {count} of {len(copies)} copies returned.')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+    return HttpResponseRedirect(reverse('all-borrowed'))
+
+
+class LoanedBooksAllListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing all books on loan. Only visible to users with can_mark_returned permission."""
     model = BookInstance
     permission_required = 'catalogapp.can_mark_returned'
     template_name = 'catalogapp/bookinstance_list_borrowed_all.html'
     paginate_by = 10
     ordering = ['due_back']
+    keyset_ordering = ('due_back', 'id')
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('-id')
+        # Ordered by due_back (see `ordering`), which the status/due_back index returns presorted
+        return super().get_queryset().on_loan().with_overdue().select_related('book', 'borrower')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['proposed_renewal_date'] = datetime.date.today() + datetime.timedelta(weeks=3)
+        return context
+
+
+@permission_required('catalogapp.can_mark_returned')
+def export(request, dataset, fmt):
+    """Stream a catalog dataset as CSV or JSON lines; ?gzip=1 compresses it on the fly."""
+    if dataset not in exporting.DATASETS or fmt not in exporting.FORMATS:
+        raise Http404('Unknown export')
+    compress = request.GET.get('gzip') == '1'
+    response = StreamingHttpResponse(
+        exporting.export(dataset, fmt, compress=compress),
+        content_type='application/gzip' if compress else f'text/{"csv" if fmt == "csv" else "plain"}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{exporting.filename(dataset, fmt, compress)}"'
+    return response
+
+
+class OverdueLoansListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
+    """Generic class-based view listing the overdue loans, oldest first. Only for librarians."""
+    model = BookInstance
+    permission_required = 'catalogapp.can_mark_returned'
+    template_name = 'catalogapp/bookinstance_list_overdue.html'
+    paginate_by = 20
+    ordering = ['due_back', 'id']
+    keyset_ordering = ('due_back', 'id')
+
+    def get_queryset(self):
+        return super().get_queryset().overdue().select_related('book', 'borrower')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['today'] = datetime.date.today()
+        return context
 
 
 class AuthorCreate(CreateView):
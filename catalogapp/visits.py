@@ -0,0 +1,122 @@
+""" home page visit counting without a session write per request"""
+
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import VisitTotal
+
+COOKIE_NAME = 'num_visits'
+COOKIE_SALT = 'catalogapp.visits'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Site-wide totals are kept in VisitTotal and published to the counters cache, shared by the
+# worker processes
+CACHE_ALIAS = getattr(settings, 'CATALOGAPP_COUNTERS_CACHE', 'counters')
+KEY_PREFIX = 'catalogapp:visits:'
+
+
+def _store():
+    # 'cookie' keeps each visitor's count in a signed cookie; 'session' in the session, as before
+    return getattr(settings, 'CATALOGAPP_VISITS_STORE', 'cookie')
+
+
+def visitor_count(request):
+    """How many times this visitor has seen the page before."""
+    if _store() == 'session':
+        return request.session.get('num_visits', 0)
+    try:
+        return int(request.get_signed_cookie(COOKIE_NAME, default=0, salt=COOKIE_SALT))
+    except ValueError:
+        return 0
+
+
+def remember_visit(request, response, count):
+    """Store the visitor's new `count`, on `response` for the cookie store."""
+    if _store() == 'session':
+        request.session['num_visits'] = count
+    else:
+        response.set_signed_cookie(COOKIE_NAME, str(count), salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+                                   httponly=True, samesite='Lax')
+
+
+def total_key(page='index'):
+    """Key of the published site-wide total of `page` in the counters cache."""
+    return KEY_PREFIX + page
+
+
+class VisitCounter:
+    """Site-wide visit totals, counted in memory and added to the database in batches.
+
+    Pending visits are flushed at most every `interval` seconds (on the next visit),
+    once `batch` of them are pending, and when the process exits. Each flush adds to
+    the total with one UPDATE, so flushes of several processes never lose visits, and
+    publishes the new total to the counters cache for the page to show.
+    """
+
+    def __init__(self, interval=None, batch=None):
+        self.interval = interval if interval is not None else getattr(
+            settings, 'CATALOGAPP_VISITS_FLUSH_INTERVAL', 10)
+        self.batch = batch or 1000
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+
+    @staticmethod
+    def _cache():
+        return caches[CACHE_ALIAS]
+
+    def hit(self, page='index'):
+        with self._lock:
+            self._pending[page] += 1
+            due = (sum(self._pending.values()) >= self.batch
+                   or time.monotonic() - self._flushed_at >= self.interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Add the pending visits to the stored totals."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        for page, count in pending.items():
+            with transaction.atomic():
+                totals = VisitTotal.objects.filter(page=page)
+                if not totals.update(count=F('count') + count):
+                    try:
+                        with transaction.atomic():
+                            VisitTotal.objects.create(page=page, count=count)
+                    except IntegrityError:
+                        # Created by another process at the same moment
+                        totals.update(count=F('count') + count)
+                # Read and published while the row is locked, so the cache gets the totals in order
+                self._cache().set(total_key(page), totals.values_list('count', flat=True).get(), timeout=None)
+
+    def total(self, page='index', stored=None):
+        """Stored total plus the visits this process has not flushed yet.
+
+        `stored` is the total already read from the counters cache, if any.
+        """
+        with self._lock:
+            pending = self._pending[page]
+        if stored is None:
+            stored = self._cache().get(total_key(page))
+        return (stored or 0) + pending
+
+
+counter = VisitCounter()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        counter.flush()
+    except Exception:  # pylint: disable=broad-except
+        # The cache may be unusable this late; a few visits are lost
+        pass
@@ -42,8 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalogapp.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalogapp.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,13 +56,26 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'library.urls'
 
+# Templates
+# CATALOGAPP_TEMPLATE_MODE=cached keeps every template compiled in memory (the catalogapp
+# ones from startup) and caches the sidebar navigation; 'reload' reads them again on each
+# render, for editing them. Production (DJANGO_DEBUG=False) defaults to 'cached'.
+
+CATALOGAPP_TEMPLATE_MODE = os.environ.get('CATALOGAPP_TEMPLATE_MODE', 'reload' if DEBUG else 'cached')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Seconds the sidebar navigation fragments stay cached (0: rendered every time)
+CATALOGAPP_NAV_CACHE_TIMEOUT = int(os.environ.get(
+    'CATALOGAPP_NAV_CACHE_TIMEOUT', 60 * 60 * 24 if CATALOGAPP_TEMPLATE_MODE == 'cached' else 0))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates')
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -68,6 +83,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': ([('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                        if CATALOGAPP_TEMPLATE_MODE == 'cached' else TEMPLATE_LOADERS),
         },
     },
 ]
@@ -107,6 +124,106 @@ else:
         }
     }
 
+# Connections are kept open for CATALOGAPP_CONN_MAX_AGE seconds ('None': for good, '0': one
+# per request) and checked at the start of a request when they have been idle for
+# CATALOGAPP_CONN_HEALTH_CHECK_AFTER seconds (catalogapp.dbpool.check_connections).
+# CATALOGAPP_DB_POOL=True instead shares up to CATALOGAPP_DB_POOL_SIZE connections between the
+# threads of a process, for threaded servers; its statistics are served at /metrics.
+
+CATALOGAPP_CONN_HEALTH_CHECKS = os.environ.get('CATALOGAPP_CONN_HEALTH_CHECKS', 'True') == 'True'
+CATALOGAPP_CONN_HEALTH_CHECK_AFTER = float(os.environ.get('CATALOGAPP_CONN_HEALTH_CHECK_AFTER', '10'))
+_conn_max_age = os.environ.get('CATALOGAPP_CONN_MAX_AGE', '60')
+DATABASES['default']['CONN_MAX_AGE'] = None if _conn_max_age == 'None' else int(_conn_max_age)
+if os.environ.get('CATALOGAPP_DB_POOL', '') == 'True':
+    DATABASES['default'].update(
+        ENGINE='catalogapp.backends.postgresql_pool',
+        CONN_MAX_AGE=0,
+        POOL={
+            'MAX_SIZE': int(os.environ.get('CATALOGAPP_DB_POOL_SIZE', '10')),
+            'TIMEOUT': float(os.environ.get('CATALOGAPP_DB_POOL_TIMEOUT', '5')),
+        },
+    )
+
+# Read replicas: RDS_REPLICA_HOSTNAMES is a comma-separated list of replica hosts with the
+# same database name, user and port as the primary. catalogapp.routers.ReplicaRouter sends
+# catalog reads to them; tests use the primary (TEST MIRROR).
+
+CATALOGAPP_DB_REPLICAS = []
+for number, hostname in enumerate(filter(None, os.environ.get('RDS_REPLICA_HOSTNAMES', '').split(',')), 1):
+    alias = 'replica%d' % number
+    DATABASES[alias] = dict(DATABASES['default'], HOST=hostname.strip(), TEST={'MIRROR': 'default'})
+    CATALOGAPP_DB_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['catalogapp.routers.ReplicaRouter']
+# Seconds a visitor keeps reading from the primary after a write
+CATALOGAPP_REPLICA_PIN_SECONDS = int(os.environ.get('CATALOGAPP_REPLICA_PIN_SECONDS', '5'))
+
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+#
+# The 'counters' cache holds the home page counters (catalogapp/counters.py), the 'versions'
+# cache the versions keying cached pages and HTTP validators (catalogapp/versions.py) and the
+# 'sessions' cache the sessions of CATALOGAPP_SESSION_ENGINE=cache. They must be shared by all
+# worker processes in production, so they default to the database there;
+# CATALOGAPP_COUNTERS_CACHE=locmem|file|db overrides the choice for all three.
+# The 'db' backend needs `python manage.py createcachetable`.
+
+
+def _shared_cache(name):
+    backends = {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'catalogapp-{name}',
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(os.environ.get('CATALOGAPP_CACHE_DIR', os.path.join(BASE_DIR, 'cache')), name),
+        },
+        'db': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': f'catalogapp_{name}',
+        },
+    }
+    return dict(
+        backends[os.environ.get('CATALOGAPP_COUNTERS_CACHE', 'db' if 'RDS_HOSTNAME' in os.environ else 'locmem')],
+        TIMEOUT=None,
+        # Keys do not expire and there is one version per book: with Django's default of 300
+        # entries, each new one would cull a third of the cache, counters and sessions included
+        OPTIONS={'MAX_ENTRIES': int(os.environ.get('CATALOGAPP_SHARED_CACHE_MAX_ENTRIES', '10000000'))},
+    )
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'counters': _shared_cache('counters'),
+    'versions': _shared_cache('versions'),
+    'sessions': _shared_cache('sessions'),
+}
+
+# Sessions
+# https://docs.djangoproject.com/en/3.0/topics/http/sessions/
+#
+# CATALOGAPP_SESSION_ENGINE=db|cached_db|cache|signed_cookies picks where sessions are kept.
+# Cache-backed sessions use the shared 'sessions' cache. The home page visit counts do not
+# use the session by default (CATALOGAPP_VISITS_STORE=cookie), so anonymous visitors cause
+# no session writes whichever engine is chosen.
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('CATALOGAPP_SESSION_ENGINE', 'db')]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Where each visitor's home page visit count is kept: 'cookie' (signed) or 'session'
+CATALOGAPP_VISITS_STORE = os.environ.get('CATALOGAPP_VISITS_STORE', 'cookie')
+# Seconds between flushes of the batched site-wide visit total to the counters cache
+CATALOGAPP_VISITS_FLUSH_INTERVAL = int(os.environ.get('CATALOGAPP_VISITS_FLUSH_INTERVAL', '10'))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -144,6 +261,36 @@ USE_TZ = True
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 STATIC_URL = '/static/'
 
+# collectstatic writes content-hashed copies of every file with gzip and, when the Brotli package
+# is installed, Brotli versions next to them; WhiteNoise serves the hashed names with far-future,
+# immutable cache headers. Pages can only be rendered once collectstatic has written the manifest,
+# so DEBUG keeps the plain storage. Check templates with "manage.py check_static".
+STATICFILES_STORAGE = os.environ.get(
+    'CATALOGAPP_STATICFILES_STORAGE',
+    'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+    else 'whitenoise.storage.CompressedManifestStaticFilesStorage')
+
 LOGIN_REDIRECT_URL = '/catalogapp/'
 
+# List views paginate with numbered pages ('offset') or with opaque cursors ('keyset'),
+# which keeps deep pages of a large catalog as cheap as the first one.
+CATALOGAPP_PAGINATION_MODE = os.environ.get('CATALOGAPP_PAGINATION_MODE', 'offset')
+
+# Loan events older than CATALOGAPP_LEDGER_RETENTION_MONTHS are moved to gzipped JSON Lines files in
+# CATALOGAPP_LEDGER_ARCHIVE_DIR by "manage.py archive_loan_events", a month per file.
+CATALOGAPP_LEDGER_RETENTION_MONTHS = int(os.environ.get('CATALOGAPP_LEDGER_RETENTION_MONTHS', '24'))
+CATALOGAPP_LEDGER_ARCHIVE_DIR = os.environ.get('CATALOGAPP_LEDGER_ARCHIVE_DIR',
+                                               os.path.join(BASE_DIR, 'archive', 'loan-events'))
+
+# Load the typeahead index (catalogapp/typeahead.py) when the app starts instead of on first use
+CATALOGAPP_TYPEAHEAD_PRELOAD = os.environ.get('CATALOGAPP_TYPEAHEAD_PRELOAD', '') == 'True'
+
+# Release identifier (e.g. the deployed commit) mixed into the catalog pages' ETags
+CATALOGAPP_RELEASE = os.environ.get('CATALOGAPP_RELEASE', '')
+
+# Request metrics (catalogapp/middleware.py): served at /metrics to staff and to these
+# addresses (e.g. the Prometheus server), and sent to clients in a Server-Timing header
+CATALOGAPP_METRICS_ALLOWED_IPS = os.environ.get('CATALOGAPP_METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+CATALOGAPP_SERVER_TIMING = os.environ.get('CATALOGAPP_SERVER_TIMING', 'True') == 'True'
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'